@@ -8,18 +8,23 @@
 # OF ANY KIND, either express or implied. See the License for the specific language
 # governing permissions and limitations under the License.
 """TargetDecisioningEngine"""
-from copy import deepcopy
+from copy import copy
+from functools import partial
 from target_decisioning_engine import artifact_provider
 from target_decisioning_engine.artifact_provider import ArtifactProvider
+from target_decisioning_engine.compiled_artifact import CompiledArtifact
 from target_decisioning_engine.constants import SUPPORTED_ARTIFACT_MAJOR_VERSION
 from target_decisioning_engine.context_provider import create_decisioning_context
+from target_decisioning_engine.context_provider import create_timing_context
 from target_decisioning_engine.messages import MESSAGES
 from target_decisioning_engine.request_provider import valid_delivery_request
 from target_decisioning_engine.utils import match_major_version
 from target_decisioning_engine.utils import has_remote_dependency
 from target_decisioning_engine.decision_provider import DecisionProvider
 from target_decisioning_engine.geo_provider import GeoProvider
+from target_decisioning_engine.notification_provider import send_notifications_batch
 from target_decisioning_engine.trace_provider import TraceProvider
+from target_tools.cache import configure_caches
 
 
 class TargetDecisioningEngine:
@@ -31,36 +36,100 @@ class TargetDecisioningEngine:
         """
         self.config = config
         self._artifact_provider = None
+        configure_caches(config.cache_sizes)
         self.artifact = None
+        self.compiled_artifact = None
 
-    def get_offers(self, target_options):
+    def _install_artifact(self, artifact):
+        """Compiles artifact before installing it.  get_offers only reads self.compiled_artifact, which is swapped
+        with a single assignment so that a request never sees a mix of old and new artifact data
+        :param artifact: (target_decisioning_engine.types.decisioning_artifact.DecisioningArtifact) artifact
         """
-        :param target_options: (target_decisioning_engine.types.target_delivery_request.TargetDeliveryRequest)
-        :return: (dict) get offers response
+        self.compiled_artifact = CompiledArtifact(artifact) if artifact else None
+        self.artifact = artifact
+
+    def _get_compiled_artifact(self):
         """
-        request = target_options.request
-        if not self.artifact:
+        :return: (target_decisioning_engine.compiled_artifact.CompiledArtifact) Returns current compiled artifact,
+            raises if the artifact is not available or its version is unsupported
+        """
+        compiled_artifact = self.compiled_artifact
+        if not compiled_artifact:
             raise Exception(MESSAGES.get("ARTIFACT_NOT_AVAILABLE"))
 
-        if not match_major_version(self.artifact.get("version"), SUPPORTED_ARTIFACT_MAJOR_VERSION):
+        artifact = compiled_artifact.artifact
+        if not match_major_version(artifact.get("version"), SUPPORTED_ARTIFACT_MAJOR_VERSION):
             raise Exception(MESSAGES.get("ARTIFACT_VERSION_UNSUPPORTED")(
-                self.artifact.get("version"),
+                artifact.get("version"),
                 SUPPORTED_ARTIFACT_MAJOR_VERSION)
             )
+        return compiled_artifact
 
-        _geo_provider = GeoProvider(self.config, self.artifact)
-        valid_request = valid_delivery_request(request, target_options.target_location_hint,
-                                               _geo_provider.valid_geo_request_context)
-
-        options = deepcopy(target_options)
+    def _create_decision_provider(self, target_options, compiled_artifact, geo_provider, artifact_trace,
+                                  timing_context=None):
+        """
+        :param target_options: (target_decisioning_engine.types.target_delivery_request.TargetDeliveryRequest)
+        :param compiled_artifact: (target_decisioning_engine.compiled_artifact.CompiledArtifact) compiled artifact
+        :param geo_provider: (target_decisioning_engine.geo_provider.GeoProvider) geo provider
+        :param artifact_trace: (dict) artifact trace
+        :param timing_context: (target_decisioning_engine.types.decisioning_context.TimingContext) timing context
+        :return: (target_decisioning_engine.decision_provider.DecisionProvider)
+        """
+        # traces include the geo context, so geo is always looked up when tracing
+        geo_lookup_required = target_options.request.trace is not None or \
+            compiled_artifact.requires_geo(target_options.request)
+        valid_request = valid_delivery_request(target_options.request, target_options.target_location_hint,
+                                               partial(geo_provider.valid_geo_request_context,
+                                                       lookup_required=geo_lookup_required))
+
+        # valid_delivery_request returns a copy of the request, so the remaining options can be shared
+        options = copy(target_options)
         options.request = valid_request
 
-        _trace_provider = TraceProvider(self.config, options, self._artifact_provider.get_trace())
+        _trace_provider = TraceProvider(self.config, options, artifact_trace)
+        # traces include the whole context, so it is only built partially when tracing is off
+        context_keys = None if _trace_provider.show_traces else compiled_artifact.context_keys
+
+        return DecisionProvider(self.config, options,
+                                create_decisioning_context(valid_request, timing_context, context_keys),
+                                compiled_artifact, _trace_provider)
 
-        decisioning = DecisionProvider(self.config, options, create_decisioning_context(valid_request),
-                                       self.artifact, _trace_provider)
+    def get_offers(self, target_options):
+        """
+        :param target_options: (target_decisioning_engine.types.target_delivery_request.TargetDeliveryRequest)
+        :return: (dict) get offers response
+        """
+        compiled_artifact = self._get_compiled_artifact()
+        _geo_provider = GeoProvider(self.config, compiled_artifact.artifact)
+        decisioning = self._create_decision_provider(target_options, compiled_artifact, _geo_provider,
+                                                     self._artifact_provider.get_trace())
         return decisioning.run()
 
+    def get_offers_batch(self, target_options_list):
+        """Evaluates several requests against the same artifact, rule index and timing context.  Notifications for
+        all requests are sent together once every request has been evaluated
+        :param target_options_list:
+            (list<target_decisioning_engine.types.target_delivery_request.TargetDeliveryRequest>)
+        :return: (list) get offers responses, in the same order as target_options_list
+        """
+        compiled_artifact = self._get_compiled_artifact()
+        _geo_provider = GeoProvider(self.config, compiled_artifact.artifact)
+        artifact_trace = self._artifact_provider.get_trace()
+        timing_context = create_timing_context()
+
+        responses = []
+        send_notification_opts_list = []
+        for target_options in target_options_list:
+            decisioning = self._create_decision_provider(target_options, compiled_artifact, _geo_provider,
+                                                         artifact_trace, timing_context)
+            responses.append(decisioning.get_decisions())
+            send_notification_opts = decisioning.notification_provider.create_notification_options()
+            if send_notification_opts:
+                send_notification_opts_list.append(send_notification_opts)
+
+        send_notifications_batch(self.config.send_notification_func, send_notification_opts_list)
+        return responses
+
     def is_ready(self):
         """
         :return: (bool) Returns True if artifact has been fetched, False otherwise
@@ -89,13 +158,13 @@ class TargetDecisioningEngine:
         """Initializes TargetDecisioningEngine.  Must be called in order to start artifact polling"""
         self._artifact_provider = ArtifactProvider(self.config)
         self._artifact_provider.initialize()
-        self.artifact = self._artifact_provider.get_artifact()
+        self._install_artifact(self._artifact_provider.get_artifact())
 
         if not self.artifact:
             raise Exception(MESSAGES.get("ARTIFACT_NOT_AVAILABLE"))
 
         def _artifact_subscriber(data):
-            self.artifact = data
+            self._install_artifact(data)
 
         # subscribe to new artifacts that are downloaded on the polling interval
         self._artifact_provider.subscribe(_artifact_subscriber)
@@ -8,10 +8,17 @@
 # OF ANY KIND, either express or implied. See the License for the specific language
 # governing permissions and limitations under the License.
 """Allocation provider"""
+from target_decisioning_engine.constants import ALLOCATION_CACHE
+from target_decisioning_engine.constants import ALLOCATION_PREFIX_CACHE
 from target_decisioning_engine.constants import CAMPAIGN_BUCKET_SALT
+from target_decisioning_engine.constants import DEFAULT_ALLOCATION_CACHE_SIZE
+from target_decisioning_engine.constants import DEFAULT_ALLOCATION_PREFIX_CACHE_SIZE
 from target_tools.utils import is_string
 from target_tools.utils import create_uuid
-from target_tools.hashing import hash_unencoded_chars
+from target_tools.hashing import create_hash_state
+from target_tools.hashing import get_numpy
+from target_tools.hashing import hash_unencoded_chars_array
+from target_tools.hashing import hash_unencoded_chars_resume
 from target_tools.utils import memoize
 
 TOTAL_BUCKETS = 10000
@@ -44,32 +51,94 @@ def get_or_create_visitor_id(visitor_id):
     )
 
 
-def _calculate_allocation(device_id):
+create_hash_state_memoized = memoize(create_hash_state, max_size=DEFAULT_ALLOCATION_PREFIX_CACHE_SIZE,
+                                     name=ALLOCATION_PREFIX_CACHE)
+
+
+def _calculate_allocation(device_id_prefix, device_id_suffix):
     """
-    :param device_id: (str) device id based on visitorId, clientCode, campaignId and a salt value
+    :param device_id_prefix: (str) clientCode and campaignId part of the device id
+    :param device_id_suffix: (str) visitorId and salt part of the device id
     :return: (float) allocation value
     """
-    signed_numeric_hash_value = hash_unencoded_chars(device_id)
+    prefix_hash_state = create_hash_state_memoized(device_id_prefix)
+    signed_numeric_hash_value = hash_unencoded_chars_resume(prefix_hash_state, device_id_suffix)
     hash_fixed_bucket = abs(signed_numeric_hash_value) % TOTAL_BUCKETS
+    return _bucket_allocation(hash_fixed_bucket)
+
+
+def _bucket_allocation(hash_fixed_bucket):
+    """
+    :param hash_fixed_bucket: (int) bucket number in range [0, TOTAL_BUCKETS)
+    :return: (float) allocation value
+    """
     allocation_value = (hash_fixed_bucket / float(TOTAL_BUCKETS)) * MAX_PERCENTAGE
     return round(allocation_value, 2)
 
 
-calculate_allocation_memoized = memoize(_calculate_allocation)
+calculate_allocation_memoized = memoize(_calculate_allocation, max_size=DEFAULT_ALLOCATION_CACHE_SIZE,
+                                        name=ALLOCATION_CACHE)
 
 
-def compute_allocation(client_id, activity_id, visitor_id, salt=CAMPAIGN_BUCKET_SALT):
+def _get_bucket_allocations():
+    """
+    :return: (numpy.ndarray<float64>) Returns allocation value for every bucket, indexed by bucket number
     """
+    numpy = get_numpy()
+    return numpy.array([_bucket_allocation(bucket) for bucket in range(TOTAL_BUCKETS)], dtype=numpy.float64)
+
+
+get_bucket_allocations_memoized = memoize(_get_bucket_allocations, max_size=1)
+
+
+def _create_device_id_prefix(client_id, activity_id):
+    """Device id is "<client>.<activity>.<visitor>.<salt>", the prefix is shared by all visitors of an activity
     :param client_id: (str) client ID
     :param activity_id: (str) activity ID
+    :return: (str) device id prefix, including the trailing separator
+    """
+    return ".".join([client_id, str(activity_id), ""])
+
+
+def _create_device_id_suffix(visitor_id, salt):
+    """
     :param visitor_id: (str | delivery_api_client.Model.visitor_id.VisitorId) visitor ID
     :param salt: (str) hashing salt
-    :return: (float) allocation value
+    :return: (str) device id suffix
     """
-    device_id = ".".join([
-        client_id,
-        str(activity_id),
+    return ".".join([
         visitor_id if visitor_id and is_string(visitor_id) else get_or_create_visitor_id(visitor_id),
         salt
     ])
-    return calculate_allocation_memoized(device_id)
+
+
+def compute_allocation(client_id, activity_id, visitor_id, salt=CAMPAIGN_BUCKET_SALT):
+    """
+    :param client_id: (str) client ID
+    :param activity_id: (str) activity ID
+    :param visitor_id: (str | delivery_api_client.Model.visitor_id.VisitorId) visitor ID
+    :param salt: (str) hashing salt
+    :return: (float) allocation value
+    """
+    return calculate_allocation_memoized(_create_device_id_prefix(client_id, activity_id),
+                                         _create_device_id_suffix(visitor_id, salt))
+
+
+def compute_allocations(client_id, activity_ids, visitor_ids, salt=CAMPAIGN_BUCKET_SALT):
+    """Vectorized compute_allocation for bulk visitors, i.e. batch scoring or audience sizing.  Requires numpy
+    :param client_id: (str) client ID
+    :param activity_ids: (list<str>) activity IDs
+    :param visitor_ids: (list<str | delivery_api_client.Model.visitor_id.VisitorId>) visitor IDs
+    :param salt: (str) hashing salt
+    :return: (numpy.ndarray<float64>) Returns allocation values of shape (len(activity_ids), len(visitor_ids)),
+        allocations[i][j] is the allocation of visitor_ids[j] in activity_ids[i]
+    """
+    numpy = get_numpy()
+    device_id_suffixes = [_create_device_id_suffix(visitor_id, salt) for visitor_id in visitor_ids]
+    signed_numeric_hash_values = numpy.empty((len(activity_ids), len(visitor_ids)), dtype=numpy.int64)
+    for index, activity_id in enumerate(activity_ids):
+        prefix_hash_state = create_hash_state_memoized(_create_device_id_prefix(client_id, activity_id))
+        signed_numeric_hash_values[index] = hash_unencoded_chars_array(device_id_suffixes, state=prefix_hash_state)
+
+    hash_fixed_buckets = numpy.abs(signed_numeric_hash_values) % TOTAL_BUCKETS
+    return get_bucket_allocations_memoized()[hash_fixed_buckets]
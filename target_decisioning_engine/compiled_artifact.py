@@ -0,0 +1,484 @@
+# Copyright 2021 Adobe. All rights reserved.
+# This file is licensed to you under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License. You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software distributed under
+# the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR REPRESENTATIONS
+# OF ANY KIND, either express or implied. See the License for the specific language
+# governing permissions and limitations under the License.
+"""CompiledArtifact class and related functions"""
+from bisect import bisect_right
+from copy import deepcopy
+from six import text_type
+from json_logic import is_logic
+from target_decisioning_engine.constants import GEO_CITY
+from target_decisioning_engine.constants import GEO_COUNTRY
+from target_decisioning_engine.constants import GEO_LATITUDE
+from target_decisioning_engine.constants import GEO_LONGITUDE
+from target_decisioning_engine.constants import GEO_STATE
+from target_decisioning_engine.filters import by_property_token
+from target_decisioning_engine.post_processors import get_rule_macro_templates
+from target_decisioning_engine.post_processors import get_rule_response_tokens
+from target_decisioning_engine.rule_compiler import compile_condition
+from target_decisioning_engine.rule_compiler import ConditionCompiler
+from target_decisioning_engine.rule_compiler import get_operator
+from target_decisioning_engine.rule_compiler import get_values
+from target_decisioning_engine.rule_compiler import get_var_paths
+from target_decisioning_engine.rule_compiler import is_array
+from target_decisioning_engine.rule_compiler import RULE_LEVEL_CONTEXT_KEYS
+from target_decisioning_engine.time_conditions import analyze_time_condition
+from target_decisioning_engine.time_conditions import split_time_condition
+from target_decisioning_engine.time_conditions import CLOCK_VARS
+from target_decisioning_engine.time_conditions import CURRENT_TIMESTAMP
+from target_tools.constants import DEFAULT_GLOBAL_MBOX
+from target_tools.constants import REQUEST_TYPES
+from target_tools.response_helpers import create_mbox_response
+from target_tools.response_helpers import MboxResponseTemplate
+from target_tools.utils import get_mbox_names
+from target_tools.utils import get_view_names
+from target_tools.utils import has_requested_views
+
+RULE_TYPES = ["mboxes", "views"]
+EMPTY_RULES = ()
+EQUALITY_OPERATORS = ["==", "==="]
+GEO_RESPONSE_TOKENS = [GEO_CITY, GEO_COUNTRY, GEO_STATE, GEO_LATITUDE, GEO_LONGITUDE]
+GEO_CONTEXT_KEY = "geo"
+
+
+def get_artifact_rules(artifact):
+    """
+    :param artifact: (target_decisioning_engine.types.decisioning_artifact.DecisioningArtifact) artifact
+    :return: (list<target_decisioning_engine.types.decisioning_artifact.Rule>) all mbox and view rules
+    """
+    rules = artifact.get("rules", {}) if artifact else {}
+    result = []
+    for rule_type in RULE_TYPES:
+        for rule_list in rules.get(rule_type, {}).values():
+            result.extend(rule_list)
+    return result
+
+
+def get_artifact_property_tokens(artifact):
+    """
+    :param artifact: (target_decisioning_engine.types.decisioning_artifact.DecisioningArtifact) artifact
+    :return: (set<str>) all property tokens referenced by artifact rules
+    """
+    result = set()
+    for rule in get_artifact_rules(artifact):
+        result.update(rule.get("propertyTokens") or [])
+    return result
+
+
+def index_rules(rules_by_name, property_tokens):
+    """
+    :param rules_by_name: (dict<str, list<Rule>>) rules keyed by mbox or view name
+    :param property_tokens: (set<str>) all property tokens referenced by artifact rules
+    :return: (dict<tuple, tuple<Rule>>) Returns rules pre-filtered by property token, keyed by (name, property token).
+        A property token of None holds rules that are not limited to a property.  Rules for a property token are a
+        superset of those, so an entry is only added for a property token when it has additional rules
+    """
+    index = {}
+    for name, rules in rules_by_name.items():
+        unrestricted_rules = tuple(filter(by_property_token(None), rules))
+        index[(name, None)] = unrestricted_rules
+        for property_token in property_tokens:
+            property_rules = tuple(filter(by_property_token(property_token), rules))
+            if len(property_rules) > len(unrestricted_rules):
+                index[(name, property_token)] = property_rules
+    return index
+
+
+def lookup_rules(index, name, property_token):
+    """
+    :param index: (dict<tuple, tuple<Rule>>) rule index created by index_rules
+    :param name: (str) mbox or view name
+    :param property_token: (str) request property token
+    :return: (tuple<target_decisioning_engine.types.decisioning_artifact.Rule>) ordered rules
+    """
+    return (property_token and index.get((name, property_token))) or index.get((name, None), EMPTY_RULES)
+
+
+def get_artifact_var_paths(artifact):
+    """
+    :param artifact: (target_decisioning_engine.types.decisioning_artifact.DecisioningArtifact) artifact
+    :return: (set<str>) Returns var paths that rule conditions read, None if any of them cannot be known upfront
+    """
+    var_paths = set()
+    for rule in get_artifact_rules(artifact):
+        condition_var_paths = get_var_paths(rule.get("condition"))
+        if condition_var_paths is None:
+            return None
+        var_paths.update(condition_var_paths)
+    return var_paths
+
+
+def has_geo_response_tokens(artifact):
+    """
+    :param artifact: (target_decisioning_engine.types.decisioning_artifact.DecisioningArtifact) artifact
+    :return: (bool) Returns True if any geo response token is configured
+    """
+    response_tokens = (artifact.get("responseTokens") if artifact else None) or []
+    return any(response_token in GEO_RESPONSE_TOKENS for response_token in response_tokens)
+
+
+def depends_on_geo(condition):
+    """
+    :param condition: (dict) json-logic rule condition
+    :return: (bool) Returns True if condition may read geo context values
+    """
+    var_paths = get_var_paths(condition)
+    return var_paths is None or any(var_path.split(".")[0] == GEO_CONTEXT_KEY for var_path in var_paths)
+
+
+def get_geo_dependent_names(rules_by_name):
+    """
+    :param rules_by_name: (dict<str, list<Rule>>) rules keyed by mbox or view name
+    :return: (set<str>) Returns mbox or view names that have at least one rule that depends on geo
+    """
+    return set(name for name, rules in rules_by_name.items()
+               if any(depends_on_geo(rule.get("condition")) for rule in rules))
+
+
+def has_unnamed_views(request):
+    """
+    :param request: (delivery_api_client.Model.delivery_request.DeliveryRequest) request
+    :return: (bool) Returns True if request has a view without name, which all view rules are evaluated for
+    """
+    for request_type in REQUEST_TYPES:
+        views = getattr(getattr(request, request_type), "views", None) or []
+        if any(view is None or not view.name for view in views):
+            return True
+    return False
+
+
+def get_artifact_context_keys(artifact):
+    """
+    :param artifact: (target_decisioning_engine.types.decisioning_artifact.DecisioningArtifact) artifact
+    :return: (set<str>) Returns top-level decisioning context keys that decisions depend on - keys read by rule
+        conditions, and geo for geo response tokens.  None if every key may be read
+    """
+    var_paths = get_artifact_var_paths(artifact)
+    if var_paths is None:
+        return None
+    context_keys = set(var_path.split(".")[0] for var_path in var_paths)
+    if has_geo_response_tokens(artifact):
+        context_keys.add(GEO_CONTEXT_KEY)
+    return context_keys
+
+
+def _get_conjuncts(condition):
+    """
+    :param condition: (dict) json-logic rule condition
+    :return: (list) Returns operands of a top-level "and", flattening nested "and"s, or condition itself
+    """
+    if not is_logic(condition) or get_operator(condition) != "and":
+        return [condition]
+    result = []
+    for value in get_values(condition, "and"):
+        result.extend(_get_conjuncts(value))
+    return result
+
+
+def _get_var_path(logic):
+    """
+    :param logic: (any) json-logic rule
+    :return: (str) Returns var path if logic is a var lookup of a request-level value without a default,
+        None otherwise
+    """
+    if not is_logic(logic) or get_operator(logic) != "var":
+        return None
+    values = get_values(logic, "var")
+    var_path = values[0] if len(values) == 1 else None
+    if not isinstance(var_path, text_type) or not var_path or var_path.split(".")[0] in RULE_LEVEL_CONTEXT_KEYS:
+        return None
+    return var_path
+
+
+def _is_text_literal(value):
+    """Checks if value is a string literal"""
+    return isinstance(value, text_type)
+
+
+def get_required_equality(condition):
+    """json-logic == and === on a string literal, as well as "in" on a list of string literals, can only be
+    satisfied if the text value of the var is one of the literals
+    :param condition: (dict) json-logic rule condition
+    :return: (tuple) Returns (var path, list of literals) for the first such check that the condition requires,
+        None if there is none
+    """
+    for conjunct in _get_conjuncts(condition):
+        if not is_logic(conjunct):
+            continue
+        operator = get_operator(conjunct)
+        values = get_values(conjunct, operator)
+        if len(values) != 2:
+            continue
+
+        if operator in EQUALITY_OPERATORS:
+            for var, literal in [values, reversed(values)]:
+                var_path = _get_var_path(var)
+                if var_path and _is_text_literal(literal):
+                    return var_path, [literal]
+
+        if operator == "in":
+            var_path = _get_var_path(values[0])
+            literals = values[1]
+            if var_path and is_array(literals) and literals and all(_is_text_literal(item) for item in literals):
+                return var_path, list(literals)
+    return None
+
+
+def index_equalities(rules):
+    """
+    :param rules: (list<target_decisioning_engine.types.decisioning_artifact.Rule>) rules
+    :return: (dict<str, tuple>) Returns inverted index of required equalities keyed by var path.  Values are
+        (compiled var lookup, dict of rule ids keyed by literal)
+    """
+    index = {}
+    for rule in rules:
+        required_equality = get_required_equality(rule.get("condition"))
+        if not required_equality:
+            continue
+        var_path, literals = required_equality
+        if var_path not in index:
+            index[var_path] = (compile_condition({"var": var_path}), {})
+        rule_ids_by_literal = index[var_path][1]
+        for literal in literals:
+            rule_ids_by_literal.setdefault(literal, set()).add(id(rule))
+    return index
+
+
+class RuleSet:
+    """Rules indexed by mbox or view name and property token, along with their compiled conditions and
+    consequence templates"""
+
+    def __init__(self, rules, property_tokens, conditions, templates=None):
+        """
+        :param rules: (dict) mbox and view rules keyed by rule type and then by mbox or view name,
+            like artifact["rules"]
+        :param property_tokens: (set<str>) all property tokens referenced by artifact rules
+        :param conditions: (dict<int, callable>) compiled conditions keyed by rule identity
+        :param templates: (dict<int, target_tools.response_helpers.MboxResponseTemplate>) consequence templates
+            keyed by rule identity, optional
+        """
+        view_rules = rules.get("views", {})
+        all_view_rules = {None: [rule for view_name in view_rules for rule in view_rules.get(view_name)]}
+        self.mbox_rules = index_rules(rules.get("mboxes", {}), property_tokens)
+        self.view_rules = index_rules(view_rules, property_tokens)
+        self.all_view_rules = index_rules(all_view_rules, property_tokens)
+        self.conditions = conditions
+        self.templates = templates or {}
+        self.equality_index = index_equalities(
+            [rule for rule_type in RULE_TYPES for rule_list in rules.get(rule_type, {}).values() for rule in rule_list])
+        self.indexed_rule_ids = set(rule_id for _, rule_ids_by_literal in self.equality_index.values()
+                                    for rule_ids in rule_ids_by_literal.values() for rule_id in rule_ids)
+
+    def get_mbox_rules(self, mbox_name, property_token):
+        """
+        :param mbox_name: (str) mbox name
+        :param property_token: (str) request property token
+        :return: (tuple<target_decisioning_engine.types.decisioning_artifact.Rule>) ordered mbox rules
+        """
+        return lookup_rules(self.mbox_rules, mbox_name, property_token)
+
+    def get_view_rules(self, view_name, property_token):
+        """
+        :param view_name: (str) view name, rules for all views are returned if not specified
+        :param property_token: (str) request property token
+        :return: (tuple<target_decisioning_engine.types.decisioning_artifact.Rule>) ordered view rules
+        """
+        if not view_name:
+            return lookup_rules(self.all_view_rules, None, property_token)
+        return lookup_rules(self.view_rules, view_name, property_token)
+
+    def get_candidate_rules(self, rules, context):
+        """Rejects rules whose required equality does not match context, using hash lookups only
+        :param rules: (tuple<target_decisioning_engine.types.decisioning_artifact.Rule>) ordered rules
+        :param context: (target_decisioning_engine.types.decisioning_context.DecisioningContext) context that rules
+            are evaluated against, except for per-rule values
+        :return: (list<target_decisioning_engine.types.decisioning_artifact.Rule>) Returns rules that may be
+            satisfied, in the same order
+        """
+        matched_rule_ids = set()
+        for lookup, rule_ids_by_literal in self.equality_index.values():
+            matched_rule_ids.update(rule_ids_by_literal.get(text_type(lookup(context)), ()))
+
+        indexed_rule_ids = self.indexed_rule_ids
+        return [rule for rule in rules if id(rule) not in indexed_rule_ids or id(rule) in matched_rule_ids]
+
+    def get_condition(self, rule):
+        """
+        :param rule: (target_decisioning_engine.types.decisioning_artifact.Rule) rule
+        :return: (callable) Returns compiled predicate for the rule condition
+        """
+        condition = self.conditions.get(id(rule))
+        return condition if condition else compile_condition(rule.get("condition"))
+
+    def create_consequence(self, rule):
+        """
+        :param rule: (target_decisioning_engine.types.decisioning_artifact.Rule) rule
+        :return: (delivery_api_client.Model.mbox_response.MboxResponse) Returns a new mbox response for the rule
+            consequence
+        """
+        template = self.templates.get(id(rule))
+        return template.create() if template else create_mbox_response(deepcopy(rule.get("consequence")))
+
+
+class CompiledArtifact:
+    """Decisioning artifact along with everything that is derived from it once per artifact version"""
+
+    def __init__(self, artifact):
+        """
+        :param artifact: (target_decisioning_engine.types.decisioning_artifact.DecisioningArtifact) artifact
+        """
+        self.artifact = artifact
+        self.rules = artifact.get("rules", {}) if artifact else {}
+        self.property_tokens = get_artifact_property_tokens(artifact)
+        self.context_keys = get_artifact_context_keys(artifact)
+        self.global_mbox_name = artifact.get("globalMbox", DEFAULT_GLOBAL_MBOX) if artifact else DEFAULT_GLOBAL_MBOX
+        self.response_tokens = frozenset((artifact.get("responseTokens") if artifact else None) or [])
+        self.geo_response_tokens = has_geo_response_tokens(artifact)
+        self.geo_mboxes = get_geo_dependent_names(self.rules.get("mboxes", {}))
+        self.geo_views = get_geo_dependent_names(self.rules.get("views", {}))
+
+        # rules are keyed by identity, self.artifact keeps them alive for as long as this object exists
+        rules = get_artifact_rules(artifact)
+        split_conditions = {id(rule): split_time_condition(rule.get("condition")) for rule in rules}
+        # each rule is counted once, by its request condition if it has a time window
+        counted_conditions = []
+        for rule in rules:
+            time_condition, request_condition = split_conditions.get(id(rule))
+            counted_conditions.append(rule.get("condition") if time_condition is None else request_condition)
+        self.condition_compiler = ConditionCompiler(counted_conditions)
+
+        conditions = {}
+        self.rule_response_tokens = get_rule_response_tokens(rules, self.response_tokens)
+        self.templates = {id(rule): MboxResponseTemplate(rule.get("consequence")) for rule in rules
+                          if isinstance(rule.get("consequence"), dict)}
+        self.macro_templates = get_rule_macro_templates(rules)
+        self.time_conditions = {}
+        self.request_conditions = {}
+        boundaries = set()
+        self.depends_on_clock = False
+        for rule in rules:
+            conditions[id(rule)] = self.condition_compiler.compile(rule.get("condition"))
+
+            time_condition, request_condition = split_conditions.get(id(rule))
+            if time_condition is not None:
+                analysis = analyze_time_condition(time_condition)
+                boundaries.update(analysis.get("boundaries"))
+                self.depends_on_clock = self.depends_on_clock or \
+                    bool(analysis.get("vars").intersection(CLOCK_VARS))
+                self.time_conditions[id(rule)] = compile_condition(time_condition)
+                self.request_conditions[id(rule)] = self.condition_compiler.compile(request_condition)
+
+        self.time_boundaries = sorted(boundaries)
+        self.rule_set = RuleSet(self.rules, self.property_tokens, conditions, self.templates)
+        self._active_rule_set = None
+
+    def get_mbox_rules(self, mbox_name, property_token):
+        """
+        :param mbox_name: (str) mbox name
+        :param property_token: (str) request property token
+        :return: (tuple<target_decisioning_engine.types.decisioning_artifact.Rule>) ordered mbox rules
+        """
+        return self.rule_set.get_mbox_rules(mbox_name, property_token)
+
+    def get_view_rules(self, view_name, property_token):
+        """
+        :param view_name: (str) view name, rules for all views are returned if not specified
+        :param property_token: (str) request property token
+        :return: (tuple<target_decisioning_engine.types.decisioning_artifact.Rule>) ordered view rules
+        """
+        return self.rule_set.get_view_rules(view_name, property_token)
+
+    def get_condition(self, rule):
+        """
+        :param rule: (target_decisioning_engine.types.decisioning_artifact.Rule) rule
+        :return: (callable) Returns compiled predicate for the rule condition
+        """
+        return self.rule_set.get_condition(rule)
+
+    def requires_geo(self, request):
+        """Geo is only needed if a geo response token is configured, or if a rule that depends on geo may be
+        evaluated for request - rules for requested mboxes and views, and for the global mbox since page load is
+        always evaluated
+        :param request: (delivery_api_client.Model.delivery_request.DeliveryRequest) request
+        :return: (bool)
+        """
+        if self.geo_response_tokens:
+            return True
+
+        requested_mboxes = get_mbox_names(request)
+        if any(getattr(request, request_type) for request_type in REQUEST_TYPES):
+            requested_mboxes.add(self.global_mbox_name)
+        if not requested_mboxes.isdisjoint(self.geo_mboxes):
+            return True
+
+        if not self.geo_views or not has_requested_views(request):
+            return False
+        return has_unnamed_views(request) or not get_view_names(request).isdisjoint(self.geo_views)
+
+    def _get_time_window(self, timestamp):
+        """
+        :param timestamp: (int) current timestamp in milliseconds
+        :return: (tuple) Returns (start, end) of the time window containing timestamp, time conditions do not
+            change value for timestamps in [start, end)
+        """
+        index = bisect_right(self.time_boundaries, timestamp)
+        start = self.time_boundaries[index - 1] if index > 0 else float("-inf")
+        end = self.time_boundaries[index] if index < len(self.time_boundaries) else float("inf")
+        return start, end
+
+    def _create_active_rule_set(self, timing_context):
+        """
+        :param timing_context: (target_decisioning_engine.types.decisioning_context.TimingContext) timing context
+        :return: (target_decisioning_engine.compiled_artifact.RuleSet) Returns rules whose time condition is
+            satisfied, or that have no time condition, along with conditions that only check the remaining
+            request-dependent part
+        """
+        conditions = dict(self.rule_set.conditions)
+        inactive_rule_ids = set()
+
+        for rule_id, time_condition in self.time_conditions.items():
+            try:
+                time_condition_satisfied = time_condition(timing_context)
+            except (TypeError, ValueError):
+                # leave it to the full condition to fail the same way it always did
+                continue
+            if time_condition_satisfied:
+                conditions[rule_id] = self.request_conditions.get(rule_id)
+            else:
+                inactive_rule_ids.add(rule_id)
+
+        active_rules = {}
+        for rule_type in RULE_TYPES:
+            active_rules[rule_type] = {
+                name: [rule for rule in rules if id(rule) not in inactive_rule_ids]
+                for name, rules in self.rules.get(rule_type, {}).items()
+            }
+        return RuleSet(active_rules, self.property_tokens, conditions, self.templates)
+
+    def get_active_rule_set(self, timing_context):
+        """Rules that are expired or not yet started are never evaluated per request.  The active rule set is
+        recomputed only when the timing context crosses a time boundary of the artifact's time conditions
+        :param timing_context: (target_decisioning_engine.types.decisioning_context.TimingContext) timing context,
+            i.e. the decisioning context
+        :return: (target_decisioning_engine.compiled_artifact.RuleSet) active rule set
+        """
+        timestamp = timing_context.get(CURRENT_TIMESTAMP)
+        if not self.time_conditions or timestamp is None:
+            return self.rule_set
+
+        clock = tuple(timing_context.get(var_name) for var_name in CLOCK_VARS) if self.depends_on_clock else None
+        active_rule_set = self._active_rule_set
+        if active_rule_set:
+            start, end, active_clock, rule_set = active_rule_set
+            if start <= timestamp < end and active_clock == clock:
+                return rule_set
+
+        start, end = self._get_time_window(timestamp)
+        rule_set = self._create_active_rule_set(timing_context)
+        self._active_rule_set = (start, end, clock, rule_set)
+        return rule_set
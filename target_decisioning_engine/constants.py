@@ -41,6 +41,23 @@ CDN_BASE = {
 
 CAMPAIGN_BUCKET_SALT = "0"
 
+ALLOCATION_CACHE = "allocation"
+ALLOCATION_PREFIX_CACHE = "allocation_prefix"
+DEFAULT_ALLOCATION_CACHE_SIZE = 10000
+DEFAULT_ALLOCATION_PREFIX_CACHE_SIZE = 1000
+MACRO_TEMPLATE_CACHE = "macro_template"
+DEFAULT_MACRO_TEMPLATE_CACHE_SIZE = 10000
+PAGE_CONTEXT_CACHE = "page_context"
+DEFAULT_PAGE_CONTEXT_CACHE_SIZE = 10000
+URL_DOMAIN_CACHE = "url_domain"
+DEFAULT_URL_DOMAIN_CACHE_SIZE = 10000
+GEO_LOOKUP_CACHE = "geo_lookup"
+DEFAULT_GEO_LOOKUP_CACHE_SIZE = 10000
+GEO_LOOKUP_CACHE_TTL = 900  # seconds
+GEO_LOOKUP_FAILURE_CACHE = "geo_lookup_failure"
+DEFAULT_GEO_LOOKUP_FAILURE_CACHE_SIZE = 1000
+GEO_LOOKUP_FAILURE_CACHE_TTL = 30  # seconds
+
 # Response token keys
 AUDIENCE_IDS = "audience.ids"
 ACTIVITY_DECISIONING_METHOD = "activity.decisioningMethod"
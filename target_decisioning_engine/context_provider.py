@@ -9,22 +9,29 @@
 # governing permissions and limitations under the License.
 """On Device Decisioning Context Provider"""
 import datetime
+import math
 from copy import copy
 from delivery_api_client import ChannelType
 from delivery_api_client import Context
+from target_decisioning_engine.constants import DEFAULT_PAGE_CONTEXT_CACHE_SIZE
+from target_decisioning_engine.constants import PAGE_CONTEXT_CACHE
 from target_decisioning_engine.types.decisioning_context import UserContext
+from target_decisioning_engine.types.decisioning_context import FrozenPageContext
 from target_decisioning_engine.types.decisioning_context import PageContext
 from target_decisioning_engine.types.decisioning_context import GeoContext
 from target_decisioning_engine.types.decisioning_context import DecisioningContext
 from target_decisioning_engine.types.decisioning_context import TimingContext
 from target_decisioning_engine.utils import parse_url, unflatten
 from target_tools.utils import is_string
-from target_tools.utils import get_epoch_time_milliseconds
-from target_tools.client_info import browser_from_user_agent
-from target_tools.client_info import operating_system_from_user_agent
+from target_tools.constants import MILLISECONDS_IN_SECOND
+from target_tools.utils import EPOCH_START
+from target_tools.utils import SECONDS_IN_MINUTE
+from target_tools.utils import memoize
+from target_tools.client_info import parse_user_agent
 
 EMPTY_CONTEXT = Context(channel=ChannelType.WEB)
 
+
 def get_lower_case_attributes(obj):
     """Put lowercase versions of object attributes onto the object
     :param obj: (dict) dict to traverse, required
@@ -41,30 +48,40 @@ def _create_browser_context(context):
     :param context: (delivery_api_client.Model.context.Context) Delivery API context
     :return: (target_decisioning_engine.types.decisioning_context.UserContext) User context
     """
-    user_agent = context.user_agent or ""
-    browser = browser_from_user_agent(user_agent)
-    platform = operating_system_from_user_agent(user_agent)
+    user_agent_info = parse_user_agent(context.user_agent)
 
-    return UserContext(browserType=browser.get("name", "").lower(),
-                       platform=platform,
+    return UserContext(browserType=user_agent_info.browser_name.lower(),
+                       platform=user_agent_info.operating_system,
                        locale="en",
-                       browserVersion=browser.get("version")
+                       browserVersion=user_agent_info.browser_version
                        )
 
 
-def _create_url_context(url):
-    """Create URL context
+def _parse_url_context(url):
+    """
     :param url: (str) URL
-    :return: (target_decisioning_engine.types.decisioning_context.PageContext) Page context
+    :return: (target_decisioning_engine.types.decisioning_context.FrozenPageContext) Page context
     """
-    if not url or not is_string(url):
-        url = ""
-
     url_attributes = parse_url(url)
     lc_attributes = get_lower_case_attributes(url_attributes)
     url_attributes.update(lc_attributes)
 
-    return PageContext(**url_attributes)
+    return FrozenPageContext(**url_attributes)
+
+
+_parse_url_context_memoized = memoize(_parse_url_context, args_resolver=lambda args, kwargs: args[0],
+                                      max_size=DEFAULT_PAGE_CONTEXT_CACHE_SIZE, name=PAGE_CONTEXT_CACHE)
+
+
+def _create_url_context(url):
+    """Create URL context.  Page contexts are cached by url and shared, so they can not be modified
+    :param url: (str) URL
+    :return: (target_decisioning_engine.types.decisioning_context.FrozenPageContext) Page context
+    """
+    if not url or not is_string(url):
+        url = ""
+
+    return _parse_url_context_memoized(url)
 
 
 def create_page_context(address):
@@ -82,6 +99,7 @@ def create_referring_context(address):
     """
     return _create_url_context(address.referring_url if address else "")
 
+
 def with_lowercase_string_values(obj):
     """Puts lowercase attributes for string values into a nested dictionary and returns the outcome
     :param obj: (dict)
@@ -95,6 +113,7 @@ def with_lowercase_string_values(obj):
             result[key] = with_lowercase_string_values(result[key])
     return result
 
+
 def create_mbox_context(mbox_request):
     """Create mbox context
     :param mbox_request: (delivery_api_client.Model.mbox_request.MboxRequest) Delivery API mbox request
@@ -131,35 +150,104 @@ def two_digit_string(_value):
     return "0{}".format(_value) if _value < 10 else str(_value)
 
 
-def _create_timing_context():
+class TimingContextProvider:
+    """Creates timing contexts.  current_time and current_day only change once a minute, so they are kept for the
+    current minute and only the timestamp is computed for every timing context"""
+
+    def __init__(self, clock=None):
+        """
+        :param clock: (callable) Returns current UTC datetime, defaults to datetime.datetime.utcnow
+        """
+        self.clock = clock
+        # (minute since epoch, current_time, current_day), replaced as a whole so that threads can share it
+        self._minute_values = (None, None, None)
+
+    def _get_minute_values(self, now, minute):
+        """
+        :param now: (datetime.datetime) current UTC datetime
+        :param minute: (int) minutes since epoch for now
+        :return: (tuple) Returns (current_time, current_day) for now
+        """
+        cached_minute, current_time, current_day = self._minute_values
+        if cached_minute == minute:
+            return current_time, current_day
+
+        current_hours = two_digit_string(now.hour)
+        current_minutes = two_digit_string(now.minute)
+        current_time = "{}{}".format(current_hours, current_minutes)  # 24-hour time, UTC, HHmm
+        # now.weekday() gives us Monday as 0 through Sunday as 6.  We want to return Monday as 1 through Sunday as 7
+        current_day = now.weekday() + 1
+        self._minute_values = (minute, current_time, current_day)
+        return current_time, current_day
+
+    def create_timing_context(self):
+        """
+        :return: (target_decisioning_engine.types.decisioning_context.TimingContext) Timing context
+        """
+        now = self.clock() if self.clock else datetime.datetime.utcnow()
+        epoch_seconds = (now - EPOCH_START).total_seconds()
+        current_time, current_day = self._get_minute_values(now, int(epoch_seconds // SECONDS_IN_MINUTE))
+        return TimingContext(current_timestamp=math.ceil(epoch_seconds) * MILLISECONDS_IN_SECOND,
+                             current_time=current_time,
+                             current_day=current_day)
+
+
+# shared by every decisioning engine in the process
+timing_context_provider = TimingContextProvider()
+
+
+def create_timing_context():
     """Create timing context
     :return: (target_decisioning_engine.types.decisioning_context.TimingContext) Timing context
     """
-    now = datetime.datetime.utcnow()
-    current_hours = two_digit_string(now.hour)
-    current_minutes = two_digit_string(now.minute)
-    _current_time = "{}{}".format(current_hours, current_minutes)  # 24-hour time, UTC, HHmm
-    # now.weekday() gives us Monday as 0 through Sunday as 6.  We want to return Monday as 1 through Sunday as 7
-    _current_day = now.weekday() + 1
-    return TimingContext(current_timestamp=get_epoch_time_milliseconds(now),
-                         current_time=_current_time,
-                         current_day=_current_day)
+    return timing_context_provider.create_timing_context()
+
+
+def create_rule_context(request_context, rule_layer):
+    """Create rule context by layering per-rule values over the request-level context.  The request-level context
+    is built once per request and is never mutated, so rules share its nested values and only the top level is copied
+    :param request_context: (target_decisioning_engine.types.decisioning_context.DecisioningContext)
+        request-level decisioning context
+    :param rule_layer: (dict) per-rule context values
+    :return: (target_decisioning_engine.types.decisioning_context.DecisioningContext) Rule context
+    """
+    rule_context = copy(request_context)
+    rule_context.update(rule_layer)
+    return rule_context
+
+
+def _is_needed(context_key, context_keys):
+    """
+    :param context_key: (str) top-level decisioning context key
+    :param context_keys: (set<str>) context keys that are needed, None if all of them are
+    :return: (bool)
+    """
+    return context_keys is None or context_key in context_keys
 
 
-def create_decisioning_context(delivery_request):
+def create_decisioning_context(delivery_request, timing_context=None, context_keys=None):
     """Create decisioning context
     :param delivery_request: (delivery_api_client.Model.delivery_request.DeliveryRequest) Delivery API request
+    :param timing_context: (target_decisioning_engine.types.decisioning_context.TimingContext) Timing context to
+        share between several requests, optional - a new timing context is created if not provided
+    :param context_keys: (set<str>) top-level context keys that are needed, optional - user, page, referring and
+        geo contexts are left empty when not in context_keys, instead of parsing the user agent and URLs
     :return: (target_decisioning_engine.types.decisioning_context.DecisioningContext) Decisioning context
     """
     context = delivery_request.context or EMPTY_CONTEXT
 
-    timing_context = _create_timing_context()
+    if not timing_context:
+        timing_context = create_timing_context()
 
     return DecisioningContext(current_timestamp=timing_context.get("current_timestamp"),
                               current_time=timing_context.get("current_time"),
                               current_day=timing_context.get("current_day"),
-                              user=_create_browser_context(context),
-                              page=create_page_context(context.address),
-                              referring=create_referring_context(context.address),
-                              geo=create_geo_context(context.geo)
+                              user=_create_browser_context(context) if _is_needed("user", context_keys)
+                              else UserContext(),
+                              page=create_page_context(context.address) if _is_needed("page", context_keys)
+                              else PageContext(),
+                              referring=create_referring_context(context.address)
+                              if _is_needed("referring", context_keys) else PageContext(),
+                              geo=create_geo_context(context.geo) if _is_needed("geo", context_keys)
+                              else GeoContext()
                               )
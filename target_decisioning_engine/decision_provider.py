@@ -24,16 +24,16 @@ from target_decisioning_engine.post_processors import remove_page_load_attribute
 from target_decisioning_engine.post_processors import prepare_execute_response
 from target_decisioning_engine.post_processors import prepare_prefetch_response
 from target_decisioning_engine.post_processors import create_response_tokens_post_processor
-from target_decisioning_engine.post_processors import replace_campaign_macros
+from target_decisioning_engine.post_processors import ReplaceCampaignMacros
 from target_decisioning_engine.post_processors import add_trace
-from target_decisioning_engine.filters import by_property_token
+from target_decisioning_engine.post_processors import fuse_post_processors
 from target_decisioning_engine.rule_evaluator import RuleEvaluator
 from target_decisioning_engine.timings import TIMING_GET_OFFER
 from target_decisioning_engine.types.decision_provider_response import DecisionProviderResponse
 from target_decisioning_engine.utils import has_remote_dependency
 from target_decisioning_engine.utils import get_rule_key
 from target_decisioning_engine.notification_provider import NotificationProvider
-from target_decisioning_engine.trace_provider import RequestTracer
+from target_decisioning_engine.trace_provider import create_request_tracer
 from target_tools.utils import flatten_list
 from target_tools.constants import DEFAULT_GLOBAL_MBOX
 from target_tools.logger import get_logger
@@ -60,23 +60,26 @@ def order_by_event_token(metric):
 class DecisionProvider:
     """DecisionProvider"""
 
-    def __init__(self, config, target_options, context, artifact, trace_provider):
+    def __init__(self, config, target_options, context, compiled_artifact, trace_provider):
         """
         :param config: (target_decisioning_engine.types.decisioning_config.DecisioningConfig) config
         :param target_options: (target_decisioning_engine.types.target_delivery_request.TargetDeliveryRequest)
             request options
         :param context: (target_decisioning_engine.types.decisioning_context.DecisioningContext) context
-        :param artifact: (target_decisioning_engine.types.decisioning_artifact.DecisioningArtifact) artifact
+        :param compiled_artifact: (target_decisioning_engine.compiled_artifact.CompiledArtifact) compiled artifact
         :param trace_provider: (target_decisioning_engine.trace_provider.TraceProvider) trace provider
         """
 
         self.perf_tool = get_perf_tool_instance()
         self.context = context
-        self.artifact = artifact
+        self.compiled_artifact = compiled_artifact
+        self.artifact = compiled_artifact.artifact
         self.trace_provider = trace_provider
-        self.response_tokens = artifact.get("responseTokens")
-        self.rules = artifact.get("rules")
-        self.global_mbox_name = artifact.get("globalMbox", DEFAULT_GLOBAL_MBOX)
+        # traces list every evaluated rule, so time-inactive rules are only skipped when tracing is off
+        self.rule_set = compiled_artifact.rule_set if trace_provider.show_traces else \
+            compiled_artifact.get_active_rule_set(context)
+        self.response_tokens = compiled_artifact.response_tokens
+        self.global_mbox_name = self.artifact.get("globalMbox", DEFAULT_GLOBAL_MBOX)
         self.client_id = config.client
         self.request = target_options.request
         self.visitor = target_options.visitor
@@ -84,12 +87,29 @@ class DecisionProvider:
         self.send_notification_func = config.send_notification_func
         self.telemetry_enabled = config.telemetry_enabled if config.telemetry_enabled is not None else True
         self.visitor_id = self.request.id
-        rule_evaluator = RuleEvaluator(self.client_id, self.visitor_id)
+        rule_evaluator = RuleEvaluator(self.client_id, self.visitor_id, self.rule_set)
         self.process_rule = rule_evaluator.process_rule
-        self.dependency = has_remote_dependency(artifact, self.request)
+        self.create_request_detail_context = rule_evaluator.create_request_detail_context
+        self.create_request_detail_layer = rule_evaluator.create_request_detail_layer
+        self.dependency = has_remote_dependency(self.artifact, self.request)
         self.notification_provider = NotificationProvider(self.request, self.visitor, self.send_notification_func,
                                                           self.telemetry_enabled)
 
+    def _get_candidate_rules(self, rules, request_detail, request_detail_layer=None):
+        """
+        :param rules: (tuple<target_decisioning_engine.types.decisioning_artifact.Rule>) ordered rules
+        :param request_detail: (delivery_api_client.Model.request_details.RequestDetails |
+            delivery_api_client.Model.mbox_request.MboxRequest) request details
+        :param request_detail_layer: (dict) request detail layer for request_detail, optional
+        :return: (list<target_decisioning_engine.types.decisioning_artifact.Rule>) Returns rules that may be
+            satisfied.  Every rule is kept when tracing, since traces list every evaluated rule
+        """
+        if self.trace_provider.show_traces or not rules or not self.rule_set.equality_index:
+            return rules
+        return self.rule_set.get_candidate_rules(rules, self.create_request_detail_context(self.context,
+                                                                                           request_detail,
+                                                                                           request_detail_layer))
+
     def _get_decisions(self, mode, post_processors):
         """
         :param mode: ("execute"|"prefetch") request mode
@@ -99,11 +119,7 @@ class DecisionProvider:
         if not getattr(self.request, mode):
             return None
 
-        request_tracer = RequestTracer(self.trace_provider, self.artifact)
-
-        def _view_request_accumulator(_result, key):
-            _result.extend(self.rules.get("views", {}).get(key, []))
-            return _result
+        request_tracer = create_request_tracer(self.trace_provider, self.artifact, mode)
 
         def _handle_view_consequence(consequences, consequence):
             if not consequences.get(consequence.name):
@@ -132,16 +148,14 @@ class DecisionProvider:
 
             consequences = {}
 
-            if request_details and request_details.name:
-                view_rules = self.rules.get("views", {}).get(request_details.name, [])
-            else:
-                view_rules = reduce(_view_request_accumulator, self.rules.get("views", {}).keys(), [])
-
-            view_rules = filter(by_property_token(self.property_token), view_rules)
+            request_detail_layer = self.create_request_detail_layer(self.context, request_details)
+            view_rules = self._get_candidate_rules(
+                self.rule_set.get_view_rules(request_details.name if request_details else None, self.property_token),
+                request_details, request_detail_layer)
 
             matched_rule_keys = set()
-            _post_processors = list(post_processors)
-            _post_processors.extend(additional_post_processors)
+            condition_memo = {}
+            _post_processors = fuse_post_processors(list(post_processors) + additional_post_processors)
 
             for rule in view_rules:
                 rule_key = get_rule_key(rule)
@@ -149,7 +163,8 @@ class DecisionProvider:
 
                 if rule_key not in matched_rule_keys:
                     consequence = self.process_rule(rule, self.context, RequestType.VIEW.value, request_details,
-                                                    _post_processors, request_tracer)
+                                                    _post_processors, request_tracer, condition_memo,
+                                                    request_detail_layer)
 
                 if consequence:
                     matched_rule_keys.add(rule_key)
@@ -170,12 +185,13 @@ class DecisionProvider:
             request_tracer.trace_request(mode, RequestType.MBOX.value, mbox_request, self.context)
 
             consequences = []
-            mbox_rules = filter(by_property_token(self.property_token),
-                                self.rules.get("mboxes", {}).get(mbox_request.name, []))
+            request_detail_layer = self.create_request_detail_layer(self.context, mbox_request)
+            mbox_rules = self._get_candidate_rules(self.rule_set.get_mbox_rules(mbox_request.name, self.property_token),
+                                                   mbox_request, request_detail_layer)
 
             matched_rule_keys = set()
-            _post_processors = list(post_processors)
-            _post_processors.extend(additional_post_processors)
+            condition_memo = {}
+            _post_processors = fuse_post_processors(list(post_processors) + additional_post_processors)
 
             for rule in mbox_rules:
                 rule_key = get_rule_key(rule)
@@ -183,7 +199,8 @@ class DecisionProvider:
 
                 if not is_global_mbox or (is_global_mbox and rule_key not in matched_rule_keys):
                     consequence = self.process_rule(rule, self.context, RequestType.MBOX.value, mbox_request,
-                                                    _post_processors, request_tracer)
+                                                    _post_processors, request_tracer, condition_memo,
+                                                    request_detail_layer)
 
                 if consequence:
                     consequences.append(consequence)
@@ -252,6 +269,7 @@ class DecisionProvider:
         page_load = getattr(self.request, mode).page_load
         response.page_load = _process_page_load_request(page_load)
 
+        request_tracer.flush()
         return response
 
     def _prepare_notification(self, rule, mbox_response, request_type, request_detail, tracer):
@@ -288,12 +306,15 @@ class DecisionProvider:
         all_post_processors.extend(post_processors)
         return self._get_decisions("prefetch", all_post_processors)
 
-    def run(self):
-        """Public function for executing decisioning logic
+    def get_decisions(self):
+        """Executes decisioning logic without sending notifications, pending notifications are left on
+        self.notification_provider
         :return: (target_decisioning_engine.types.decision_provider_response.DecisionProviderResponse)
         """
         self.perf_tool.time_start(TIMING_GET_OFFER)
-        add_response_tokens = create_response_tokens_post_processor(self.context, self.response_tokens)
+        add_response_tokens = create_response_tokens_post_processor(self.context, self.response_tokens,
+                                                                    self.compiled_artifact.rule_response_tokens)
+        replace_campaign_macros = ReplaceCampaignMacros(self.compiled_artifact.macro_templates)
         common_post_processor = [add_response_tokens, replace_campaign_macros, add_trace]
         response = DecisionProviderResponse(
             status=PARTIAL_CONTENT if self.dependency.get("remote_needed") is True else OK,
@@ -308,6 +329,13 @@ class DecisionProvider:
 
         telemetry_entry = TelemetryEntry(execution=self.perf_tool.time_end(TIMING_GET_OFFER))
         self.notification_provider.add_telemetry_entry(telemetry_entry)
-        self.notification_provider.send_notifications()
         logger.debug("{} - REQUEST: {} /n RESPONSE: {}".format(LOG_TAG, self.request, response))
         return response
+
+    def run(self):
+        """Public function for executing decisioning logic
+        :return: (target_decisioning_engine.types.decision_provider_response.DecisionProviderResponse)
+        """
+        response = self.get_decisions()
+        self.notification_provider.send_notifications()
+        return response
@@ -21,9 +21,18 @@ from threading import Thread
 from copy import deepcopy
 import urllib3
 from delivery_api_client import Geo
+from target_tools.cache import LRUCache
+from target_tools.cache import MISSING
+from target_tools.cache import register_cache
 from target_tools.logger import get_logger
 from target_tools.utils import noop
 from target_tools.utils import parse_float
+from target_decisioning_engine.constants import DEFAULT_GEO_LOOKUP_CACHE_SIZE
+from target_decisioning_engine.constants import DEFAULT_GEO_LOOKUP_FAILURE_CACHE_SIZE
+from target_decisioning_engine.constants import GEO_LOOKUP_CACHE
+from target_decisioning_engine.constants import GEO_LOOKUP_CACHE_TTL
+from target_decisioning_engine.constants import GEO_LOOKUP_FAILURE_CACHE
+from target_decisioning_engine.constants import GEO_LOOKUP_FAILURE_CACHE_TTL
 from target_decisioning_engine.constants import HTTP_GET
 from target_decisioning_engine.constants import OK
 from target_decisioning_engine.events import GEO_LOCATION_UPDATED
@@ -69,6 +78,14 @@ GEO_MAPPINGS = [
     }
 ]
 
+# IP-to-Geo lookup results keyed by (geo lookup path, ip address), shared by every GeoProvider in the process.
+# Failed lookups are remembered for a shorter time, so a failing endpoint is not called on every request
+geo_lookup_cache = register_cache(GEO_LOOKUP_CACHE,
+                                  LRUCache(DEFAULT_GEO_LOOKUP_CACHE_SIZE, ttl=GEO_LOOKUP_CACHE_TTL))
+geo_lookup_failure_cache = register_cache(GEO_LOOKUP_FAILURE_CACHE,
+                                          LRUCache(DEFAULT_GEO_LOOKUP_FAILURE_CACHE_SIZE,
+                                                   ttl=GEO_LOOKUP_FAILURE_CACHE_TTL))
+
 
 def _map_geo_values(value_fn, initial=None):
     """
@@ -148,9 +165,10 @@ class GeoProvider:
         request_thread.join()
         return result.get()
 
-    def valid_geo_request_context(self, geo_request_context=None):
+    def valid_geo_request_context(self, geo_request_context=None, lookup_required=True):
         """
         :param geo_request_context: (delivery_api_client.Model.geo.Geo) geo object
+        :param lookup_required: (bool) whether decisions may depend on geo, the geo lookup is skipped if not
         :return: (delivery_api_client.Model.geo.Geo) geo object
         """
         if not geo_request_context:
@@ -161,24 +179,48 @@ class GeoProvider:
         # When ipAddress is the only geo value passed in to getOffers(), do IP-to-Geo lookup.
         geo_lookup_path = get_geo_lookup_path(self.config)
 
-        if self.geo_targeting_enabled and is_missing_geo_fields(geo_request_context):
+        if self.geo_targeting_enabled and lookup_required and is_missing_geo_fields(geo_request_context):
             headers = {}
 
             if geo_request_context.ip_address:
                 headers[HTTP_HEADER_FORWARDED_FOR] = geo_request_context.ip_address
 
-            try:
-                response = self._request_geo(geo_lookup_path, headers)
-                return self.geo_response_handler(response, validated_geo_request_context)
-            except Exception as err:
-                self.logger.error("Exception while fetching geo data at: {} - error: {}".format(geo_lookup_path,
-                                                                                                (str(err))))
+            # without an ip address the lookup resolves the address of this host, so only ip lookups are cached.
+            # Only the looked up values are cached, they are merged into the geo context of every request
+            cache_key = (geo_lookup_path, geo_request_context.ip_address) if geo_request_context.ip_address \
+                else None
+            if cache_key is not None and geo_lookup_failure_cache.get(cache_key, MISSING) is not MISSING:
+                return None
+            geo_values = geo_lookup_cache.get(cache_key) if cache_key is not None else None
+
+            if geo_values is None:
+                try:
+                    response = self._request_geo(geo_lookup_path, headers)
+                    geo_values = self._get_geo_values(response)
+                except Exception as err:
+                    self.logger.error("Exception while fetching geo data at: {} - error: {}".format(
+                        geo_lookup_path, (str(err))))
+
+                if cache_key is not None:
+                    if geo_values is None:
+                        geo_lookup_failure_cache.set(cache_key, True)
+                    else:
+                        geo_lookup_cache.set(cache_key, geo_values)
+
+            if geo_values is None:
                 return None
+            return self._geo_location_updated(create_or_update_geo_object(
+                geo_data=geo_values,
+                existing_geo_context=validated_geo_request_context
+            ))
 
         return validated_geo_request_context
 
-    def geo_response_handler(self, response, validated_geo_request_context):
-        """Process geo response"""
+    def _get_geo_values(self, response):
+        """
+        :param response: (urllib3.response.HTTPResponse) geo lookup response
+        :return: (dict) Returns geo values keyed by geo header name, None if the lookup failed
+        """
         if response.status != OK:
             self.logger.error("{} status code while fetching geo data at: {} - message: {}".format(
                 response.status,
@@ -188,13 +230,28 @@ class GeoProvider:
             return None
 
         geo_payload = json.loads(response.data)
-        validated_geo_request_context = create_or_update_geo_object(
-            geo_data=geo_payload,
-            existing_geo_context=validated_geo_request_context
-        )
+        return {geo_mapping.get("header_name"): geo_payload.get(geo_mapping.get("header_name"))
+                for geo_mapping in GEO_MAPPINGS}
 
+    def _geo_location_updated(self, geo_context):
+        """
+        :param geo_context: (delivery_api_client.Model.geo.Geo) geo object resolved by IP-to-Geo lookup
+        :return: (delivery_api_client.Model.geo.Geo) Returns geo_context, after emitting GEO_LOCATION_UPDATED
+        """
         self.event_emitter(GEO_LOCATION_UPDATED, {
-            "geo_context": validated_geo_request_context
+            "geo_context": geo_context
         })
+        return geo_context
 
-        return validated_geo_request_context
+    def geo_response_handler(self, response, validated_geo_request_context):
+        """Process geo response"""
+        geo_values = self._get_geo_values(response)
+        if geo_values is None:
+            return None
+
+        validated_geo_request_context = create_or_update_geo_object(
+            geo_data=geo_values,
+            existing_geo_context=validated_geo_request_context
+        )
+
+        return self._geo_location_updated(validated_geo_request_context)
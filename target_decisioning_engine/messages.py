@@ -33,6 +33,11 @@ def invalid_environment(expected_environment, default_environment):
         .format(expected_environment, default_environment)
 
 
+def trace_sink_error(reason):
+    """trace_sink_error message"""
+    return "Failed to write trace records: {}".format(reason)
+
+
 MESSAGES = {
     "ERROR_MAX_RETRY": error_max_retry,
     "ARTIFACT_NOT_AVAILABLE": "The decisioning artifact is not available",
@@ -42,5 +47,6 @@ MESSAGES = {
     "INVALID_ENVIRONMENT": invalid_environment,
     "NOT_APPLICABLE": "Not Applicable",
     "ARTIFACT_OBFUSCATION_ERROR": "Unable to read artifact JSON",
-    "UNKNOWN": "unknown"
+    "UNKNOWN": "unknown",
+    "TRACE_SINK_ERROR": trace_sink_error
 }
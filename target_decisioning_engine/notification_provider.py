@@ -87,13 +87,15 @@ class NotificationProvider:
         entry.features = TelemetryFeatures(decisioning_method=DecisioningMethod.ON_DEVICE)
         self.telemetry_entries.append(entry)
 
-    def send_notifications(self):
-        """Send notifications via the send_notification_func"""
+    def create_notification_options(self):
+        """Creates send_notification_func options for all pending notifications and telemetry entries, and clears them
+        :return: (dict) send notification options, or None if there is nothing to send
+        """
         self.logger.debug("{}.send_notifications - Notifications: {} \nTelemetry Entries: {}"
                           .format(LOG_TAG, self.notifications, self.telemetry_entries))
 
         if not self.notifications and not self.telemetry_entries:
-            return
+            return None
 
         _id = self.request.id
         context = self.request.context
@@ -108,7 +110,38 @@ class NotificationProvider:
             "visitor": self.visitor
         }
 
-        async_send = threading.Thread(target=self.send_notification_func, args=(send_notification_opts,))
-        async_send.start()
         self.notifications = []
         self.telemetry_entries = []
+        return send_notification_opts
+
+    def send_notifications(self):
+        """Send notifications via the send_notification_func"""
+        send_notification_opts = self.create_notification_options()
+        if not send_notification_opts:
+            return
+
+        async_send = threading.Thread(target=self.send_notification_func, args=(send_notification_opts,))
+        async_send.start()
+
+
+def _send_each(send_notification_func, send_notification_opts_list):
+    """
+    :param send_notification_func: (callable) function used to send the notification
+    :param send_notification_opts_list: (list<dict>) send notification options
+    """
+    for send_notification_opts in send_notification_opts_list:
+        send_notification_func(send_notification_opts)
+
+
+def send_notifications_batch(send_notification_func, send_notification_opts_list):
+    """Sends the notifications of several requests from a single background thread.  Each request keeps its own
+    delivery request, since notifications are attributed to the visitor and context of the request that created them
+    :param send_notification_func: (callable) function used to send the notification
+    :param send_notification_opts_list: (list<dict>) send notification options created by
+        NotificationProvider.create_notification_options
+    """
+    if not send_notification_opts_list or not callable(send_notification_func):
+        return
+
+    async_send = threading.Thread(target=_send_each, args=(send_notification_func, send_notification_opts_list))
+    async_send.start()
@@ -8,19 +8,18 @@
 # OF ANY KIND, either express or implied. See the License for the specific language
 # governing permissions and limitations under the License.
 """Post-processing functions for DecisionProvider"""
-try:
-    from functools import reduce
-except ImportError:
-    pass
 import re
-from copy import deepcopy
+from collections import namedtuple
+from copy import copy
 from delivery_api_client import MetricType
 from delivery_api_client import OptionType
 import target_decisioning_engine.constants as DecisioningConstants
 from target_decisioning_engine.enums import RequestType
 from target_tools.utils import is_string
 from target_tools.utils import get_value_from_object
+from target_tools.utils import memoize
 from target_tools.response_helpers import create_action
+from target_tools.cache import MISSING
 
 
 
@@ -46,10 +45,132 @@ RESPONSE_TOKEN_KEYS = [
     DecisioningConstants.OPTION_NAME
 ]
 
+GEO_RESPONSE_TOKEN_KEYS = [
+    (DecisioningConstants.GEO_CITY, "city"),
+    (DecisioningConstants.GEO_COUNTRY, "country"),
+    (DecisioningConstants.GEO_STATE, "region"),
+    (DecisioningConstants.GEO_LATITUDE, "latitude"),
+    (DecisioningConstants.GEO_LONGITUDE, "longitude")
+]
+
 MACRO_NAME_REPLACEMENTS_REGEX = r"{}".format("|".join(MACRO_NAME_REPLACEMENTS.keys()))
 
 MACRO_NAME_REMOVALS = ["mbox"]
 
+MACRO_PATTERN = re.compile(MACRO_PATTERN_REGEX, re.IGNORECASE)
+
+MACRO_NAME_REPLACEMENTS_PATTERN = re.compile(MACRO_NAME_REPLACEMENTS_REGEX, re.IGNORECASE)
+
+PostProcessingContext = namedtuple("PostProcessingContext",
+                                   ["rule", "mbox_response", "request_type", "request_detail", "tracer"])
+
+
+class PostProcessor:
+    """Post-processor made of per-option, metrics and response hooks, so that several of them can be fused into a
+    single pass.  Hooks get a PostProcessingContext, whose mbox_response is the response before any of the fused
+    post-processors ran.  A PostProcessor can also be called like any other post-processor"""
+
+    def keep_option(self, _option, context):
+        """
+        :param _option: (delivery_api_client.Model.option.Option) option
+        :param context: (target_decisioning_engine.post_processors.PostProcessingContext) context
+        :return: (bool) Returns False to remove the option from the response
+        """
+        return True
+
+    def process_option(self, _option, index, context):
+        """
+        :param _option: (delivery_api_client.Model.option.Option) option copy, can be updated in place
+        :param index: (int) index of the option among options that were kept by preceding post-processors
+        :param context: (target_decisioning_engine.post_processors.PostProcessingContext) context
+        :return: (delivery_api_client.Model.option.Option) Returns processed option
+        """
+        return _option
+
+    def process_metrics(self, metrics, context):
+        """
+        :param metrics: (list<delivery_api_client.Model.metric.Metric>) metrics, must not be updated in place
+        :param context: (target_decisioning_engine.post_processors.PostProcessingContext) context
+        :return: (list<delivery_api_client.Model.metric.Metric>) Returns processed metrics
+        """
+        return metrics
+
+    def process_response(self, mbox_response, context):
+        """Runs after options and metrics are processed
+        :param mbox_response: (delivery_api_client.Model.mbox_response.MboxResponse) response copy, can be updated
+            in place apart from its options and metrics
+        :param context: (target_decisioning_engine.post_processors.PostProcessingContext) context
+        :return: (delivery_api_client.Model.mbox_response.MboxResponse) Returns processed response
+        """
+        return mbox_response
+
+    def processes_options(self):
+        """Checks if the post-processor has option hooks"""
+        return type(self).keep_option is not PostProcessor.keep_option or \
+            type(self).process_option is not PostProcessor.process_option
+
+    def __call__(self, rule, mbox_response, request_type, request_detail, tracer):
+        """
+        :param rule: (target_decisioning_engine.types.decisioning_artifact.Rule) rule
+        :param mbox_response: (delivery_api_client.Model.mbox_response.MboxResponse) mbox response
+        :param request_type: ( "mbox"|"view"|"pageLoad") request type
+        :param request_detail: (delivery_api_client.Model.request_details.RequestDetails) request details
+        :param tracer: (target_decisioning_engine.trace_provider.RequestTracer) request tracer
+        :return: (delivery_api_client.Model.mbox_response.MboxResponse) Returns processed copy of mbox_response
+        """
+        return FusedPostProcessor([self])(rule, mbox_response, request_type, request_detail, tracer)
+
+
+class FusedPostProcessor:
+    """Runs several PostProcessors in a single pass over options and metrics, copying the response and every
+    option only once.  The result is the same as running them one after the other"""
+
+    def __init__(self, stages):
+        """
+        :param stages: (list<target_decisioning_engine.post_processors.PostProcessor>) post-processors, in order
+        """
+        self.stages = tuple(stages)
+        self.option_stages = tuple(stage for stage in self.stages if stage.processes_options())
+
+    def process_options(self, options, context):
+        """
+        :param options: (list<delivery_api_client.Model.option.Option>) options
+        :param context: (target_decisioning_engine.post_processors.PostProcessingContext) context
+        :return: (list<delivery_api_client.Model.option.Option>) Returns processed option copies
+        """
+        positions = [0] * len(self.option_stages)
+        result = []
+        for _option in options or []:
+            _option = copy(_option)
+            for position, stage in enumerate(self.option_stages):
+                if not stage.keep_option(_option, context):
+                    _option = None
+                    break
+                _option = stage.process_option(_option, positions[position], context)
+                positions[position] += 1
+            if _option is not None:
+                result.append(_option)
+        return result
+
+    def __call__(self, rule, mbox_response, request_type, request_detail, tracer):
+        """
+        :param rule: (target_decisioning_engine.types.decisioning_artifact.Rule) rule
+        :param mbox_response: (delivery_api_client.Model.mbox_response.MboxResponse) mbox response
+        :param request_type: ( "mbox"|"view"|"pageLoad") request type
+        :param request_detail: (delivery_api_client.Model.request_details.RequestDetails) request details
+        :param tracer: (target_decisioning_engine.trace_provider.RequestTracer) request tracer
+        :return: (delivery_api_client.Model.mbox_response.MboxResponse) Returns processed copy of mbox_response
+        """
+        context = PostProcessingContext(rule, mbox_response, request_type, request_detail, tracer)
+        result = copy(mbox_response)
+        if self.option_stages:
+            result.options = self.process_options(mbox_response.options, context)
+        for stage in self.stages:
+            result.metrics = stage.process_metrics(result.metrics, context)
+        for stage in self.stages:
+            result = stage.process_response(result, context)
+        return result
+
 
 def no_blank_options(_option):
     """
@@ -68,28 +189,21 @@ def update_execute_option(_option):
     return _option
 
 
-def prepare_execute_response(rule, mbox_response, request_type, request_detail, tracer):
-    """
-    :param rule: (target_decisioning_engine.types.decisioning_artifact.Rule) rule
-    :param mbox_response: (delivery_api_client.Model.mbox_response.MboxResponse) mbox response
-    :param request_type: ( "mbox"|"view"|"pageLoad") request type
-    :param request_detail: (delivery_api_client.Model.request_details.RequestDetails) request details
-    :param tracer: (target_decisioning_engine.trace_provider.RequestTracer) request tracer
-    :return: (delivery_api_client.Model.mbox_response.MboxResponse)
-        Returns mbox response with updated options and metrics
-    """
-    metrics = mbox_response.metrics or []
-    options = mbox_response.options or []
+class PrepareExecuteResponse(PostProcessor):
+    """Removes blank options and event tokens, and keeps only click metrics if there are any"""
 
-    result = deepcopy(mbox_response)
-    result.options = \
-        [update_execute_option(pristine_option) for pristine_option in options if no_blank_options(pristine_option)]
+    def keep_option(self, _option, context):
+        return no_blank_options(_option)
 
-    filtered_metrics = [metric for metric in metrics if metric.type == MetricType.CLICK]
-    if filtered_metrics:
-        result.metrics = filtered_metrics
+    def process_option(self, _option, index, context):
+        return update_execute_option(_option)
+
+    def process_metrics(self, metrics, context):
+        filtered_metrics = [metric for metric in metrics or [] if metric.type == MetricType.CLICK]
+        return filtered_metrics if filtered_metrics else metrics
 
-    return result
+
+prepare_execute_response = PrepareExecuteResponse()
 
 
 def update_prefetch_option(mbox_response, _option, index):
@@ -108,59 +222,41 @@ def update_prefetch_option(mbox_response, _option, index):
     return _option
 
 
-def prepare_prefetch_response(rule, mbox_response, request_type, request_detail, tracer):
-    """
-    :param rule: (target_decisioning_engine.types.decisioning_artifact.Rule) rule
-    :param mbox_response: (delivery_api_client.Model.mbox_response.MboxResponse) mbox response
-    :param request_type: ( "mbox"|"view"|"pageLoad") request type
-    :param request_detail: (delivery_api_client.Model.request_details.RequestDetails) request details
-    :param tracer: (target_decisioning_engine.trace_provider.RequestTracer) request tracer
-    :return: (delivery_api_client.Model.mbox_response.MboxResponse)
-        Returns mbox response with updated options and metrics
-    """
-    mbox_response_copy = deepcopy(mbox_response)
-    options = mbox_response_copy.options or []
+class PreparePrefetchResponse(PostProcessor):
+    """Adds display metric event tokens to options that have none, and removes metrics unless it is a view"""
 
-    mbox_response_copy.options = \
-        [update_prefetch_option(mbox_response_copy, pristine_option, index) for index, pristine_option
-         in enumerate(options)]
+    def process_option(self, _option, index, context):
+        return update_prefetch_option(context.mbox_response, _option, index)
 
-    if request_type != RequestType.VIEW.value:
-        mbox_response_copy.metrics = None
+    def process_metrics(self, metrics, context):
+        return metrics if context.request_type == RequestType.VIEW.value else None
 
-    return mbox_response_copy
 
+prepare_prefetch_response = PreparePrefetchResponse()
 
-def add_trace(rule, mbox_response, request_type, request_detail, tracer):
-    """
-    :param rule: (target_decisioning_engine.types.decisioning_artifact.Rule) rule
-    :param mbox_response: (delivery_api_client.Model.mbox_response.MboxResponse) mbox response
-    :param request_type: ( "mbox"|"view"|"pageLoad") request type
-    :param request_detail: (delivery_api_client.Model.request_details.RequestDetails) request details
-    :param tracer: (target_decisioning_engine.trace_provider.RequestTracer) request tracer
-    :return: (delivery_api_client.Model.mbox_response.MboxResponse)
-        Returns mbox response with updated options and metrics
-    """
-    result = deepcopy(mbox_response)
-    result.trace = tracer.get_trace_result()
-    return result
 
+class AddTrace(PostProcessor):
+    """Adds the trace result"""
+
+    def process_response(self, mbox_response, context):
+        mbox_response.trace = context.tracer.get_trace_result()
+        return mbox_response
 
-def remove_page_load_attributes(rule, mbox_response, request_type, request_detail, tracer):
-    """
-    :param rule: (target_decisioning_engine.types.decisioning_artifact.Rule) rule
-    :param mbox_response: (delivery_api_client.Model.mbox_response.MboxResponse) mbox response
-    :param request_type: ( "mbox"|"view"|"pageLoad") request type
-    :param request_detail: (delivery_api_client.Model.request_details.RequestDetails) request details
-    :param tracer: (target_decisioning_engine.trace_provider.RequestTracer) request tracer
-    :return: (delivery_api_client.Model.mbox_response.MboxResponse)
-        Returns mbox response with updated options and metrics
-    """
-    processed = deepcopy(mbox_response)
-    processed.index = None
-    processed.name = None
-    processed.trace = None
-    return processed
+
+add_trace = AddTrace()
+
+
+class RemovePageLoadAttributes(PostProcessor):
+    """Removes index, name and trace, which page load responses do not have"""
+
+    def process_response(self, mbox_response, context):
+        mbox_response.index = None
+        mbox_response.name = None
+        mbox_response.trace = None
+        return mbox_response
+
+
+remove_page_load_attributes = RemovePageLoadAttributes()
 
 
 def add_response_tokens_to_option(_option, response_tokens, response_tokens_from_meta):
@@ -175,144 +271,246 @@ def add_response_tokens_to_option(_option, response_tokens, response_tokens_from
     return _option
 
 
-def create_response_tokens_post_processor(context, response_tokens_in_artifact=None):
+def get_response_tokens_from_meta(rule, response_tokens_in_artifact):
+    """
+    :param rule: (target_decisioning_engine.types.decisioning_artifact.Rule) rule
+    :param response_tokens_in_artifact: (set<str>) response tokens in decision artifact
+    :return: (dict) Returns response tokens from rule meta that are enabled in the artifact
+    """
+    meta = rule.get("meta", {})
+    return {response_token_key: meta[response_token_key] for response_token_key in RESPONSE_TOKEN_KEYS
+            if response_token_key in response_tokens_in_artifact and response_token_key in meta}
+
+
+def get_rule_response_tokens(rules, response_tokens_in_artifact):
+    """
+    :param rules: (list<target_decisioning_engine.types.decisioning_artifact.Rule>) rules
+    :param response_tokens_in_artifact: (set<str>) response tokens in decision artifact
+    :return: (dict) Returns response tokens from rule meta keyed by rule identity
+    """
+    return {id(rule): get_response_tokens_from_meta(rule, response_tokens_in_artifact) for rule in rules}
+
+
+class AddResponseTokens(PostProcessor):
+    """Adds response tokens from the decisioning context and rule meta to every option"""
+
+    def __init__(self, response_tokens_in_artifact, response_tokens, rule_response_tokens=None):
+        """
+        :param response_tokens_in_artifact: (set<str>) response tokens in decision artifact
+        :param response_tokens: (dict) response tokens from decisioning context
+        :param rule_response_tokens: (dict) response tokens from rule meta keyed by rule identity, optional
+        """
+        self.response_tokens_in_artifact = response_tokens_in_artifact
+        self.response_tokens = response_tokens
+        self.rule_response_tokens = rule_response_tokens or {}
+
+    def get_response_tokens_from_meta(self, rule):
+        """
+        :param rule: (target_decisioning_engine.types.decisioning_artifact.Rule) rule
+        :return: (dict) Returns response tokens from rule meta that are enabled in the artifact
+        """
+        response_tokens_from_meta = self.rule_response_tokens.get(id(rule))
+        if response_tokens_from_meta is None:
+            return get_response_tokens_from_meta(rule, self.response_tokens_in_artifact)
+        return response_tokens_from_meta
+
+    def process_option(self, _option, index, context):
+        return add_response_tokens_to_option(_option, self.response_tokens,
+                                             self.get_response_tokens_from_meta(context.rule))
+
+
+def create_response_tokens_post_processor(context, response_tokens_in_artifact=None, rule_response_tokens=None):
     """
     :param context: (target_decisioning_engine.types.decisioning_context.DecisioningContext) decisioning context
-    :param response_tokens_in_artifact: (list<str>) list of response tokens in decision artifact
-    :return: (callable) Returns function that adds response tokens to mbox response
+    :param response_tokens_in_artifact: (set<str>) response tokens in decision artifact
+    :param rule_response_tokens: (dict) response tokens from rule meta keyed by rule identity, computed once per
+        artifact, optional
+    :return: (target_decisioning_engine.post_processors.AddResponseTokens) Returns post-processor that adds
+        response tokens to mbox response
     """
-    if not response_tokens_in_artifact:
-        response_tokens_in_artifact = []
+    if not isinstance(response_tokens_in_artifact, (set, frozenset)):
+        response_tokens_in_artifact = frozenset(response_tokens_in_artifact or [])
 
     response_tokens = {
         DecisioningConstants.ACTIVITY_DECISIONING_METHOD: "on-device"
     }
 
     geo = context.get("geo", {})
-    if DecisioningConstants.GEO_CITY in response_tokens_in_artifact and geo.get("city"):
-        response_tokens[DecisioningConstants.GEO_CITY] = geo.get("city")
+    for response_token_key, geo_key in GEO_RESPONSE_TOKEN_KEYS:
+        if response_token_key in response_tokens_in_artifact and geo.get(geo_key):
+            response_tokens[response_token_key] = geo.get(geo_key)
 
-    if DecisioningConstants.GEO_COUNTRY in response_tokens_in_artifact and geo.get("country"):
-        response_tokens[DecisioningConstants.GEO_COUNTRY] = geo.get("country")
+    return AddResponseTokens(response_tokens_in_artifact, response_tokens, rule_response_tokens)
 
-    if DecisioningConstants.GEO_STATE in response_tokens_in_artifact and geo.get("region"):
-        response_tokens[DecisioningConstants.GEO_STATE] = geo.get("region")
 
-    if DecisioningConstants.GEO_LATITUDE in response_tokens_in_artifact and geo.get("latitude"):
-        response_tokens[DecisioningConstants.GEO_LATITUDE] = geo.get("latitude")
-
-    if DecisioningConstants.GEO_LONGITUDE in response_tokens_in_artifact and geo.get("longitude"):
-        response_tokens[DecisioningConstants.GEO_LONGITUDE] = geo.get("longitude")
-
-    def add_response_tokens(rule, mbox_response, request_type, request_detail, tracer):
+def get_macro_key(macro_name):
+    """
+    :param macro_name: (str) macro name, i.e. campaign.id in ${campaign.id}
+    :return: (str) Returns key that the macro value is looked up by, i.e. activity.id
+    """
+    def replace_group_match(group_match):
         """
-        :param rule: (target_decisioning_engine.types.decisioning_artifact.Rule) rule
-        :param mbox_response: (delivery_api_client.Model.mbox_response.MboxResponse) mbox response
-        :param request_type: ( "mbox"|"view"|"pageLoad") request type
-        :param request_detail: (delivery_api_client.Model.request_details.RequestDetails) request details
-        :param tracer: (target_decisioning_engine.trace_provider.RequestTracer) request tracer
-        :return: (delivery_api_client.Model.mbox_response.MboxResponse) mbox response
+        :param group_match: (MatchObject) match found by regex pattern
+        :return: (str) Returns replacement string
         """
-        mbox_response_copy = deepcopy(mbox_response)
-        meta = rule.get("meta", {})
+        return MACRO_NAME_REPLACEMENTS[group_match.group(0)]
 
-        def response_token_accumulator(result, response_token_key):
-            """Used in reduce fn to gather response tokens"""
-            if response_token_key in response_tokens_in_artifact and response_token_key in meta:
-                result[response_token_key] = meta[response_token_key]
+    parts = MACRO_NAME_REPLACEMENTS_PATTERN.sub(replace_group_match, macro_name).split(".")
+    if len(parts) > 2:
+        parts = parts[len(parts) - 2:]
+    filtered = [part for part in parts if part not in MACRO_NAME_REMOVALS]
+    return ".".join(filtered)
 
-            return result
 
-        response_tokens_from_meta = reduce(response_token_accumulator, RESPONSE_TOKEN_KEYS, {})
-        options = [add_response_tokens_to_option(option, response_tokens, response_tokens_from_meta)
-                   for option in mbox_response_copy.options]
+def parse_macro_template(content):
+    """
+    :param content: (str) offer content
+    :return: (tuple) Returns content split into (literal, macro key, macro) segments followed by the trailing
+        literal, None if content has no macros
+    """
+    segments = []
+    position = 0
+    for match in MACRO_PATTERN.finditer(content):
+        segments.append((content[position:match.start()], get_macro_key(match.group(1)), match.group(0)))
+        position = match.end()
+    if not segments:
+        return None
+    segments.append(content[position:])
+    return tuple(segments)
 
-        mbox_response_copy.options = options
-        return mbox_response_copy
 
-    return add_response_tokens
+get_macro_template = memoize(parse_macro_template, max_size=DecisioningConstants.DEFAULT_MACRO_TEMPLATE_CACHE_SIZE,
+                             name=DecisioningConstants.MACRO_TEMPLATE_CACHE)
 
 
-def add_campaign_macro_values(html_content, rule, request_detail):
+def get_offer_contents(consequence):
+    """
+    :param consequence: (dict) decision consequence in form of an mbox response
+    :return: (list<str>) Returns html and action offer content that campaign macros are replaced in
+    """
+    result = []
+    for _option in (consequence or {}).get("options") or []:
+        content = _option.get("content")
+        if _option.get("type") == OptionType.HTML:
+            result.append(content)
+        if _option.get("type") == OptionType.ACTIONS:
+            result.extend(action.get("content") for action in content or [] if isinstance(action, dict))
+    return [content for content in result if content and is_string(content)]
+
+
+def get_rule_macro_templates(rules):
+    """
+    :param rules: (list<target_decisioning_engine.types.decisioning_artifact.Rule>) rules
+    :return: (dict) Returns macro templates of offer contents keyed by content, keyed by rule identity.
+        Contents with unknown macro names are left out, they fail when the offer is served
+    """
+    result = {}
+    for rule in rules:
+        templates = result[id(rule)] = {}
+        for content in get_offer_contents(rule.get("consequence")):
+            try:
+                templates[content] = parse_macro_template(content)
+            except KeyError:
+                continue
+    return result
+
+
+def add_campaign_macro_values(html_content, rule, request_detail, templates=None):
     """
     :param html_content: (str) html offer content
     :param rule: (target_decisioning_engine.types.decisioning_artifact.Rule) rule
     :param request_detail: (delivery_api_client.Model.request_details.RequestDetails) request details
+    :param templates: (dict) macro templates of the rule offer contents keyed by content, optional
     :return: (str) Returns html content with updated campaign content
     """
     if not html_content or not is_string(html_content):
         return html_content
 
-    def replace_match(match):
-        """
-        :param match: (MatchObject) match found by regex pattern
-        :return: (str) Returns replacement string
-        """
+    template = templates.get(html_content, MISSING) if templates is not None else MISSING
+    if template is MISSING:
+        template = get_macro_template(html_content)
+    if not template:
+        return html_content
 
-        def replace_group_match(group_match):
-            """
-            :param group_match: (MatchObject) match found by regex pattern
-            :return: (str) Returns replacement string
-            """
-            return MACRO_NAME_REPLACEMENTS[group_match.group(0)]
-
-        if not match or not len(match.groups()) > 0:
-            return match.group(0)  # entire match
-
-        macro_key = match.group(1)
-        parts = re.sub(MACRO_NAME_REPLACEMENTS_REGEX, replace_group_match, macro_key, flags=re.IGNORECASE).split(".")
-        if len(parts) > 2:
-            parts = parts[len(parts) - 2:]
-        filtered = [part for part in parts if part not in MACRO_NAME_REMOVALS]
-        key = ".".join(filtered)
-        parameters = request_detail.parameters if request_detail and request_detail.parameters else {}
-        for item in [rule.get("meta"), request_detail, parameters]:
-            replacement = get_value_from_object(item, key)
-            if replacement is not None:
-                return str(replacement)
-        return match.group(0)
-
-    return re.sub(MACRO_PATTERN_REGEX, replace_match, html_content, flags=re.IGNORECASE)
-
-
-def update_action_campaign_content(action, rule, request_detail):
+    parameters = request_detail.parameters if request_detail and request_detail.parameters else {}
+    sources = [rule.get("meta"), request_detail, parameters]
+
+    result = []
+    for literal, key, macro in template[:-1]:
+        result.append(literal)
+        replacement = macro
+        for item in sources:
+            value = get_value_from_object(item, key)
+            if value is not None:
+                replacement = str(value)
+                break
+        result.append(replacement)
+    result.append(template[-1])
+    return "".join(result)
+
+
+def update_action_campaign_content(action, rule, request_detail, templates=None):
     """
     :param action: (delivery_api_client.Model.action.Action) offer action
     :param rule: (target_decisioning_engine.types.decisioning_artifact.Rule) rule
     :param request_detail: (delivery_api_client.Model.request_details.RequestDetails) request details
+    :param templates: (dict) macro templates of the rule offer contents keyed by content, optional
     :return: (delivery_api_client.Model.action.Action) Returns action with updated campaign content
     """
-    action.content = add_campaign_macro_values(action.content, rule, request_detail)
+    action.content = add_campaign_macro_values(action.content, rule, request_detail, templates)
     return action
 
 
-def update_option_campaign_content(_option, rule, request_detail):
+def update_option_campaign_content(_option, rule, request_detail, templates=None):
     """
     :param _option: (delivery_api_client.Model.option.Option) response option
     :param rule: (target_decisioning_engine.types.decisioning_artifact.Rule) rule
     :param request_detail: (delivery_api_client.Model.request_details.RequestDetails) request details
+    :param templates: (dict) macro templates of the rule offer contents keyed by content, optional
     :return:  (delivery_api_client.Model.option.Option) Returns option with updated campaign content
     """
     if _option.type == OptionType.HTML:
-        _option.content = add_campaign_macro_values(_option.content, rule, request_detail)
+        _option.content = add_campaign_macro_values(_option.content, rule, request_detail, templates)
     if _option.type == OptionType.ACTIONS:
-        _option.content = [update_action_campaign_content(create_action(action), rule, request_detail) for action in
-                           _option.content]
+        _option.content = [update_action_campaign_content(create_action(action), rule, request_detail, templates)
+                           for action in _option.content]
     return _option
 
 
-def replace_campaign_macros(rule, mbox_response, request_type, request_detail, tracer):
+class ReplaceCampaignMacros(PostProcessor):
+    """Replaces campaign macros in html and action offer content"""
+
+    def __init__(self, rule_macro_templates=None):
+        """
+        :param rule_macro_templates: (dict) macro templates keyed by rule identity, see get_rule_macro_templates.
+            Contents without a template are parsed on demand
+        """
+        self.rule_macro_templates = rule_macro_templates or {}
+
+    def process_option(self, _option, index, context):
+        return update_option_campaign_content(_option, context.rule, context.request_detail,
+                                              self.rule_macro_templates.get(id(context.rule)))
+
+
+replace_campaign_macros = ReplaceCampaignMacros()
+
+
+def fuse_post_processors(post_processors):
     """
-    :param rule: (target_decisioning_engine.types.decisioning_artifact.Rule) rule
-    :param mbox_response: (delivery_api_client.Model.mbox_response.MboxResponse) mbox response
-    :param request_type: ( "mbox"|"view"|"pageLoad") request type
-    :param request_detail: (delivery_api_client.Model.request_details.RequestDetails) request details
-    :param tracer: (target_decisioning_engine.trace_provider.RequestTracer) request tracer
-    :return: (delivery_api_client.Model.mbox_response.MboxResponse)
-        Returns mbox response with updated options and metrics
+    :param post_processors: (list<callable>) post-processors
+    :return: (list<callable>) Returns equivalent post-processors, where every run of adjacent PostProcessors is
+        fused into a single FusedPostProcessor.  Other callables are kept as they are
     """
-
-    mbox_response_copy = deepcopy(mbox_response)
-    mbox_response_copy.options = [update_option_campaign_content(option, rule, request_detail)
-                                  for option in mbox_response_copy.options]
-    return mbox_response_copy
+    result = []
+    stages = []
+    for post_processor in post_processors:
+        if isinstance(post_processor, PostProcessor):
+            stages.append(post_processor)
+            continue
+        if stages:
+            result.append(FusedPostProcessor(stages))
+            stages = []
+        result.append(post_processor)
+    if stages:
+        result.append(FusedPostProcessor(stages))
+    return result
@@ -0,0 +1,609 @@
+# Copyright 2021 Adobe. All rights reserved.
+# This file is licensed to you under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License. You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software distributed under
+# the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR REPRESENTATIONS
+# OF ANY KIND, either express or implied. See the License for the specific language
+# governing permissions and limitations under the License.
+"""Compiles json-logic rule conditions into native python predicates"""
+import json
+import threading
+from itertools import count
+from timeit import default_timer
+from six import text_type
+from json_logic import jsonLogic
+from json_logic import is_logic
+from json_logic import operations
+
+# Operators compiled via their json_logic implementations, everything else falls back to the interpreter
+COMPILED_OPERATORS = ["==", "!=", "===", "!==", ">", ">=", "<", "<=", "in", "!", "!!"]
+# Operators that never raise, whatever their (non-raising) operands evaluate to
+SAFE_OPERATORS = ["==", "!=", "===", "!==", "!", "!!", "and", "or"]
+COMPARISON_OPERATORS = [">", ">=", "<", "<="]
+# Context vars that always hold a number, so comparing them with numeric literals never raises
+NUMERIC_VARS = ["allocation", "current_timestamp"]
+BOOLEAN_OPERATORS = ["!", "!!"]
+JUNCTION_OPERATORS = ["and", "or"]
+# Every SAMPLE_INTERVAL-th evaluation of a reorderable and/or measures all of its reorderable operands
+SAMPLE_INTERVAL = 16
+# Operands are reordered after every REORDER_INTERVAL sampled evaluations
+REORDER_INTERVAL = 64
+MIN_RATE = 0.001
+# context values that differ for every rule, sub-expressions that read them are never shared between rules
+RULE_LEVEL_CONTEXT_KEYS = ["allocation"]
+# operators that read data by name without a var
+DATA_OPERATORS = ["missing", "missing_some"]
+
+
+def is_array(value):
+    """Checks if value is a json-logic array"""
+    return isinstance(value, (list, tuple))
+
+
+def get_operator(logic):
+    """
+    :param logic: (dict) json-logic rule
+    :return: (str) operator name
+    """
+    return text_type(next(iter(logic.keys())))
+
+
+def get_values(logic, operator):
+    """
+    :param logic: (dict) json-logic rule
+    :param operator: (str) operator name
+    :return: (list) operator arguments
+    """
+    values = logic[operator]
+    return values if is_array(values) else [values]
+
+
+def _constant(value):
+    """
+    :param value: (any) literal value
+    :return: (callable) Returns function that always evaluates to value
+    """
+    def evaluate_constant(data, memo):
+        return value
+
+    evaluate_constant.is_constant = True
+    return evaluate_constant
+
+
+def _is_constant(func):
+    """Checks if compiled func is a constant"""
+    return getattr(func, "is_constant", False)
+
+
+def _interpreted(logic):
+    """
+    :param logic: (dict) json-logic rule
+    :return: (callable) Returns function that evaluates logic with the json-logic interpreter
+    """
+    def evaluate_interpreted(data, memo):
+        return jsonLogic(logic, data)
+
+    return evaluate_interpreted
+
+
+def _compile_array(logic, compiler):
+    """
+    :param logic: (list) list of json-logic rules
+    :param compiler: (target_decisioning_engine.rule_compiler.ConditionCompiler) shared sub-expressions, optional
+    :return: (callable) Returns function that evaluates every item in logic
+    """
+    funcs = [_compile(item, False, compiler) for item in logic]
+    if all(_is_constant(func) for func in funcs):
+        return _constant([func(None, None) for func in funcs])
+
+    def evaluate_array(data, memo):
+        return [func(data, memo) for func in funcs]
+
+    return evaluate_array
+
+
+def _compile_var(logic, values):
+    """
+    :param logic: (dict) json-logic rule
+    :param values: (list) var arguments - var name and optional default value
+    :return: (callable) Returns function that retrieves a (dot-notated) value from data
+    """
+    var_name = values[0] if values else None
+    default = values[1] if len(values) > 1 else None
+
+    if is_logic(var_name) or is_array(var_name) or is_logic(default) or is_array(default):
+        return _interpreted(logic)
+
+    if var_name is None or var_name == "":
+        return lambda data, memo: data
+
+    keys = tuple(text_type(var_name).split("."))
+
+    def evaluate_var(data, memo):
+        try:
+            for key in keys:
+                try:
+                    data = data[key]
+                except TypeError:
+                    data = data[int(key)]
+        except (KeyError, TypeError, ValueError):
+            return default
+        return data
+
+    return evaluate_var
+
+
+def _compile_and(logic, values, boolean_context=False, compiler=None):
+    """
+    :param logic: (dict) json-logic rule
+    :param values: (list) operands
+    :param boolean_context: (bool) whether only the truthiness of the result is used
+    :param compiler: (target_decisioning_engine.rule_compiler.ConditionCompiler) shared sub-expressions, optional
+    :return: (callable) Returns function that evaluates to first falsy operand or the last operand
+    """
+    funcs = [_compile(value, boolean_context, compiler) for value in values]
+
+    def evaluate_and(data, memo):
+        current = False
+        for func in funcs:
+            current = func(data, memo)
+            if not current:
+                return current
+        return current
+
+    return evaluate_and
+
+
+def _compile_or(logic, values, boolean_context=False, compiler=None):
+    """
+    :param logic: (dict) json-logic rule
+    :param values: (list) operands
+    :param boolean_context: (bool) whether only the truthiness of the result is used
+    :param compiler: (target_decisioning_engine.rule_compiler.ConditionCompiler) shared sub-expressions, optional
+    :return: (callable) Returns function that evaluates to first truthy operand or the last operand
+    """
+    funcs = [_compile(value, boolean_context, compiler) for value in values]
+
+    def evaluate_or(data, memo):
+        current = False
+        for func in funcs:
+            current = func(data, memo)
+            if current:
+                return current
+        return current
+
+    return evaluate_or
+
+
+def _is_numeric_literal(value):
+    """Checks if value is a number literal"""
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _is_numeric_var(logic):
+    """Checks if logic is a var that always holds a number"""
+    return is_logic(logic) and get_operator(logic) == "var" and logic.get("var") in NUMERIC_VARS
+
+
+def is_safe(logic):
+    """Checks if logic can be evaluated against any decisioning context without raising.  Conservative - logic
+    that might raise, or that is delegated to the json-logic interpreter, is not safe
+    :param logic: (any) json-logic rule, list of rules or literal
+    :return: (bool)
+    """
+    if is_array(logic):
+        return all(is_safe(item) for item in logic)
+
+    if not is_logic(logic):
+        return True
+
+    operator = get_operator(logic)
+    values = get_values(logic, operator)
+
+    if operator == "var":
+        return all(not is_logic(value) and not is_array(value) for value in values)
+
+    if operator in COMPARISON_OPERATORS:
+        return all(_is_numeric_literal(value) or _is_numeric_var(value) for value in values)
+
+    if operator == "in":
+        return len(values) == 2 and all(is_safe(value) for value in values) and \
+            (isinstance(values[0], text_type) or is_array(values[1]))
+
+    return operator in SAFE_OPERATORS and all(is_safe(value) for value in values)
+
+
+def _get_reorderable_groups(safe_flags):
+    """
+    :param safe_flags: (list) whether each operand is safe
+    :return: (list) Returns lists of adjacent safe operand positions, groups of at least two operands
+    """
+    groups = []
+    group = []
+    for position, safe_flag in enumerate(safe_flags + [False]):
+        if safe_flag:
+            group.append(position)
+            continue
+        if len(group) > 1:
+            groups.append(group)
+        group = []
+    return groups
+
+
+class AdaptiveJunction:
+    """json-logic and/or evaluated in a boolean context, with operands reordered by runtime statistics.
+    Every SAMPLE_INTERVAL-th evaluation times every safe operand and records whether it passed, and after
+    REORDER_INTERVAL samples adjacent safe operands are sorted so that cheap operands that are most likely to
+    short-circuit run first.  Operands that might raise keep their position, so the truthiness of the result
+    and the exceptions raised are the same for any order.
+    Compiled artifacts are shared by concurrent requests, so the call counter is an itertools.count and the
+    statistics are updated and reordered under a lock, which is only taken by sampled evaluations"""
+
+    def __init__(self, operator, funcs, safe_flags):
+        """
+        :param operator: (str) "and" or "or"
+        :param funcs: (list) compiled operands
+        :param safe_flags: (list) whether each operand is safe
+        """
+        self.operator = operator
+        self.short_circuit_on = operator == "or"
+        self.funcs = funcs
+        self.safe_flags = safe_flags
+        self.groups = _get_reorderable_groups(safe_flags)
+        self.order = list(range(len(funcs)))
+        self.ordered_funcs = tuple(funcs)
+        self.costs = [0.0] * len(funcs)
+        self.passes = [0.0] * len(funcs)
+        self.samples = 0
+        self.calls = count(1)
+        self.lock = threading.Lock()
+
+    def __call__(self, data, memo):
+        """
+        :param data: (dict) decisioning context
+        :param memo: (dict) values of shared sub-expressions already evaluated against data, optional
+        :return: (any) Returns first operand that short-circuits or the last operand
+        """
+        if next(self.calls) % SAMPLE_INTERVAL == 0:
+            return self.evaluate_sampled(data, memo)
+
+        short_circuit_on = self.short_circuit_on
+        current = False
+        for func in self.ordered_funcs:
+            current = func(data, memo)
+            if bool(current) is short_circuit_on:
+                return current
+        return current
+
+    def evaluate_sampled(self, data, memo):
+        """Evaluates operands in the current order, also measuring the safe operands past the short-circuit
+        :param data: (dict) decisioning context
+        :param memo: (dict) values of shared sub-expressions already evaluated against data, optional
+        :return: (any) Returns the same value as an unsampled evaluation
+        """
+        result = False
+        done = False
+        measurements = []
+        for position in self.order:
+            safe_flag = self.safe_flags[position]
+            if done and not safe_flag:
+                continue
+            start = default_timer()
+            current = self.funcs[position](data, memo)
+            if safe_flag:
+                measurements.append((position, default_timer() - start, 1 if current else 0))
+            if not done:
+                result = current
+                done = bool(current) is self.short_circuit_on
+
+        with self.lock:
+            for position, cost, passed in measurements:
+                self.costs[position] += cost
+                self.passes[position] += passed
+            self.samples += 1
+            if self.samples >= REORDER_INTERVAL:
+                self.reorder()
+        return result
+
+    def get_rank(self, position):
+        """
+        :param position: (int) operand position
+        :return: (float) Returns expected cost per short-circuit, operands with lower ranks run first
+        """
+        pass_rate = self.passes[position] / self.samples
+        short_circuit_rate = pass_rate if self.short_circuit_on else 1.0 - pass_rate
+        return self.costs[position] / self.samples / max(short_circuit_rate, MIN_RATE)
+
+    def reorder(self):
+        """Sorts each group of adjacent safe operands by rank, then halves the statistics so that
+        the order keeps following the traffic.  Called with self.lock held"""
+        order = list(self.order)
+        for group in self.groups:
+            slots = sorted(order.index(position) for position in group)
+            ranked = sorted(group, key=self.get_rank)
+            for slot, position in zip(slots, ranked):
+                order[slot] = position
+
+        self.order = order
+        self.ordered_funcs = tuple(self.funcs[position] for position in order)
+        self.costs = [cost / 2 for cost in self.costs]
+        self.passes = [passes / 2 for passes in self.passes]
+        self.samples = self.samples / 2.0
+
+
+def _compile_junction(logic, operator, values, boolean_context, compiler):
+    """
+    :param logic: (dict) json-logic rule
+    :param operator: (str) "and" or "or"
+    :param values: (list) operands
+    :param boolean_context: (bool) whether only the truthiness of the result is used
+    :param compiler: (target_decisioning_engine.rule_compiler.ConditionCompiler) shared sub-expressions, optional
+    :return: (callable) Returns an AdaptiveJunction if operands can be reordered, a static and/or otherwise
+    """
+    if not boolean_context:
+        return JUNCTION_COMPILERS[operator](logic, values, False, compiler)
+
+    safe_flags = [is_safe(value) for value in values]
+    if not _get_reorderable_groups(safe_flags):
+        return JUNCTION_COMPILERS[operator](logic, values, boolean_context, compiler)
+
+    funcs = [_compile(value, boolean_context, compiler) for value in values]
+    return AdaptiveJunction(operator, funcs, safe_flags)
+
+
+def _compile_equal_to_string(other, literal):
+    """json-logic == coerces both sides to text when either side is a string
+    :param other: (callable) compiled operand
+    :param literal: (str) string literal operand
+    :return: (callable)
+    """
+    def evaluate_equal_to_string(data, memo):
+        return text_type(other(data, memo)) == literal
+
+    return evaluate_equal_to_string
+
+
+def _compile_operation(logic, operator, values, compiler):
+    """
+    :param logic: (dict) json-logic rule
+    :param operator: (str) operator name
+    :param values: (list) operands
+    :param compiler: (target_decisioning_engine.rule_compiler.ConditionCompiler) shared sub-expressions, optional
+    :return: (callable) Returns function that applies operator to its evaluated operands
+    """
+    operation = operations.get(operator)
+    if operator not in COMPILED_OPERATORS or not operation:
+        return _interpreted(logic)
+
+    funcs = [_compile(value, operator in BOOLEAN_OPERATORS, compiler) for value in values]
+
+    if operator == "==" and len(funcs) == 2:
+        left, right = funcs
+        if _is_constant(right) and isinstance(right(None, None), text_type):
+            return _compile_equal_to_string(left, right(None, None))
+        if _is_constant(left) and isinstance(left(None, None), text_type):
+            return _compile_equal_to_string(right, left(None, None))
+
+    if len(funcs) == 1:
+        operand = funcs[0]
+        return lambda data, memo: operation(operand(data, memo))
+
+    if len(funcs) == 2:
+        left, right = funcs
+        return lambda data, memo: operation(left(data, memo), right(data, memo))
+
+    return lambda data, memo: operation(*[func(data, memo) for func in funcs])
+
+
+JUNCTION_COMPILERS = {
+    "and": _compile_and,
+    "or": _compile_or
+}
+
+
+def _compile(logic, boolean_context=False, compiler=None):
+    """
+    :param logic: (any) json-logic rule, list of rules or literal
+    :param boolean_context: (bool) whether only the truthiness of the result is used
+    :param compiler: (target_decisioning_engine.rule_compiler.ConditionCompiler) shared sub-expressions, optional
+    :return: (callable) Returns function that evaluates logic against data and a memo of shared sub-expressions
+    """
+    if compiler is not None and is_logic(logic):
+        return compiler.get_compiled(logic, boolean_context)
+    return _compile_logic(logic, boolean_context, compiler)
+
+
+def _compile_logic(logic, boolean_context, compiler):
+    """
+    :param logic: (any) json-logic rule, list of rules or literal
+    :param boolean_context: (bool) whether only the truthiness of the result is used
+    :param compiler: (target_decisioning_engine.rule_compiler.ConditionCompiler) shared sub-expressions, optional
+    :return: (callable) Returns function that evaluates logic against data and a memo of shared sub-expressions
+    """
+    if is_array(logic):
+        return _compile_array(logic, compiler)
+
+    if not is_logic(logic):
+        return _constant(logic)
+
+    operator = get_operator(logic)
+    values = get_values(logic, operator)
+
+    if operator == "var":
+        return _compile_var(logic, values)
+
+    if operator in JUNCTION_OPERATORS:
+        return _compile_junction(logic, operator, values, boolean_context, compiler)
+
+    return _compile_operation(logic, operator, values, compiler)
+
+
+def _get_logic_key(logic):
+    """
+    :param logic: (any) json-logic rule
+    :return: (str) Returns a key that is the same for identical json-logic rules
+    """
+    return json.dumps(logic, sort_keys=True)
+
+
+def is_request_level(logic):
+    """Checks if logic only reads request-level context values, i.e. it evaluates the same for every rule of a
+    request detail.  Conservative - vars that are computed, or read the whole context, are rule-level
+    :param logic: (any) json-logic rule, list of rules or literal
+    :return: (bool)
+    """
+    if is_array(logic):
+        return all(is_request_level(item) for item in logic)
+
+    if not is_logic(logic):
+        return True
+
+    operator = get_operator(logic)
+    values = get_values(logic, operator)
+
+    if operator == "var":
+        var_name = values[0] if values else None
+        return isinstance(var_name, (text_type, int)) and not isinstance(var_name, bool) and var_name != "" and \
+            text_type(var_name).split(".")[0] not in RULE_LEVEL_CONTEXT_KEYS and is_request_level(values[1:])
+
+    return operator not in DATA_OPERATORS and all(is_request_level(value) for value in values)
+
+
+def _get_all_var_paths(logic_list):
+    """
+    :param logic_list: (list) json-logic rules or literals
+    :return: (set<str>) Returns the var paths that any of logic_list reads, None if any cannot be known upfront
+    """
+    var_paths = set()
+    for logic in logic_list:
+        logic_var_paths = get_var_paths(logic)
+        if logic_var_paths is None:
+            return None
+        var_paths.update(logic_var_paths)
+    return var_paths
+
+
+def get_var_paths(logic):
+    """
+    :param logic: (any) json-logic rule, list of rules or literal
+    :return: (set<str>) Returns the var paths that logic reads, None if it may read values that cannot be known
+        before evaluating it, i.e. computed var names, the whole context or missing/missing_some
+    """
+    if is_array(logic):
+        return _get_all_var_paths(logic)
+
+    if not is_logic(logic):
+        return set()
+
+    operator = get_operator(logic)
+    values = get_values(logic, operator)
+
+    if operator in DATA_OPERATORS:
+        return None
+
+    if operator != "var":
+        return _get_all_var_paths(values)
+
+    var_name = values[0] if values else None
+    default_var_paths = _get_all_var_paths(values[1:])
+    if not isinstance(var_name, (text_type, int)) or isinstance(var_name, bool) or var_name == "" or \
+            default_var_paths is None:
+        return None
+    return default_var_paths.union([text_type(var_name)])
+
+
+def _memoized(func):
+    """
+    :param func: (callable) compiled sub-expression
+    :return: (callable) Returns function that evaluates func at most once per memo
+    """
+    def evaluate_memoized(data, memo):
+        if memo is None:
+            return func(data, memo)
+        try:
+            return memo[evaluate_memoized]
+        except KeyError:
+            value = memo[evaluate_memoized] = func(data, memo)
+            return value
+
+    return evaluate_memoized
+
+
+class ConditionCompiler:
+    """Compiles the conditions of all rules of an artifact.  Identical sub-expressions are compiled once,
+    and request-level sub-expressions that several conditions share are evaluated at most once per memo, so
+    audiences used by many activities are only checked once per request detail"""
+
+    def __init__(self, conditions=None):
+        """
+        :param conditions: (list) json-logic rule conditions that will be compiled
+        """
+        self.counts = {}
+        self.compiled = {}
+        for condition in conditions or []:
+            self.count(condition)
+
+    def count(self, logic):
+        """Counts occurrences of logic and its sub-expressions
+        :param logic: (any) json-logic rule, list of rules or literal
+        """
+        if is_array(logic):
+            for item in logic:
+                self.count(item)
+            return
+
+        if not is_logic(logic):
+            return
+
+        key = _get_logic_key(logic)
+        self.counts[key] = self.counts.get(key, 0) + 1
+        operator = get_operator(logic)
+        if operator != "var":
+            self.count(get_values(logic, operator))
+
+    def get_compiled(self, logic, boolean_context):
+        """
+        :param logic: (dict) json-logic rule
+        :param boolean_context: (bool) whether only the truthiness of the result is used
+        :return: (callable) Returns compiled logic, the same function for identical logic
+        """
+        logic_key = _get_logic_key(logic)
+        key = (logic_key, boolean_context)
+        func = self.compiled.get(key)
+        if func is None:
+            func = _compile_logic(logic, boolean_context, self)
+            if self.counts.get(logic_key, 0) > 1 and get_operator(logic) != "var" and is_request_level(logic):
+                func = _memoized(func)
+            self.compiled[key] = func
+        return func
+
+    def compile(self, condition):
+        """
+        :param condition: (dict) json-logic rule condition
+        :return: (callable) Returns predicate like compile_condition does, sharing compiled sub-expressions
+        """
+        return _create_predicate(_compile(condition, True, self))
+
+
+def _create_predicate(evaluate):
+    """
+    :param evaluate: (callable) compiled condition
+    :return: (callable) Returns function that takes a decisioning context and an optional memo
+    """
+    def predicate(context, memo=None):
+        return evaluate(context or {}, memo)
+
+    return predicate
+
+
+def compile_condition(condition):
+    """Compiles a rule condition into a native python predicate.  The predicate is as truthy as
+    json_logic.jsonLogic(condition, context) and raises the same errors, operators that are not compiled are
+    delegated to json_logic.  Until and/or operands are reordered it also returns the same value
+    :param condition: (dict) json-logic rule condition
+    :return: (callable) Returns function that takes a decisioning context, and a memo dict of shared
+        sub-expression values when compiled by a ConditionCompiler, and evaluates the condition
+    """
+    return _create_predicate(_compile(condition, True))
@@ -8,29 +8,82 @@
 # OF ANY KIND, either express or implied. See the License for the specific language
 # governing permissions and limitations under the License.
 """rule evaluator"""
-from copy import deepcopy
-from json_logic import jsonLogic
+from timeit import default_timer
 from target_decisioning_engine.allocation_provider import compute_allocation
 from target_decisioning_engine.constants import ACTIVITY_ID
 from target_decisioning_engine.context_provider import create_page_context
 from target_decisioning_engine.context_provider import create_mbox_context
-from target_tools.response_helpers import create_mbox_response
+from target_decisioning_engine.context_provider import create_rule_context
 from target_tools.utils import to_dict
 
+MILLISECONDS_PER_SECOND = 1000
+
+
+def _create_request_detail_layer(context, request_detail):
+    """
+    :param context: (target_decisioning_engine.types.decisioning_context.DecisioningContext) context
+    :param request_detail: (delivery_api_client.Model.request_details.RequestDetails |
+        delivery_api_client.Model.mbox_request.MboxRequest) request details
+    :return: (dict) Returns context values that depend on request details - page, referring and mbox
+    """
+    page = context.get("page")
+    referring = context.get("referring")
+
+    if request_detail and request_detail.address:
+        # referring is built from the request detail address url as well, like it always has been
+        request_detail_page = create_page_context(request_detail.address)
+        page = request_detail_page or page
+        referring = request_detail_page or referring
+
+    return {
+        "page": to_dict(page),
+        "referring": to_dict(referring),
+        "mbox": to_dict(create_mbox_context(request_detail))
+    }
+
 
 class RuleEvaluator:
     """RuleEvaluator"""
 
-    def __init__(self, client_id, visitor_id):
+    def __init__(self, client_id, visitor_id, rule_set):
         """
         :param client_id: (str) client ID
         :param visitor_id: (delivery_api_client.Model.visitor_id.VisitorId) visitor ID
+        :param rule_set: (target_decisioning_engine.compiled_artifact.RuleSet) rule set that provides compiled
+            rule conditions and consequence templates
         """
         self.client_id = client_id
         self.visitor_id = visitor_id
+        self.rule_set = rule_set
 
-    def process_rule(self, rule, context, request_type, request_detail, post_processors, tracer):
-        """Uses json logic to evaluate request context against the rules and returns an MboxResponse
+    @staticmethod
+    def create_request_detail_layer(context, request_detail):
+        """Context values that depend on request details only, build it once per mbox or view request and pass it
+        to process_rule for every rule evaluated for that request
+        :param context: (target_decisioning_engine.types.decisioning_context.DecisioningContext) context
+        :param request_detail: (delivery_api_client.Model.request_details.RequestDetails |
+            delivery_api_client.Model.mbox_request.MboxRequest) request details
+        :return: (dict) Returns page, referring and mbox context values for request_detail
+        """
+        return _create_request_detail_layer(context, request_detail)
+
+    @staticmethod
+    def create_request_detail_context(context, request_detail, request_detail_layer=None):
+        """
+        :param context: (target_decisioning_engine.types.decisioning_context.DecisioningContext) context
+        :param request_detail: (delivery_api_client.Model.request_details.RequestDetails |
+            delivery_api_client.Model.mbox_request.MboxRequest) request details
+        :param request_detail_layer: (dict) request detail layer created by create_request_detail_layer, optional
+        :return: (target_decisioning_engine.types.decisioning_context.DecisioningContext) Returns the context that
+            rules are evaluated against for request_detail, minus per-rule values such as allocation
+        """
+        if request_detail_layer is None:
+            request_detail_layer = _create_request_detail_layer(context, request_detail)
+        return create_rule_context(context, request_detail_layer)
+
+    def process_rule(self, rule, context, request_type, request_detail, post_processors, tracer, condition_memo=None,
+                     request_detail_layer=None):
+        """Uses compiled json logic to evaluate request context against the rules and returns an MboxResponse
         :param rule: (target_decisioning_engine.types.decisioning_artifact.Rule) rule
         :param context: (target_decisioning_engine.types.decisioning_context.DecisioningContext) context
         :param request_type: ( "mbox"|"view"|"pageLoad") request type
@@ -38,29 +91,32 @@ class RuleEvaluator:
             delivery_api_client.Model.mbox_request.MboxRequest) request details
         :param post_processors: (list<callable>) post-processors used to process an mbox if needed
         :param tracer: (target_decisioning_engine.trace_provider.RequestTracer) request tracer
+        :param condition_memo: (dict) values of shared sub-expressions, to be reused by every rule evaluated for
+            the same context and request_detail, optional
+        :param request_detail_layer: (dict) request detail layer created by create_request_detail_layer for the
+            same context and request_detail, optional - it is created for the rule if not provided
         :return: (delivery_api_client.Model.mbox_response.MboxResponse)
         """
-        rule_context = deepcopy(context)
         consequence = None
-        page = rule_context.get("page")
-        referring = rule_context.get("referring")
-
-        if request_detail and request_detail.address:
-            page = create_page_context(request_detail.address) or page
-            referring = create_page_context(request_detail.address) or referring
 
-        rule_context.update({
-            "page": to_dict(page),
-            "referring": to_dict(referring),
-            "mbox": to_dict(create_mbox_context(request_detail)),
-            "allocation": compute_allocation(self.client_id, rule.get("meta", {}).get(ACTIVITY_ID), self.visitor_id)
-        })
+        if request_detail_layer is None:
+            request_detail_layer = _create_request_detail_layer(context, request_detail)
+        rule_layer = dict(request_detail_layer)
+        rule_layer["allocation"] = compute_allocation(self.client_id, rule.get("meta", {}).get(ACTIVITY_ID),
+                                                      self.visitor_id)
+        rule_context = create_rule_context(context, rule_layer)
 
-        rule_satisfied = jsonLogic(rule.get("condition"), rule_context)
-        tracer.trace_rule_evaluated(rule, rule_context, rule_satisfied)
+        if tracer.timed:
+            evaluation_start = default_timer()
+            rule_satisfied = self.rule_set.get_condition(rule)(rule_context, condition_memo)
+            tracer.trace_rule_evaluated(rule, rule_context, rule_satisfied,
+                                        (default_timer() - evaluation_start) * MILLISECONDS_PER_SECOND)
+        else:
+            rule_satisfied = self.rule_set.get_condition(rule)(rule_context, condition_memo)
+            tracer.trace_rule_evaluated(rule, rule_context, rule_satisfied)
 
         if rule_satisfied:
-            consequence = create_mbox_response(deepcopy(rule.get("consequence")))
+            consequence = self.rule_set.create_consequence(rule)
             consequence.index = request_detail.index if hasattr(request_detail, "index") else None
 
             for post_process_func in post_processors:
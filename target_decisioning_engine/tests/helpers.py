@@ -9,18 +9,73 @@
 # governing permissions and limitations under the License.
 """Util functions for testing decisioning engine"""
 import os
+from copy import deepcopy
 from target_tools.tests.helpers import is_json
 from target_tools.tests.helpers import traverse_object
 from target_tools.tests.helpers import read_json_file
 from target_tools.tests.delivery_request_setup import create_delivery_request
 from target_decisioning_engine.types.decisioning_config import DecisioningConfig
 from target_decisioning_engine.types.target_delivery_request import TargetDeliveryRequest
+from target_decisioning_engine.utils import set_nested_value
 
 
 CURRENT_DIR = os.path.dirname(__file__)
 TEST_ARTIFACTS_FOLDER = os.path.join(CURRENT_DIR, "schema/artifacts")
 TEST_MODELS_FOLDER = os.path.join(CURRENT_DIR, "schema/models")
 
+# Decisioning context with a value for every context attribute referenced by test artifact rules
+BASE_CONTEXT = {
+    "current_timestamp": 1612999999000,
+    "current_time": "1330",
+    "current_day": "5",
+    "user": {"browserType": "chrome", "platform": "mac", "locale": "en", "browserVersion": 88},
+    "page": {"url": "https://www.adobe.com/products", "url_lc": "https://www.adobe.com/products",
+             "domain": "adobe.com", "domain_lc": "adobe.com", "path": "/products", "path_lc": "/products",
+             "query": "", "query_lc": "", "fragment": "", "fragment_lc": "", "subdomain": "",
+             "subdomain_lc": "", "topLevelDomain": "com", "topLevelDomain_lc": "com"},
+    "referring": {},
+    "geo": {"country": "US", "region": "CA", "city": "SANFRANCISCO", "latitude": 37.75, "longitude": -122.4},
+    "mbox": {"foo": "bar", "foo_lc": "bar"},
+    "allocation": 50.0
+}
+
+
+def collect_literals(logic, result=None):
+    """Gathers (var path, literal) pairs from the comparisons of a json-logic condition"""
+    if result is None:
+        result = []
+    if isinstance(logic, list):
+        for item in logic:
+            collect_literals(item, result)
+    elif isinstance(logic, dict):
+        for values in logic.values():
+            if isinstance(values, list):
+                var_names = [value.get("var") for value in values if isinstance(value, dict) and "var" in value]
+                literals = [value for value in values if not isinstance(value, (dict, list))]
+                result.extend((var_name, literal) for var_name in var_names for literal in literals)
+            collect_literals(values, result)
+    return result
+
+
+def create_contexts(condition):
+    """Creates contexts that exercise both sides of every comparison found in condition"""
+    contexts = [{}, BASE_CONTEXT]
+    for allocation in [0, 0.01, 24.99, 25, 33.33, 50, 75, 99.99, 100]:
+        context = dict(BASE_CONTEXT)
+        context["allocation"] = allocation
+        contexts.append(context)
+
+    matching = deepcopy(BASE_CONTEXT)
+    for var_name, literal in collect_literals(condition):
+        if not var_name:
+            continue
+        set_nested_value(matching, var_name.split("."), literal)
+        single = deepcopy(BASE_CONTEXT)
+        set_nested_value(single, var_name.split("."), literal)
+        contexts.append(single)
+    contexts.append(matching)
+    return contexts
+
 
 def get_files_in_dir(directory):
     """Lists all files in a given directory"""
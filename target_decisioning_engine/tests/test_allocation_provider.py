@@ -9,17 +9,32 @@
 # governing permissions and limitations under the License.
 """Test cases for target_decisioning_enging.allocation_provider module"""
 import unittest
+import uuid
 
 from delivery_api_client import VisitorId
 from delivery_api_client import CustomerId
 from delivery_api_client import AuthenticatedState
 from target_decisioning_engine.allocation_provider import compute_allocation
+from target_decisioning_engine.allocation_provider import compute_allocations
 from target_decisioning_engine.allocation_provider import get_or_create_visitor_id
 from target_decisioning_engine.allocation_provider import valid_tnt_id
+from target_decisioning_engine.allocation_provider import TOTAL_BUCKETS
+from target_decisioning_engine.allocation_provider import _bucket_allocation
+from target_decisioning_engine.allocation_provider import get_bucket_allocations_memoized
+from target_tools.hashing import hash_unencoded_chars_array
+from target_tools.hashing import hash_unencoded_chars_raw
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 CLIENT_ID = "someClientId"
 ACTIVITY_ID = "123456"
 SALT = "salty"
+VISITOR_IDS = ["ecid123", "tntId123", "thirtPartyId123", "", "a", "ab", u"\u00e9cid\u4e2d\U0001f600"] + \
+    [str(uuid.uuid4())[:length] for length in range(1, 37)] + \
+    [str(uuid.uuid4()) for _ in range(200)]
 
 
 class TestAllocationProvider(unittest.TestCase):
@@ -127,3 +142,28 @@ class TestAllocationProvider(unittest.TestCase):
 
         result = valid_tnt_id(100)
         self.assertIsNone(result)
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def test_hash_unencoded_chars_array(self):
+        hash_values = hash_unencoded_chars_array(VISITOR_IDS)
+        self.assertEqual(hash_values.tolist(), [hash_unencoded_chars_raw(value) for value in VISITOR_IDS])
+        self.assertEqual(hash_unencoded_chars_array([]).tolist(), [])
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def test_bucket_allocations(self):
+        bucket_allocations = get_bucket_allocations_memoized()
+        self.assertEqual(bucket_allocations.tolist(), [_bucket_allocation(bucket) for bucket in range(TOTAL_BUCKETS)])
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def test_compute_allocations(self):
+        activity_ids = [ACTIVITY_ID, 7, "334411"]
+        visitor_ids = VISITOR_IDS + [VisitorId(tnt_id="tntId123.28_0"), VisitorId(third_party_id="thirtPartyId123")]
+        allocations = compute_allocations(CLIENT_ID, activity_ids, visitor_ids, SALT)
+        self.assertEqual(allocations.shape, (len(activity_ids), len(visitor_ids)))
+        for i, activity_id in enumerate(activity_ids):
+            for j, visitor_id in enumerate(visitor_ids):
+                if not visitor_id:
+                    continue
+                self.assertEqual(allocations[i][j], compute_allocation(CLIENT_ID, activity_id, visitor_id, SALT))
+        self.assertEqual(allocations[0][0], 29.06)
+        self.assertEqual(allocations[0][-2], 21.94)
@@ -0,0 +1,316 @@
+# Copyright 2021 Adobe. All rights reserved.
+# This file is licensed to you under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License. You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software distributed under
+# the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR REPRESENTATIONS
+# OF ANY KIND, either express or implied. See the License for the specific language
+# governing permissions and limitations under the License.
+"""Test cases for target_decisioning_engine.compiled_artifact module"""
+import json
+import unittest
+from copy import deepcopy
+from delivery_api_client import ChannelType
+from delivery_api_client import Context
+from delivery_api_client import DeliveryRequest
+from delivery_api_client import ExecuteRequest
+from delivery_api_client import MboxRequest
+from delivery_api_client import PrefetchRequest
+from delivery_api_client import ViewRequest
+from target_decisioning_engine.compiled_artifact import CompiledArtifact
+from target_decisioning_engine.compiled_artifact import get_artifact_context_keys
+from target_decisioning_engine.compiled_artifact import get_artifact_property_tokens
+from target_decisioning_engine.compiled_artifact import get_artifact_rules
+from target_decisioning_engine.compiled_artifact import get_required_equality
+from target_decisioning_engine.filters import by_property_token
+from target_decisioning_engine.tests.helpers import BASE_CONTEXT
+from target_decisioning_engine.tests.helpers import create_contexts
+from target_decisioning_engine.tests.helpers import get_test_artifacts
+from target_decisioning_engine.tests.helpers import TEST_ARTIFACTS_FOLDER
+from target_tools.response_helpers import create_mbox_response
+from target_tools.tests.helpers import read_json_file
+
+CONTEXT = Context(channel=ChannelType.WEB)
+
+
+def filter_rules(rules, property_token):
+    """Filters rules by property token"""
+    return list(filter(by_property_token(property_token), rules))
+
+
+def evaluate(condition, context):
+    """Evaluates compiled condition, returns exception type if evaluation fails"""
+    try:
+        return bool(condition(context))
+    except (TypeError, ValueError) as err:
+        return type(err)
+
+
+def create_timing_contexts(compiled_artifact):
+    """Creates contexts with timestamps on both sides of every time boundary, for every day and a few times"""
+    timestamps = [BASE_CONTEXT.get("current_timestamp")]
+    for boundary in compiled_artifact.time_boundaries:
+        timestamps.extend([boundary - 1, boundary, boundary + 1])
+
+    contexts = []
+    for timestamp in timestamps:
+        for current_day in range(1, 8):
+            for current_time in ["0000", "1330", "2359"]:
+                context = dict(BASE_CONTEXT)
+                context.update(current_timestamp=timestamp, current_day=current_day, current_time=current_time)
+                contexts.append(context)
+    return contexts
+
+
+class TestCompiledArtifact(unittest.TestCase):
+
+    def test_rule_index_matches_property_token_filter(self):
+        for artifact_file in get_test_artifacts():
+            artifact = read_json_file(TEST_ARTIFACTS_FOLDER, artifact_file)
+            compiled_artifact = CompiledArtifact(artifact)
+            rules = artifact.get("rules", {})
+            property_tokens = [None, "unknown-token"] + list(get_artifact_property_tokens(artifact))
+
+            for property_token in property_tokens:
+                for mbox_name, mbox_rules in rules.get("mboxes", {}).items():
+                    self.assertEqual(list(compiled_artifact.get_mbox_rules(mbox_name, property_token)),
+                                     filter_rules(mbox_rules, property_token))
+
+                all_view_rules = []
+                for view_name, view_rules in rules.get("views", {}).items():
+                    all_view_rules.extend(view_rules)
+                    self.assertEqual(list(compiled_artifact.get_view_rules(view_name, property_token)),
+                                     filter_rules(view_rules, property_token))
+                self.assertEqual(list(compiled_artifact.get_view_rules(None, property_token)),
+                                 filter_rules(all_view_rules, property_token))
+
+    def test_rule_index_property_tokens(self):
+        artifact = read_json_file(TEST_ARTIFACTS_FOLDER, "TEST_ARTIFACT_PROPERTIES.json")
+        compiled_artifact = CompiledArtifact(artifact)
+        property_tokens = get_artifact_property_tokens(artifact)
+        self.assertGreater(len(property_tokens), 0)
+
+        for property_token in property_tokens:
+            for rule in compiled_artifact.get_view_rules(None, property_token):
+                rule_tokens = rule.get("propertyTokens")
+                self.assertTrue(not rule_tokens or property_token in rule_tokens)
+
+    def test_rule_index_unknown_name(self):
+        compiled_artifact = CompiledArtifact(read_json_file(TEST_ARTIFACTS_FOLDER, "TEST_ARTIFACT_VIEWS.json"))
+        self.assertEqual(compiled_artifact.get_mbox_rules("no-such-mbox", None), ())
+        self.assertEqual(compiled_artifact.get_view_rules("no-such-view", "token"), ())
+
+    def test_get_condition(self):
+        artifact = read_json_file(TEST_ARTIFACTS_FOLDER, "TEST_ARTIFACT_AB_SIMPLE.json")
+        compiled_artifact = CompiledArtifact(artifact)
+        rule = compiled_artifact.get_mbox_rules("mbox-magician", None)[0]
+        condition = compiled_artifact.get_condition(rule)
+        self.assertIs(compiled_artifact.get_condition(rule), condition)
+        self.assertTrue(condition({"allocation": 10}))
+
+    def test_active_rule_set_matches_full_conditions(self):
+        for artifact_file in get_test_artifacts():
+            compiled_artifact = CompiledArtifact(read_json_file(TEST_ARTIFACTS_FOLDER, artifact_file))
+            rules = compiled_artifact.rules
+
+            for context in create_timing_contexts(compiled_artifact):
+                active_rule_set = compiled_artifact.get_active_rule_set(context)
+                groups = [(compiled_artifact.get_mbox_rules(name, None), active_rule_set.get_mbox_rules(name, None))
+                          for name in rules.get("mboxes", {})]
+                groups.append((compiled_artifact.get_view_rules(None, None),
+                               active_rule_set.get_view_rules(None, None)))
+
+                for all_rules, active_rules in groups:
+                    active_rule_ids = set(id(rule) for rule in active_rules)
+                    self.assertTrue(active_rule_ids.issubset(set(id(rule) for rule in all_rules)))
+                    for rule in all_rules:
+                        expected = evaluate(compiled_artifact.get_condition(rule), context)
+                        actual = id(rule) in active_rule_ids and evaluate(active_rule_set.get_condition(rule), context)
+                        self.assertEqual(actual, expected)
+
+    def test_active_rule_set_timeframe(self):
+        compiled_artifact = CompiledArtifact(read_json_file(TEST_ARTIFACTS_FOLDER, "TEST_ARTIFACT_TIMEFRAME.json"))
+        self.assertTrue(compiled_artifact.depends_on_clock)
+        self.assertEqual(compiled_artifact.time_boundaries,
+                         [1613034000000, 1613034000001, 1613239200000, 1613239200001,
+                          1613389200000, 1613389200001, 1613734800000, 1613734800001])
+
+        context = dict(BASE_CONTEXT)
+        context.update(current_timestamp=1613100000000, current_day=3)
+        active_rule_set = compiled_artifact.get_active_rule_set(context)
+        active_rules = active_rule_set.get_mbox_rules("mbox-dateranges", None)
+        self.assertEqual(len(compiled_artifact.get_mbox_rules("mbox-dateranges", None)), 4)
+        self.assertEqual(len(active_rules), 2)
+        self.assertEqual(active_rules[0].get("condition"),
+                         {"<=": [1613034000000, {"var": "current_timestamp"}, 1613239200000]})
+        self.assertTrue(active_rule_set.get_condition(active_rules[0])({}))
+
+    def test_active_rule_set_is_cached_within_time_window(self):
+        compiled_artifact = CompiledArtifact(read_json_file(TEST_ARTIFACTS_FOLDER, "TEST_ARTIFACT_TIMEFRAME.json"))
+        context = dict(BASE_CONTEXT)
+        context.update(current_timestamp=1613100000000)
+        active_rule_set = compiled_artifact.get_active_rule_set(context)
+
+        context.update(current_timestamp=1613239199999)
+        self.assertIs(compiled_artifact.get_active_rule_set(context), active_rule_set)
+        context.update(current_timestamp=1613239200000)
+        self.assertIsNot(compiled_artifact.get_active_rule_set(context), active_rule_set)
+
+        active_rule_set = compiled_artifact.get_active_rule_set(context)
+        context.update(current_time="1331")
+        self.assertIsNot(compiled_artifact.get_active_rule_set(context), active_rule_set)
+
+    def test_sub_expression_of_single_time_windowed_rule_is_not_memoized(self):
+        condition = {"and": [{"<=": [1613034000000, {"var": "current_timestamp"}, 1613239200000]},
+                             {"==": [{"var": "user.browserType"}, "chrome"]},
+                             {"<": [{"var": "allocation"}, 50]}]}
+        artifact = {"rules": {"mboxes": {"mbox-time": [{"ruleKey": "rule", "condition": condition}]}, "views": {}}}
+        compiled_artifact = CompiledArtifact(artifact)
+        rule = compiled_artifact.get_mbox_rules("mbox-time", None)[0]
+
+        memo = {}
+        context = dict(BASE_CONTEXT, current_timestamp=1613100000000, user={"browserType": "chrome"}, allocation=10)
+        self.assertTrue(compiled_artifact.request_conditions.get(id(rule))(context, memo))
+        self.assertTrue(compiled_artifact.get_condition(rule)(context, memo))
+        self.assertEqual(memo, {})
+
+    def test_active_rule_set_without_time_conditions(self):
+        compiled_artifact = CompiledArtifact(read_json_file(TEST_ARTIFACTS_FOLDER, "TEST_ARTIFACT_AB_SIMPLE.json"))
+        self.assertIs(compiled_artifact.get_active_rule_set(BASE_CONTEXT), compiled_artifact.rule_set)
+
+    def test_get_required_equality(self):
+        browser = {"==": [{"var": "user.browserType"}, "chrome"]}
+        self.assertEqual(get_required_equality(browser), ("user.browserType", ["chrome"]))
+        self.assertEqual(get_required_equality({"===": ["bar", {"var": "mbox.foo"}]}), ("mbox.foo", ["bar"]))
+        self.assertEqual(get_required_equality({"and": [{">": [{"var": "allocation"}, 5]}, {"and": [browser]}]}),
+                         ("user.browserType", ["chrome"]))
+        self.assertEqual(get_required_equality({"in": [{"var": "page.domain"}, ["a.com", "b.com"]]}),
+                         ("page.domain", ["a.com", "b.com"]))
+
+    def test_get_required_equality_none(self):
+        self.assertIsNone(get_required_equality(True))
+        self.assertIsNone(get_required_equality({"or": [{"==": [{"var": "user.browserType"}, "chrome"]}]}))
+        self.assertIsNone(get_required_equality({"==": [{"var": "user.browserVersion"}, 88]}))
+        self.assertIsNone(get_required_equality({"==": [{"var": "allocation"}, "50"]}))
+        self.assertIsNone(get_required_equality({"==": [{"var": ["user.browserType", "chrome"]}, "chrome"]}))
+        self.assertIsNone(get_required_equality({"!=": [{"var": "user.browserType"}, "chrome"]}))
+        self.assertIsNone(get_required_equality({"in": ["chrome", {"var": "user.browserType"}]}))
+
+    def test_get_candidate_rules(self):
+        compiled_artifact = CompiledArtifact(read_json_file(TEST_ARTIFACTS_FOLDER, "TEST_ARTIFACT_BROWSER.json"))
+        rule_set = compiled_artifact.rule_set
+        rules = get_artifact_rules(compiled_artifact.artifact)
+
+        context = dict(BASE_CONTEXT)
+        context["user"] = {"browserType": "firefox"}
+        candidate_rules = rule_set.get_candidate_rules(rules, context)
+        self.assertLess(len(candidate_rules), len(rules))
+        for rule in candidate_rules:
+            required_equality = get_required_equality(rule.get("condition"))
+            self.assertTrue(not required_equality or "firefox" in required_equality[1])
+
+        context["user"] = {"browserType": "netscape"}
+        self.assertEqual(rule_set.get_candidate_rules(rules, context),
+                         [rule for rule in rules if not get_required_equality(rule.get("condition"))])
+
+    def test_get_candidate_rules_keeps_satisfied_rules(self):
+        for artifact_file in get_test_artifacts():
+            compiled_artifact = CompiledArtifact(read_json_file(TEST_ARTIFACTS_FOLDER, artifact_file))
+            rule_set = compiled_artifact.rule_set
+            rules = get_artifact_rules(compiled_artifact.artifact)
+
+            for rule in rules:
+                for context in create_contexts(rule.get("condition")):
+                    candidate_rules = rule_set.get_candidate_rules(rules, context)
+                    candidate_rule_ids = set(id(candidate) for candidate in candidate_rules)
+                    if evaluate(rule_set.get_condition(rule), context) is True:
+                        self.assertIn(id(rule), candidate_rule_ids)
+
+    def test_get_artifact_context_keys(self):
+        artifact = read_json_file(TEST_ARTIFACTS_FOLDER, "TEST_ARTIFACT_BROWSER.json")
+        self.assertEqual(get_artifact_context_keys(artifact), {"user", "geo"})
+        self.assertEqual(get_artifact_context_keys(dict(artifact, responseTokens=["activity.id"])), {"user"})
+        self.assertEqual(get_artifact_context_keys(None), set())
+
+        rule = {"condition": {"==": [{"var": ""}, 1]}}
+        self.assertIsNone(get_artifact_context_keys({"rules": {"mboxes": {"mbox": [rule]}}}))
+
+    def test_context_keys_cover_every_var(self):
+        for artifact_file in get_test_artifacts():
+            compiled_artifact = CompiledArtifact(read_json_file(TEST_ARTIFACTS_FOLDER, artifact_file))
+            context_keys = compiled_artifact.context_keys
+            if context_keys is None:
+                continue
+            for rule in get_artifact_rules(compiled_artifact.artifact):
+                for context in create_contexts(rule.get("condition")):
+                    partial_context = {key: value for key, value in context.items() if key in context_keys}
+                    partial_context["allocation"] = context.get("allocation")
+                    condition = compiled_artifact.get_condition(rule)
+                    self.assertEqual(evaluate(condition, partial_context), evaluate(condition, context))
+
+    def test_requires_geo_for_mboxes(self):
+        artifact = read_json_file(TEST_ARTIFACTS_FOLDER, "TEST_ARTIFACT_GEO.json")
+        geo_mbox_request = DeliveryRequest(context=CONTEXT,
+                                           execute=ExecuteRequest(mboxes=[MboxRequest(name="mbox-geography")]))
+        other_mbox_request = DeliveryRequest(context=CONTEXT,
+                                             prefetch=PrefetchRequest(mboxes=[MboxRequest(name="other")]))
+
+        self.assertTrue(CompiledArtifact(artifact).requires_geo(other_mbox_request))
+
+        artifact["responseTokens"] = ["activity.id"]
+        compiled_artifact = CompiledArtifact(artifact)
+        self.assertEqual(compiled_artifact.geo_mboxes, {"mbox-geography"})
+        self.assertTrue(compiled_artifact.requires_geo(geo_mbox_request))
+        self.assertFalse(compiled_artifact.requires_geo(other_mbox_request))
+        self.assertFalse(compiled_artifact.requires_geo(DeliveryRequest(context=CONTEXT)))
+
+        artifact["globalMbox"] = "mbox-geography"
+        self.assertTrue(CompiledArtifact(artifact).requires_geo(other_mbox_request))
+
+    def test_requires_geo_for_views(self):
+        geo_rule = {"condition": {"==": [{"var": "geo.city"}, "SAN FRANCISCO"]}}
+        other_rule = {"condition": {"==": [{"var": "user.browserType"}, "chrome"]}}
+        compiled_artifact = CompiledArtifact({"rules": {"views": {"home": [geo_rule], "cart": [other_rule]}}})
+
+        def view_request(*names):
+            return DeliveryRequest(context=CONTEXT,
+                                   prefetch=PrefetchRequest(views=[ViewRequest(name=name) for name in names]))
+
+        self.assertTrue(compiled_artifact.requires_geo(view_request("home")))
+        self.assertTrue(compiled_artifact.requires_geo(view_request(None)))
+        self.assertFalse(compiled_artifact.requires_geo(view_request("cart")))
+
+    def test_create_consequence_matches_consequence(self):
+        for artifact_file in get_test_artifacts():
+            compiled_artifact = CompiledArtifact(read_json_file(TEST_ARTIFACTS_FOLDER, artifact_file))
+            for rule in get_artifact_rules(compiled_artifact.artifact):
+                self.assertEqual(compiled_artifact.rule_set.create_consequence(rule),
+                                 create_mbox_response(deepcopy(rule.get("consequence"))))
+
+    def test_create_consequence_does_not_share_mutable_values(self):
+        compiled_artifact = CompiledArtifact(read_json_file(TEST_ARTIFACTS_FOLDER, "TEST_ARTIFACT_FEATURE_FLAG.json"))
+        rule = get_artifact_rules(compiled_artifact.artifact)[0]
+        expected = create_mbox_response(deepcopy(rule.get("consequence")))
+
+        consequence = compiled_artifact.rule_set.create_consequence(rule)
+        option = consequence.options[0]
+        self.assertIsInstance(option.content, dict)
+        with self.assertRaises(TypeError):
+            option.content["mutated"] = True
+        option.event_token = "mutated"
+        consequence.metrics.append(None)
+
+        self.assertEqual(compiled_artifact.rule_set.create_consequence(rule), expected)
+
+    def test_create_consequence_shares_frozen_content(self):
+        compiled_artifact = CompiledArtifact(read_json_file(TEST_ARTIFACTS_FOLDER, "TEST_ARTIFACT_FEATURE_FLAG.json"))
+        rule = get_artifact_rules(compiled_artifact.artifact)[0]
+        content = compiled_artifact.rule_set.create_consequence(rule).options[0].content
+        self.assertIs(compiled_artifact.rule_set.create_consequence(rule).options[0].content, content)
+
+        content_copy = deepcopy(content)
+        content_copy["mutated"] = True
+        self.assertEqual(type(content_copy), dict)
+        self.assertNotIn("mutated", content)
+        self.assertEqual(json.loads(json.dumps(content)), rule.get("consequence").get("options")[0].get("content"))
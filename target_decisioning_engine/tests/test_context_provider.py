@@ -8,7 +8,14 @@
 # OF ANY KIND, either express or implied. See the License for the specific language
 # governing permissions and limitations under the License.
 """Unit tests for target_decisioning_engine.context_provider module"""
+import datetime
 import unittest
+from copy import copy
+from copy import deepcopy
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
 
 from delivery_api_client import Context
 from delivery_api_client import ChannelType
@@ -21,11 +28,15 @@ from target_decisioning_engine.context_provider import create_referring_context
 from target_decisioning_engine.context_provider import create_mbox_context
 from target_decisioning_engine.context_provider import create_geo_context
 from target_decisioning_engine.context_provider import create_decisioning_context
+from target_decisioning_engine.context_provider import create_rule_context
+from target_decisioning_engine.context_provider import TimingContextProvider
 from target_decisioning_engine.types.decisioning_context import UserContext
+from target_decisioning_engine.types.decisioning_context import FrozenPageContext
 from target_decisioning_engine.types.decisioning_context import PageContext
 from target_decisioning_engine.types.decisioning_context import GeoContext
 from target_decisioning_engine.types.decisioning_context import DecisioningContext
 from target_tools.constants import EMPTY_STRING
+from target_tools.utils import get_epoch_time_milliseconds
 
 FIREFOX_USER_AGENT = \
     "Mozilla/5.0 (Windows NT 6.1; Win64; x64; rv:47.0) Gecko/20100101 Firefox/47.0"
@@ -95,6 +106,28 @@ class TestContextProvider(unittest.TestCase):
         self.assertEqual(result.get("url"), "https://stage.applookout.net/")
         self.assertEqual(result.get("url_lc"), "https://stage.applookout.net/")
 
+    def test_create_page_context_is_cached_and_frozen(self):
+        result = create_page_context(Address(url=TEST_URL))
+        self.assertIsInstance(result, FrozenPageContext)
+        self.assertIs(create_page_context(Address(url=TEST_URL)), result)
+        self.assertIs(create_referring_context(Address(referring_url=TEST_URL)), result)
+
+        with self.assertRaises(TypeError):
+            result["path"] = "/other"
+        with self.assertRaises(TypeError):
+            result.update({"path": "/other"})
+        with self.assertRaises(TypeError):
+            result.pop("path")
+        self.assertEqual(result.get("path"), "/Posts")
+
+    def test_frozen_page_context_copies_are_modifiable(self):
+        result = create_page_context(Address(url=TEST_URL))
+        for result_copy in [copy(result), deepcopy(result)]:
+            self.assertNotIsInstance(result_copy, FrozenPageContext)
+            self.assertEqual(result_copy, result)
+            result_copy["path"] = "/other"
+            self.assertEqual(result.get("path"), "/Posts")
+
     def test_create_referring_context_url_empty_string(self):
         address = Address(referring_url=EMPTY_STRING)
         result = create_referring_context(address)
@@ -193,6 +226,30 @@ class TestContextProvider(unittest.TestCase):
         self.assertEqual(len(result.get("current_time")), 4)
         self.assertTrue(result.get("current_timestamp") > 0)
 
+    def test_timing_context_provider(self):
+        now = {"value": datetime.datetime(2021, 3, 7, 23, 59, 10, 500000)}
+        provider = TimingContextProvider(clock=lambda: now.get("value"))
+
+        result = provider.create_timing_context()
+        self.assertEqual(result, {"current_timestamp": get_epoch_time_milliseconds(now.get("value")),
+                                  "current_time": "2359",
+                                  "current_day": 7})
+
+        now["value"] = datetime.datetime(2021, 3, 7, 23, 59, 59, 999000)
+        same_minute = provider.create_timing_context()
+        self.assertEqual(same_minute.get("current_timestamp"), get_epoch_time_milliseconds(now.get("value")))
+        self.assertIs(same_minute.get("current_time"), result.get("current_time"))
+        self.assertIsNot(same_minute, result)
+
+        now["value"] = datetime.datetime(2021, 3, 8, 0, 0, 0)
+        self.assertEqual(provider.create_timing_context(), {
+            "current_timestamp": get_epoch_time_milliseconds(now.get("value")),
+            "current_time": "0000",
+            "current_day": 1})
+
+        now["value"] = datetime.datetime(2021, 3, 7, 9, 5, 0)
+        self.assertEqual(provider.create_timing_context().get("current_time"), "0905")
+
     def test_create_decisioning_context_generate_blank_context(self):
         request_context = Context(ChannelType.WEB)
         request = DeliveryRequest(context=request_context)
@@ -272,3 +329,35 @@ class TestContextProvider(unittest.TestCase):
         self.validate_object_values(result.get("user"))
         self.validate_object_values(result.get("page"))
         self.validate_object_values(result.get("referring"))
+
+    def test_create_decisioning_context_partial(self):
+        address = Address(url=TEST_URL, referring_url=TEST_URL)
+        request_context = Context(channel=ChannelType.WEB, user_agent=FIREFOX_USER_AGENT, address=address,
+                                  geo=Geo(city="San Francisco"))
+        request = DeliveryRequest(context=request_context)
+
+        with patch("target_decisioning_engine.context_provider.parse_user_agent") as user_agent_mock:
+            result = create_decisioning_context(request, context_keys={"page", "mbox"})
+            user_agent_mock.assert_not_called()
+
+        self.assertIsNotNone(result.get("current_timestamp"))
+        self.assertEqual(result.get("page"), create_page_context(address))
+        self.assertEqual(result.get("user"), UserContext())
+        self.assertEqual(result.get("referring"), PageContext())
+        self.assertEqual(result.get("geo"), GeoContext())
+
+    def test_create_rule_context(self):
+        address = Address(url=TEST_URL)
+        request_context = Context(channel=ChannelType.WEB, user_agent=FIREFOX_USER_AGENT, address=address)
+        context = create_decisioning_context(DeliveryRequest(context=request_context))
+        mbox = {"foo": "bar"}
+
+        result = create_rule_context(context, {"mbox": mbox, "allocation": 42.5})
+
+        self.assertTrue(isinstance(result, DecisioningContext))
+        self.assertEqual(result.get("mbox"), mbox)
+        self.assertEqual(result.get("allocation"), 42.5)
+        self.assertIs(result.get("user"), context.get("user"))
+        self.assertIs(result.get("page"), context.get("page"))
+        self.assertIsNone(context.get("mbox"))
+        self.assertIsNone(context.get("allocation"))
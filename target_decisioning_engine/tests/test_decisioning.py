@@ -26,6 +26,8 @@ from urllib3 import HTTPResponse
 from target_tools.tests.helpers import expect_to_match_object
 from target_decisioning_engine import TargetDecisioningEngine
 from target_decisioning_engine import GeoProvider
+from target_decisioning_engine.geo_provider import geo_lookup_cache
+from target_decisioning_engine.geo_provider import geo_lookup_failure_cache
 from target_decisioning_engine.tests.helpers import get_test_suites
 from target_decisioning_engine.tests.helpers import create_decisioning_config
 from target_decisioning_engine.tests.helpers import create_target_delivery_request
@@ -66,6 +68,8 @@ def datetime_mock(mock_date):
 @contextmanager
 def geo_mock(mock_geo):
     """GeoProvider http mock"""
+    geo_lookup_cache.clear()
+    geo_lookup_failure_cache.clear()
     if mock_geo:
         with patch.object(GeoProvider, "_request_geo") as mock_request_geo:
             mock_response = HTTPResponse(status=200, body=json.dumps(mock_geo))
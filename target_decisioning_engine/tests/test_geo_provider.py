@@ -21,10 +21,13 @@ from urllib3 import HTTPResponse
 from delivery_api_client import Geo
 from target_decisioning_engine.geo_provider import create_or_update_geo_object
 from target_decisioning_engine.geo_provider import GeoProvider
+from target_decisioning_engine.geo_provider import geo_lookup_cache
+from target_decisioning_engine.geo_provider import geo_lookup_failure_cache
 from target_decisioning_engine.types.decisioning_config import DecisioningConfig
 from target_decisioning_engine.constants import HTTP_HEADER_FORWARDED_FOR
 from target_decisioning_engine.constants import BAD_REQUEST
 from target_decisioning_engine.constants import OK
+from target_decisioning_engine.constants import GEO_LOOKUP_FAILURE_CACHE_TTL
 from target_tools.tests.helpers import read_json_file
 
 CURRENT_DIR = os.path.dirname(__file__)
@@ -35,6 +38,8 @@ class TestGeoProvider(unittest.TestCase):
     """TestGeoProvider"""
 
     def setUp(self):
+        geo_lookup_cache.clear()
+        geo_lookup_failure_cache.clear()
         self.headers = {
             "x-geo-latitude": 37.773972,
             "x-geo-longitude": -122.431297,
@@ -155,6 +160,18 @@ class TestGeoProvider(unittest.TestCase):
             self.assertEqual(mock_http_call.call_args[0][1], "https://assets.adobetarget.com/v1/geo")
             self.assertIsNone(mock_http_call.call_args[1].get("headers").get(HTTP_HEADER_FORWARDED_FOR))
 
+    def test_valid_geo_request_context_lookup_not_required(self):
+        artifact = deepcopy(ARTIFACT_BLANK)
+        artifact["geoTargetingEnabled"] = True
+        geo_provider = GeoProvider(self.config, artifact)
+
+        with patch.object(geo_provider.pool_manager, "request", return_value=self.mock_geo_response) as mock_http_call:
+            geo_input = Geo(ip_address="12.21.1.40")
+            result = geo_provider.valid_geo_request_context(geo_input, lookup_required=False)
+
+            self.assertEqual(result, geo_input)
+            self.assertEqual(mock_http_call.call_count, 0)
+
     def test_valid_geo_request_context_not_missing_geo_fields(self):
         expected = Geo(city="Las Vegas")
         artifact = deepcopy(ARTIFACT_BLANK)
@@ -187,6 +204,87 @@ class TestGeoProvider(unittest.TestCase):
             self.assertEqual(mock_http_call.call_args[0][1], "https://assets.adobetarget.com/v1/geo")
             self.assertEqual(mock_http_call.call_args[1].get("headers").get(HTTP_HEADER_FORWARDED_FOR), "12.21.1.40")
 
+    def test_valid_geo_request_context_cached_by_ip_address(self):
+        artifact = deepcopy(ARTIFACT_BLANK)
+        artifact["geoTargetingEnabled"] = True
+        geo_provider = GeoProvider(self.config, artifact)
+        other_geo_provider = GeoProvider(self.config, artifact)
+
+        with patch.object(geo_provider.pool_manager, "request",
+                          return_value=self.mock_geo_response) as mock_http_call, \
+                patch.object(other_geo_provider.pool_manager, "request") as other_mock_http_call:
+            result = geo_provider.valid_geo_request_context(Geo(ip_address="12.21.1.40"))
+            result.city = "MUTATED"
+            cached_result = other_geo_provider.valid_geo_request_context(Geo(ip_address="12.21.1.40"))
+
+            self.assertEqual(mock_http_call.call_count, 1)
+            self.assertEqual(other_mock_http_call.call_count, 0)
+            self.assertEqual(cached_result.city, "SAN FRANCISCO")
+            self.assertEqual(cached_result.ip_address, "12.21.1.40")
+
+            other_geo_provider.valid_geo_request_context(Geo(ip_address="12.21.1.41"))
+            self.assertEqual(other_mock_http_call.call_count, 1)
+
+    def test_valid_geo_request_context_cache_keeps_request_geo_fields(self):
+        artifact = deepcopy(ARTIFACT_BLANK)
+        artifact["geoTargetingEnabled"] = True
+        geo_provider = GeoProvider(self.config, artifact)
+
+        with patch.object(geo_provider.pool_manager, "request", return_value=self.mock_geo_response) as mock_http_call:
+            first = geo_provider.valid_geo_request_context(Geo(ip_address="12.21.1.40", zip="94103"))
+            second = geo_provider.valid_geo_request_context(Geo(ip_address="12.21.1.40", zip="10001"))
+            third = geo_provider.valid_geo_request_context(Geo(ip_address="12.21.1.40"))
+
+            self.assertEqual(mock_http_call.call_count, 1)
+            self.assertEqual(first.zip, "94103")
+            self.assertEqual(second.zip, "10001")
+            self.assertIsNone(third.zip)
+            for result in [first, second, third]:
+                self.assertEqual(result.city, "SAN FRANCISCO")
+                self.assertEqual(result.ip_address, "12.21.1.40")
+
+    def test_valid_geo_request_context_no_ip_address_not_cached(self):
+        artifact = deepcopy(ARTIFACT_BLANK)
+        artifact["geoTargetingEnabled"] = True
+        geo_provider = GeoProvider(self.config, artifact)
+
+        with patch.object(geo_provider.pool_manager, "request", return_value=self.mock_geo_response) as mock_http_call:
+            geo_provider.valid_geo_request_context(Geo())
+            geo_provider.valid_geo_request_context(Geo())
+
+            self.assertEqual(mock_http_call.call_count, 2)
+            self.assertEqual(len(geo_lookup_cache), 0)
+
+    def test_valid_geo_request_context_failure_cached(self):
+        artifact = deepcopy(ARTIFACT_BLANK)
+        artifact["geoTargetingEnabled"] = True
+        geo_provider = GeoProvider(self.config, artifact)
+        now = [1000.0]
+
+        mock_bad_response = HTTPResponse(body="Bad Request", status=BAD_REQUEST)
+        with patch.object(geo_lookup_failure_cache, "clock", lambda: now[0]), \
+                patch.object(geo_provider.pool_manager, "request", return_value=mock_bad_response) as mock_http_call:
+            self.assertIsNone(geo_provider.valid_geo_request_context(Geo(ip_address="12.21.1.40")))
+            self.assertIsNone(geo_provider.valid_geo_request_context(Geo(ip_address="12.21.1.40")))
+            self.assertEqual(mock_http_call.call_count, 1)
+
+            now[0] += GEO_LOOKUP_FAILURE_CACHE_TTL
+            mock_http_call.return_value = self.mock_geo_response
+            result = geo_provider.valid_geo_request_context(Geo(ip_address="12.21.1.40"))
+            self.assertEqual(mock_http_call.call_count, 2)
+            self.assertEqual(result.city, "SAN FRANCISCO")
+
+    def test_valid_geo_request_context_exception_cached(self):
+        artifact = deepcopy(ARTIFACT_BLANK)
+        artifact["geoTargetingEnabled"] = True
+        geo_provider = GeoProvider(self.config, artifact)
+
+        with patch.object(geo_provider, "_request_geo", side_effect=Exception("timeout")) as mock_http_call:
+            self.assertIsNone(geo_provider.valid_geo_request_context(Geo(ip_address="12.21.1.40")))
+            self.assertIsNone(geo_provider.valid_geo_request_context(Geo(ip_address="12.21.1.40")))
+            self.assertEqual(mock_http_call.call_count, 1)
+            self.assertEqual(len(geo_lookup_cache), 0)
+
     def test_geo_invalid_ip_address(self):
         with self.assertRaises(ValueError) as err:
             Geo(ip_address="277.0.0.1")
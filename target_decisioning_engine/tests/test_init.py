@@ -24,6 +24,10 @@ from urllib3 import PoolManager, HTTPResponse
 from target_decisioning_engine import TargetDecisioningEngine
 from target_decisioning_engine import SUPPORTED_ARTIFACT_MAJOR_VERSION
 from target_decisioning_engine import MESSAGES
+from target_decisioning_engine.allocation_provider import calculate_allocation_memoized
+from target_decisioning_engine.constants import ALLOCATION_CACHE
+from target_decisioning_engine.constants import DEFAULT_ALLOCATION_CACHE_SIZE
+from target_decisioning_engine.trace_sinks import RingBufferTraceSink
 from target_decisioning_engine.types.decisioning_config import DecisioningConfig
 from target_decisioning_engine.events import ARTIFACT_DOWNLOAD_FAILED
 from target_decisioning_engine.types.target_delivery_request import TargetDeliveryRequest
@@ -33,6 +37,7 @@ from target_tools.tests.helpers import read_json_file
 CURRENT_DIR = os.path.dirname(__file__)
 ARTIFACT_BLANK = read_json_file(CURRENT_DIR, "schema/artifacts/TEST_ARTIFACT_BLANK.json")
 ARTIFACT_UNSUPPORTED_VERSION = read_json_file(CURRENT_DIR, "schema/artifacts/TEST_ARTIFACT_UNSUPPORTED.json")
+ARTIFACT_AB_SIMPLE = read_json_file(CURRENT_DIR, "schema/artifacts/TEST_ARTIFACT_AB_SIMPLE.json")
 
 TARGET_REQUEST = create_delivery_request({
     "context": {
@@ -57,6 +62,7 @@ CONFIG = DecisioningConfig("clientId", "orgId", maximum_wait_ready=500)
 
 MOCK_ARTIFACT_RESPONSE = HTTPResponse(status=200, body=json.dumps(ARTIFACT_BLANK))
 MOCK_ARTIFACT_RESPONSE_BAD = HTTPResponse(status=500)
+MOCK_ARTIFACT_RESPONSE_AB_SIMPLE = HTTPResponse(status=200, body=json.dumps(ARTIFACT_AB_SIMPLE))
 MOCK_ARTIFACT_RESPONSE_UNSUPPORTED_VERSION = HTTPResponse(status=200, body=json.dumps(ARTIFACT_UNSUPPORTED_VERSION))
 
 
@@ -137,3 +143,84 @@ class TestTargetDecisioningEngine(unittest.TestCase):
             self.assertEqual(json.loads(err.exception.body),
                              MESSAGES.get("ARTIFACT_VERSION_UNSUPPORTED")(ARTIFACT_UNSUPPORTED_VERSION.get("version"),
                                                                           SUPPORTED_ARTIFACT_MAJOR_VERSION))
+
+    def test_get_offers_batch(self):
+        config = deepcopy(CONFIG)
+        config.polling_interval = 0
+        config.send_notification_func = Mock()
+        self.decisioning = TargetDecisioningEngine(config)
+
+        with patch.object(PoolManager, "request", return_value=MOCK_ARTIFACT_RESPONSE_AB_SIMPLE):
+            self.decisioning.initialize()
+
+        get_offers_opts_list = [TargetDeliveryRequest(request=create_delivery_request({
+            "id": {"tntId": tnt_id},
+            "context": {"channel": "web", "geo": {"city": "San Francisco"}},
+            "execute": {"mboxes": [{"name": "mbox-magician", "index": 1}]}
+        })) for tnt_id in ["338e3c1e51f7416a8e1ccba4f81acea0.28_0", "visitor-two", "visitor-three"]]
+
+        responses = self.decisioning.get_offers_batch(get_offers_opts_list)
+        time.sleep(1)
+
+        self.assertEqual(len(responses), len(get_offers_opts_list))
+        self.assertEqual(config.send_notification_func.call_count, len(get_offers_opts_list))
+
+        for index, get_offers_opts in enumerate(get_offers_opts_list):
+            response = responses[index]
+            self.assertEqual(response.id.tnt_id, get_offers_opts.request.id.tnt_id)
+            expected = self.decisioning.get_offers(get_offers_opts)
+            self.assertEqual(response.execute.mboxes[0].options[0].content,
+                             expected.execute.mboxes[0].options[0].content)
+            notification_request = config.send_notification_func.call_args_list[index][0][0]["request"]
+            self.assertEqual(notification_request.id.tnt_id, get_offers_opts.request.id.tnt_id)
+
+    def test_get_offers_batch_empty(self):
+        config = deepcopy(CONFIG)
+        config.polling_interval = 0
+        config.send_notification_func = Mock()
+        self.decisioning = TargetDecisioningEngine(config)
+
+        with patch.object(PoolManager, "request", return_value=MOCK_ARTIFACT_RESPONSE_AB_SIMPLE):
+            self.decisioning.initialize()
+
+        self.assertEqual(self.decisioning.get_offers_batch([]), [])
+        self.assertEqual(config.send_notification_func.call_count, 0)
+
+    def test_trace_sink(self):
+        config = deepcopy(CONFIG)
+        config.polling_interval = 0
+        config.trace_sink = RingBufferTraceSink()
+        self.decisioning = TargetDecisioningEngine(config)
+
+        with patch.object(PoolManager, "request", return_value=MOCK_ARTIFACT_RESPONSE_AB_SIMPLE):
+            self.decisioning.initialize()
+
+        request = create_delivery_request({
+            "id": {"tntId": "338e3c1e51f7416a8e1ccba4f81acea0.28_0"},
+            "requestId": "request-1",
+            "context": {"channel": "web", "geo": {"city": "San Francisco"}},
+            "execute": {"mboxes": [{"name": "mbox-magician", "index": 1}]}
+        })
+        response = self.decisioning.get_offers(TargetDeliveryRequest(request=request))
+        self.assertIsNone(response.execute.mboxes[0].trace)
+
+        records = config.trace_sink.get_records()
+        mbox_records = [record for record in records if record.get("name") == "mbox-magician"]
+        self.assertGreater(len(mbox_records), 0)
+        self.assertTrue(all(record.get("requestId") == "request-1" for record in records))
+        self.assertEqual([record.get("matched") for record in mbox_records][-1], True)
+        self.assertTrue(all(isinstance(record.get("evaluationTime"), float) for record in records))
+
+        config.trace_sample_rate = 0
+        self.decisioning.get_offers(TargetDeliveryRequest(request=request))
+        self.assertEqual(len(config.trace_sink.get_records()), len(records))
+
+    def test_cache_sizes(self):
+        config = deepcopy(CONFIG)
+        config.cache_sizes = {ALLOCATION_CACHE: 123}
+        allocation_cache = calculate_allocation_memoized.cache
+        try:
+            TargetDecisioningEngine(config)
+            self.assertEqual(allocation_cache.max_size, 123)
+        finally:
+            allocation_cache.resize(DEFAULT_ALLOCATION_CACHE_SIZE)
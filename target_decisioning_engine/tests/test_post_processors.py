@@ -0,0 +1,220 @@
+# Copyright 2021 Adobe. All rights reserved.
+# This file is licensed to you under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License. You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software distributed under
+# the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR REPRESENTATIONS
+# OF ANY KIND, either express or implied. See the License for the specific language
+# governing permissions and limitations under the License.
+"""Test cases for target_decisioning_engine.post_processors module"""
+try:
+    from unittest.mock import Mock
+    from unittest.mock import patch
+except ImportError:
+    from mock import Mock
+    from mock import patch
+import re
+import unittest
+from copy import deepcopy
+from delivery_api_client import MboxRequest
+from target_decisioning_engine.compiled_artifact import CompiledArtifact
+from target_decisioning_engine.compiled_artifact import get_artifact_rules
+from target_decisioning_engine.enums import RequestType
+from target_decisioning_engine.post_processors import add_campaign_macro_values
+from target_decisioning_engine.post_processors import add_trace
+from target_decisioning_engine.post_processors import create_response_tokens_post_processor
+from target_decisioning_engine.post_processors import fuse_post_processors
+from target_decisioning_engine.post_processors import FusedPostProcessor
+from target_decisioning_engine.post_processors import get_offer_contents
+from target_decisioning_engine.post_processors import get_response_tokens_from_meta
+from target_decisioning_engine.post_processors import get_rule_macro_templates
+from target_decisioning_engine.post_processors import get_rule_response_tokens
+from target_decisioning_engine.post_processors import MACRO_NAME_REMOVALS
+from target_decisioning_engine.post_processors import MACRO_NAME_REPLACEMENTS
+from target_decisioning_engine.post_processors import MACRO_NAME_REPLACEMENTS_REGEX
+from target_decisioning_engine.post_processors import MACRO_PATTERN_REGEX
+from target_decisioning_engine.post_processors import parse_macro_template
+from target_decisioning_engine.post_processors import PostProcessor
+from target_decisioning_engine.post_processors import ReplaceCampaignMacros
+from target_decisioning_engine.post_processors import prepare_execute_response
+from target_decisioning_engine.post_processors import prepare_prefetch_response
+from target_decisioning_engine.post_processors import remove_page_load_attributes
+from target_decisioning_engine.post_processors import replace_campaign_macros
+from target_decisioning_engine.tests.helpers import get_test_artifacts
+from target_decisioning_engine.tests.helpers import TEST_ARTIFACTS_FOLDER
+from target_tools.response_helpers import create_mbox_response
+from target_tools.tests.helpers import read_json_file
+from target_tools.utils import get_value_from_object
+from target_tools.utils import to_dict
+
+
+def run_post_processors(post_processors, rule, request_type, request_detail, tracer):
+    """Runs post-processors one after the other, returns the resulting response as a dict"""
+    mbox_response = create_mbox_response(deepcopy(rule.get("consequence")))
+    for post_processor in post_processors:
+        mbox_response = post_processor(rule, mbox_response, request_type, request_detail, tracer)
+    return to_dict(mbox_response)
+
+
+def reference_add_campaign_macro_values(html_content, rule, request_detail):
+    """Replaces campaign macros with regular expressions on every call"""
+    def replace_match(match):
+        parts = re.sub(MACRO_NAME_REPLACEMENTS_REGEX, lambda group_match: MACRO_NAME_REPLACEMENTS[group_match.group(0)],
+                       match.group(1), flags=re.IGNORECASE).split(".")
+        key = ".".join([part for part in parts[-2:] if part not in MACRO_NAME_REMOVALS])
+        parameters = request_detail.parameters if request_detail and request_detail.parameters else {}
+        for item in [rule.get("meta"), request_detail, parameters]:
+            replacement = get_value_from_object(item, key)
+            if replacement is not None:
+                return str(replacement)
+        return match.group(0)
+
+    return re.sub(MACRO_PATTERN_REGEX, replace_match, html_content, flags=re.IGNORECASE)
+
+
+def preserve_index(rule, mbox_response, request_type, request_detail, tracer):
+    """Plain function post-processor"""
+    mbox_response.index = 7
+    return mbox_response
+
+
+class UpperCaseHtml(PostProcessor):
+    """Custom post-processor with an option hook"""
+
+    def process_option(self, _option, index, context):
+        if isinstance(_option.content, str):
+            _option.content = _option.content.upper()
+        return _option
+
+
+class TestPostProcessors(unittest.TestCase):
+
+    def setUp(self):
+        self.tracer = Mock()
+        self.tracer.get_trace_result.return_value = {"trace": True}
+        self.request_detail = MboxRequest(name="mbox", index=2, parameters={"foo": "bar"})
+
+    def assert_fused_matches_sequential(self, post_processors, request_type=RequestType.MBOX.value):
+        fused_post_processors = fuse_post_processors(post_processors)
+        self.assertLess(len(fused_post_processors), len(post_processors))
+        for artifact_file in get_test_artifacts():
+            artifact = read_json_file(TEST_ARTIFACTS_FOLDER, artifact_file)
+            for rule in get_artifact_rules(artifact):
+                self.assertEqual(
+                    run_post_processors(fused_post_processors, rule, request_type, self.request_detail, self.tracer),
+                    run_post_processors(post_processors, rule, request_type, self.request_detail, self.tracer))
+
+    def test_fused_execute_post_processors(self):
+        response_tokens = create_response_tokens_post_processor({"geo": {"city": "sf"}}, ["activity.id", "geo.city"])
+        self.assert_fused_matches_sequential([preserve_index, prepare_execute_response, response_tokens,
+                                              replace_campaign_macros, add_trace, remove_page_load_attributes])
+
+    def test_fused_prefetch_post_processors(self):
+        response_tokens = create_response_tokens_post_processor({}, ["activity.id", "option.name"])
+        for request_type in [RequestType.MBOX.value, RequestType.VIEW.value]:
+            self.assert_fused_matches_sequential([prepare_prefetch_response, response_tokens, replace_campaign_macros,
+                                                  add_trace, preserve_index, UpperCaseHtml()], request_type)
+
+    def test_fuse_post_processors(self):
+        result = fuse_post_processors([preserve_index, prepare_execute_response, add_trace, preserve_index,
+                                       remove_page_load_attributes])
+        self.assertEqual(len(result), 4)
+        self.assertIs(result[0], preserve_index)
+        self.assertIsInstance(result[1], FusedPostProcessor)
+        self.assertEqual(result[1].stages, (prepare_execute_response, add_trace))
+        self.assertEqual(result[1].option_stages, (prepare_execute_response,))
+        self.assertIs(result[2], preserve_index)
+        self.assertEqual(result[3].option_stages, ())
+
+    def test_fused_post_processor_does_not_mutate_input(self):
+        rule = get_artifact_rules(read_json_file(TEST_ARTIFACTS_FOLDER, "TEST_ARTIFACT_AB_SIMPLE.json"))[0]
+        mbox_response = create_mbox_response(deepcopy(rule.get("consequence")))
+        expected = to_dict(mbox_response)
+
+        fused = FusedPostProcessor([prepare_execute_response, UpperCaseHtml(), add_trace])
+        result = fused(rule, mbox_response, RequestType.MBOX.value, self.request_detail, self.tracer)
+
+        self.assertEqual(to_dict(mbox_response), expected)
+        self.assertIsNone(result.options[0].event_token)
+        self.assertEqual(result.trace, {"trace": True})
+
+    def test_parse_macro_template(self):
+        self.assertIsNone(parse_macro_template("<div>no macros</div>"))
+        self.assertEqual(parse_macro_template("a ${campaign.recipe.name} b ${mbox.user}${x}"),
+                         (("a ", "experience.name", "${campaign.recipe.name}"), (" b ", "user", "${mbox.user}"),
+                          ("", "x", "${x}"), ""))
+
+    def test_add_campaign_macro_values(self):
+        request_detail = MboxRequest(name="mbox-macros", parameters={"user": "Mickey", "pgname": "home"})
+        for artifact_file in get_test_artifacts():
+            artifact = read_json_file(TEST_ARTIFACTS_FOLDER, artifact_file)
+            for rule in get_artifact_rules(artifact):
+                for content in get_offer_contents(rule.get("consequence")) + ["${mbox.unknown} ${offer.id}"]:
+                    self.assertEqual(add_campaign_macro_values(content, rule, request_detail),
+                                     reference_add_campaign_macro_values(content, rule, request_detail))
+
+    def test_add_campaign_macro_values_without_macros(self):
+        content = "<div>no macros</div>"
+        self.assertIs(add_campaign_macro_values(content, {}, None), content)
+        self.assertEqual(add_campaign_macro_values(None, {}, None), None)
+
+    def test_macro_templates_are_parsed_at_artifact_load(self):
+        artifact = read_json_file(TEST_ARTIFACTS_FOLDER, "TEST_ARTIFACT_CAMPAIGN_MACROS.json")
+        compiled_artifact = CompiledArtifact(artifact)
+        rules = get_artifact_rules(artifact)
+        self.assertEqual(compiled_artifact.macro_templates, get_rule_macro_templates(rules))
+
+        for rule in rules:
+            templates = compiled_artifact.macro_templates.get(id(rule))
+            contents = get_offer_contents(rule.get("consequence"))
+            self.assertEqual(templates, {content: parse_macro_template(content) for content in contents})
+
+    def test_replace_campaign_macros_uses_artifact_templates(self):
+        artifact = read_json_file(TEST_ARTIFACTS_FOLDER, "TEST_ARTIFACT_CAMPAIGN_MACROS.json")
+        compiled_artifact = CompiledArtifact(artifact)
+        request_detail = MboxRequest(name="mbox-macros", parameters={"user": "Mickey", "pgname": "home"})
+        precompiled = ReplaceCampaignMacros(compiled_artifact.macro_templates)
+
+        for rule in get_artifact_rules(artifact):
+            expected = run_post_processors([prepare_execute_response, replace_campaign_macros], rule,
+                                           RequestType.MBOX.value, request_detail, self.tracer)
+            with patch("target_decisioning_engine.post_processors.get_macro_template") as mock_get_macro_template:
+                result = run_post_processors([prepare_execute_response, precompiled], rule, RequestType.MBOX.value,
+                                             request_detail, self.tracer)
+            self.assertEqual(result, expected)
+            self.assertEqual(mock_get_macro_template.call_count, 0)
+
+    def test_get_rule_macro_templates_skips_unknown_macro_names(self):
+        rule = {"consequence": {"options": [{"type": "html", "content": "${Campaign.id}"},
+                                            {"type": "html", "content": "${campaign.id}"}]}}
+        self.assertEqual(get_rule_macro_templates([rule]), {
+            id(rule): {"${campaign.id}": (("", "activity.id", "${campaign.id}"), "")}
+        })
+
+    def test_rule_response_tokens(self):
+        artifact = read_json_file(TEST_ARTIFACTS_FOLDER, "TEST_ARTIFACT_AB_SIMPLE.json")
+        compiled_artifact = CompiledArtifact(artifact)
+        rule = get_artifact_rules(artifact)[0]
+        self.assertEqual(compiled_artifact.response_tokens, frozenset(artifact.get("responseTokens")))
+        self.assertEqual(compiled_artifact.rule_response_tokens.get(id(rule)),
+                         get_response_tokens_from_meta(rule, compiled_artifact.response_tokens))
+        self.assertIn("activity.id", compiled_artifact.rule_response_tokens.get(id(rule)))
+
+        context = {"geo": {"city": "sf", "region": "ca"}}
+        precomputed = create_response_tokens_post_processor(context, compiled_artifact.response_tokens,
+                                                            compiled_artifact.rule_response_tokens)
+        on_demand = create_response_tokens_post_processor(context, artifact.get("responseTokens"))
+        for post_processors in [[prepare_execute_response, precomputed], [prepare_execute_response, on_demand]]:
+            result = run_post_processors(post_processors, rule, RequestType.MBOX.value, self.request_detail,
+                                         self.tracer)
+            self.assertEqual(result.get("options")[0].get("responseTokens"), dict(
+                compiled_artifact.rule_response_tokens.get(id(rule)), **{
+                    "activity.decisioningMethod": "on-device", "geo.city": "sf", "geo.state": "ca"}))
+
+    def test_get_rule_response_tokens(self):
+        rules = [{"meta": {"activity.id": 1, "offer.id": 2, "unknown": 3}}, {"meta": {}}]
+        self.assertEqual(get_rule_response_tokens(rules, {"activity.id", "unknown"}), {
+            id(rules[0]): {"activity.id": 1},
+            id(rules[1]): {}
+        })
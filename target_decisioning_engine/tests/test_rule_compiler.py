@@ -0,0 +1,241 @@
+# Copyright 2021 Adobe. All rights reserved.
+# This file is licensed to you under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License. You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software distributed under
+# the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR REPRESENTATIONS
+# OF ANY KIND, either express or implied. See the License for the specific language
+# governing permissions and limitations under the License.
+"""Test cases for target_decisioning_engine.rule_compiler module"""
+import random
+import threading
+import unittest
+from functools import partial
+from json_logic import jsonLogic
+from target_decisioning_engine.compiled_artifact import get_artifact_rules
+from target_decisioning_engine.rule_compiler import AdaptiveJunction
+from target_decisioning_engine.rule_compiler import compile_condition
+from target_decisioning_engine.rule_compiler import ConditionCompiler
+from target_decisioning_engine.rule_compiler import get_var_paths
+from target_decisioning_engine.rule_compiler import is_request_level
+from target_decisioning_engine.rule_compiler import is_safe
+from target_decisioning_engine.rule_compiler import REORDER_INTERVAL
+from target_decisioning_engine.rule_compiler import SAMPLE_INTERVAL
+from target_decisioning_engine.tests.helpers import create_contexts
+from target_decisioning_engine.tests.helpers import get_test_artifacts
+from target_decisioning_engine.tests.helpers import TEST_ARTIFACTS_FOLDER
+from target_tools.tests.helpers import read_json_file
+
+
+REORDER_CALLS = SAMPLE_INTERVAL * REORDER_INTERVAL
+
+
+def evaluate_truthiness(evaluate, context):
+    """Evaluates condition truthiness, returns exception type if evaluation fails"""
+    try:
+        return bool(evaluate(context))
+    except (TypeError, ValueError) as err:
+        return type(err)
+
+
+def counting_operand(passes, counter):
+    """Creates a compiled operand that returns passes(data) and counts its evaluations"""
+    def evaluate_operand(data, memo):
+        counter.append(1)
+        return passes(data)
+
+    return evaluate_operand
+
+
+class TestRuleCompiler(unittest.TestCase):
+
+    def assert_same_as_json_logic(self, condition, contexts):
+        predicate = compile_condition(condition)
+        for context in contexts:
+            try:
+                expected = jsonLogic(condition, context)
+            except (TypeError, ValueError) as err:
+                self.assertRaises(type(err), predicate, context)
+                continue
+            self.assertEqual(predicate(context), expected)
+
+    def test_matches_json_logic_for_all_test_artifacts(self):
+        rule_count = 0
+        for artifact_file in get_test_artifacts():
+            artifact = read_json_file(TEST_ARTIFACTS_FOLDER, artifact_file)
+            for rule in get_artifact_rules(artifact):
+                condition = rule.get("condition")
+                self.assert_same_as_json_logic(condition, create_contexts(condition))
+                rule_count += 1
+        self.assertGreater(rule_count, 0)
+
+    def test_logical_operators(self):
+        condition = {"and": [{"or": [{"var": "a"}, {"var": "b"}]}, {"var": "c"}]}
+        contexts = [{}, {"a": 1}, {"a": 0, "b": "x", "c": 3}, {"a": 1, "c": []}, {"b": [1], "c": "y"}]
+        self.assert_same_as_json_logic(condition, contexts)
+        self.assert_same_as_json_logic({"and": []}, [{}])
+        self.assert_same_as_json_logic({"or": []}, [{}])
+
+    def test_comparison_operators(self):
+        contexts = [{}, {"a": 1}, {"a": "1"}, {"a": 1.5}, {"a": None}, {"a": True}, {"a": "abc"}]
+        for operator in ["==", "!=", "===", "!==", ">", ">=", "<", "<="]:
+            self.assert_same_as_json_logic({operator: [{"var": "a"}, 1]}, contexts)
+            self.assert_same_as_json_logic({operator: ["1", {"var": "a"}]}, contexts)
+        self.assert_same_as_json_logic({"<=": [0, {"var": "a"}, 2]}, contexts)
+        self.assert_same_as_json_logic({"<": [0, {"var": "a"}, 2]}, contexts)
+        self.assert_same_as_json_logic({"in": [{"var": "a"}, ["abc", 1]]}, contexts)
+        self.assert_same_as_json_logic({"in": ["b", {"var": "a"}]}, contexts)
+        self.assert_same_as_json_logic({"!": {"var": "a"}}, contexts)
+        self.assert_same_as_json_logic({"!!": [{"var": "a"}]}, contexts)
+
+    def test_var(self):
+        contexts = [{}, {"a": {"b": [10, {"c": 3}]}}, {"a": {"b": "str"}}, {"a": None}]
+        self.assert_same_as_json_logic({"var": "a.b.1.c"}, contexts)
+        self.assert_same_as_json_logic({"var": ["a.b", "fallback"]}, contexts)
+        self.assert_same_as_json_logic({"var": ""}, contexts)
+        self.assert_same_as_json_logic({"var": []}, contexts)
+
+    def test_falls_back_to_json_logic(self):
+        contexts = [{"a": 1, "b": [1, 2, 3]}, {"a": 2, "b": []}]
+        self.assert_same_as_json_logic({"if": [{"var": "a"}, "yes", "no"]}, contexts)
+        self.assert_same_as_json_logic({"and": [{"==": [{"%": [{"var": "a"}, 2]}, 1]}]}, contexts)
+        self.assert_same_as_json_logic({"some": [{"var": "b"}, {">": [{"var": ""}, 2]}]}, contexts)
+        self.assert_same_as_json_logic({"var": [{"cat": ["a", ""]}]}, contexts)
+        self.assert_same_as_json_logic({"missing": ["a", "c"]}, contexts)
+
+    def test_literals(self):
+        self.assert_same_as_json_logic(True, [{}])
+        self.assert_same_as_json_logic([1, {"var": "a"}], [{}, {"a": 3}])
+        self.assert_same_as_json_logic({"a": 1, "b": 2}, [{}])
+
+    def test_is_safe(self):
+        self.assertTrue(is_safe({"==": [{"var": "mbox.name"}, "a"]}))
+        self.assertTrue(is_safe({"and": [{"!": {"var": "a"}}, {"!==": [{"var": "b"}, 1]}]}))
+        self.assertTrue(is_safe({"<=": [0, {"var": "allocation"}, 50]}))
+        self.assertTrue(is_safe({"in": ["b", {"var": "a"}]}))
+        self.assertTrue(is_safe({"in": [{"var": "a"}, ["abc", 1]]}))
+        self.assertFalse(is_safe({"<": [{"var": "a"}, 2]}))
+        self.assertFalse(is_safe({"in": [{"var": "a"}, {"var": "b"}]}))
+        self.assertFalse(is_safe({"==": [{"var": [{"cat": ["a", ""]}]}, 1]}))
+        self.assertFalse(is_safe({"if": [{"var": "a"}, "yes", "no"]}))
+
+    def test_reordering_keeps_truthiness_and_errors(self):
+        condition = {"or": [
+            {"and": [{"var": "a"}, {"<": [{"var": "b"}, 2]}, {"==": [{"var": "c"}, "x"]}, {"!": {"var": "d"}}]},
+            {"==": [{"var": "c"}, "y"]},
+            {"<=": [10, {"var": "allocation"}, 20]}
+        ]}
+        predicate = compile_condition(condition)
+        rand = random.Random(7)
+        values = [None, 0, 1, 3, "x", "y", "abc", [1], True]
+        for _ in range(REORDER_CALLS * 3):
+            context = {key: rand.choice(values) for key in ["a", "b", "c", "d"]}
+            context["allocation"] = rand.uniform(0, 100)
+            self.assertEqual(evaluate_truthiness(predicate, context),
+                             evaluate_truthiness(lambda data: jsonLogic(condition, data), context))
+
+    def test_reordering_runs_selective_operands_first(self):
+        counter = []
+        always = counting_operand(lambda data: True, counter)
+        rarely = counting_operand(lambda data: data.get("x") == 0, counter)
+        junction = AdaptiveJunction("and", [always, always, rarely], [True, True, True])
+        contexts = [{"x": value % 10} for value in range(REORDER_CALLS)]
+
+        for context in contexts:
+            junction(context, None)
+        self.assertEqual(junction.ordered_funcs[0], rarely)
+
+        del counter[:]
+        for context in contexts:
+            self.assertEqual(junction(context, None), context.get("x") == 0)
+        self.assertLess(len(counter), 2 * len(contexts))
+
+    def test_reordering_keeps_unsafe_operands_in_place(self):
+        counter = []
+        unsafe = counting_operand(lambda data: True, counter)
+        rarely = counting_operand(lambda data: False, counter)
+        often = counting_operand(lambda data: True, counter)
+        junction = AdaptiveJunction("and", [often, unsafe, often, rarely], [True, False, True, True])
+        for _ in range(REORDER_CALLS):
+            junction({}, None)
+        self.assertEqual(junction.ordered_funcs, (often, unsafe, rarely, often))
+
+        junction = AdaptiveJunction("or", [rarely, often, rarely], [True, True, True])
+        for _ in range(REORDER_CALLS):
+            self.assertTrue(junction({}, None))
+        self.assertEqual(junction.ordered_funcs[0], often)
+
+    def test_concurrent_evaluations_keep_statistics(self):
+        always = counting_operand(lambda data: True, [])
+        junction = AdaptiveJunction("and", [always, always], [True, True])
+        thread_count = 8
+        calls_per_thread = SAMPLE_INTERVAL * (REORDER_INTERVAL - 1) // thread_count
+
+        def evaluate():
+            for _ in range(calls_per_thread):
+                junction({}, None)
+
+        threads = [threading.Thread(target=evaluate) for _ in range(thread_count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        expected_samples = thread_count * calls_per_thread // SAMPLE_INTERVAL
+        self.assertEqual(junction.samples, expected_samples)
+        self.assertEqual(junction.passes, [expected_samples, expected_samples])
+
+    def test_is_request_level(self):
+        self.assertTrue(is_request_level({"==": [{"var": "user.browserType"}, "chrome"]}))
+        self.assertTrue(is_request_level({"in": ["b", {"var": ["mbox.a", "x"]}]}))
+        self.assertFalse(is_request_level({"<": [{"var": "allocation"}, 50]}))
+        self.assertFalse(is_request_level({"==": [{"var": ""}, 1]}))
+        self.assertFalse(is_request_level({"var": [{"cat": ["a", ""]}]}))
+        self.assertFalse(is_request_level({"missing": ["allocation"]}))
+
+    def test_get_var_paths(self):
+        condition = {"and": [{"==": [{"var": "user.browserType"}, "chrome"]},
+                             {"in": [{"var": ["mbox.a", {"var": "page.url"}]}, ["x"]]},
+                             {"<": [{"var": "allocation"}, 50]}]}
+        self.assertEqual(get_var_paths(condition), {"user.browserType", "mbox.a", "page.url", "allocation"})
+        self.assertEqual(get_var_paths(True), set())
+        self.assertIsNone(get_var_paths({"==": [{"var": ""}, 1]}))
+        self.assertIsNone(get_var_paths({"var": [{"cat": ["a", ""]}]}))
+        self.assertIsNone(get_var_paths({"missing_some": [1, ["a"]]}))
+
+    def test_condition_compiler_shares_sub_expressions(self):
+        audience = {"==": [{"var": "user.browserType"}, "chrome"]}
+        conditions = [{"and": [audience, {"<": [{"var": "allocation"}, 50]}]},
+                      {"and": [{">=": [{"var": "allocation"}, 50]}, audience]}]
+        compiler = ConditionCompiler(conditions)
+        first, second = [compiler.compile(condition) for condition in conditions]
+
+        reads = []
+
+        class CountingDict(dict):
+            """Counts reads of the user context"""
+            def __getitem__(self, key):
+                reads.append(key)
+                return dict.__getitem__(self, key)
+
+        memo = {}
+        self.assertTrue(first(CountingDict(user={"browserType": "chrome"}, allocation=10), memo))
+        self.assertFalse(second(CountingDict(user={"browserType": "chrome"}, allocation=10), memo))
+        self.assertTrue(second(CountingDict(user={"browserType": "chrome"}, allocation=60), memo))
+        self.assertEqual(reads.count("user"), 1)
+
+    def test_condition_compiler_matches_json_logic(self):
+        for artifact_file in get_test_artifacts():
+            artifact = read_json_file(TEST_ARTIFACTS_FOLDER, artifact_file)
+            conditions = [rule.get("condition") for rule in get_artifact_rules(artifact)]
+            compiler = ConditionCompiler(conditions)
+            predicates = [compiler.compile(condition) for condition in conditions]
+
+            for contexts in [create_contexts(condition) for condition in conditions]:
+                for context in contexts:
+                    memo = {}
+                    for allocation, (condition, predicate) in enumerate(zip(conditions, predicates)):
+                        rule_context = dict(context, allocation=allocation * 7 % 100)
+                        self.assertEqual(evaluate_truthiness(partial(predicate, memo=memo), rule_context),
+                                         evaluate_truthiness(partial(jsonLogic, condition), rule_context))
@@ -0,0 +1,68 @@
+# Copyright 2021 Adobe. All rights reserved.
+# This file is licensed to you under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License. You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software distributed under
+# the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR REPRESENTATIONS
+# OF ANY KIND, either express or implied. See the License for the specific language
+# governing permissions and limitations under the License.
+"""Test cases for target_decisioning_engine.rule_evaluator module"""
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+import unittest
+from delivery_api_client import Address
+from delivery_api_client import ChannelType
+from delivery_api_client import Context
+from delivery_api_client import DeliveryRequest
+from delivery_api_client import MboxRequest
+from delivery_api_client import VisitorId
+from target_decisioning_engine.compiled_artifact import CompiledArtifact
+from target_decisioning_engine.context_provider import create_decisioning_context
+from target_decisioning_engine.context_provider import create_page_context
+from target_decisioning_engine.enums import RequestType
+from target_decisioning_engine.rule_evaluator import RuleEvaluator
+from target_decisioning_engine.tests.helpers import TEST_ARTIFACTS_FOLDER
+from target_decisioning_engine.trace_provider import NULL_REQUEST_TRACER
+from target_tools.tests.helpers import read_json_file
+from target_tools.utils import to_dict
+
+MBOX_REQUEST = MboxRequest(name="mbox-magician", index=1, parameters={"Foo.Bar": "Baz"},
+                           address=Address(url="http://Local-Target-Test:8080/Page?A=1"))
+
+
+class TestRuleEvaluator(unittest.TestCase):
+
+    def setUp(self):
+        compiled_artifact = CompiledArtifact(read_json_file(TEST_ARTIFACTS_FOLDER, "TEST_ARTIFACT_AB_SIMPLE.json"))
+        self.rule_set = compiled_artifact.rule_set
+        self.rules = compiled_artifact.get_mbox_rules(MBOX_REQUEST.name, None)
+        self.context = create_decisioning_context(DeliveryRequest(context=Context(channel=ChannelType.WEB)))
+        self.rule_evaluator = RuleEvaluator("someClientId", VisitorId(tnt_id="338e3c1e51f7416a8e1ccba4f81acea0.28_0"),
+                                            self.rule_set)
+
+    def process_rules(self, request_detail_layer=None):
+        return [to_dict(self.rule_evaluator.process_rule(rule, self.context, RequestType.MBOX.value, MBOX_REQUEST, [],
+                                                         NULL_REQUEST_TRACER, {}, request_detail_layer))
+                for rule in self.rules]
+
+    def test_create_request_detail_layer(self):
+        layer = RuleEvaluator.create_request_detail_layer(self.context, MBOX_REQUEST)
+        self.assertEqual(layer.get("page"), create_page_context(MBOX_REQUEST.address))
+        self.assertEqual(layer.get("referring"), layer.get("page"))
+        self.assertEqual(layer.get("mbox"), {"Foo": {"Bar": "Baz", "Bar_lc": "baz"}})
+
+        layer_without_address = RuleEvaluator.create_request_detail_layer(self.context, MboxRequest(name="mbox"))
+        self.assertEqual(layer_without_address.get("page"), self.context.get("page"))
+
+    def test_process_rule_with_request_detail_layer(self):
+        self.assertGreater(len(self.rules), 1)
+        expected = self.process_rules()
+        layer = RuleEvaluator.create_request_detail_layer(self.context, MBOX_REQUEST)
+
+        with patch("target_decisioning_engine.rule_evaluator.create_mbox_context") as mbox_context_mock:
+            self.assertEqual(self.process_rules(layer), expected)
+            mbox_context_mock.assert_not_called()
+        self.assertNotIn("allocation", layer)
@@ -0,0 +1,52 @@
+# Copyright 2021 Adobe. All rights reserved.
+# This file is licensed to you under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License. You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software distributed under
+# the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR REPRESENTATIONS
+# OF ANY KIND, either express or implied. See the License for the specific language
+# governing permissions and limitations under the License.
+"""Test cases for target_decisioning_engine.time_conditions module"""
+import unittest
+from target_decisioning_engine.time_conditions import analyze_time_condition
+from target_decisioning_engine.time_conditions import split_time_condition
+
+TIMESTAMP_RANGE = {"<=": [1613034000000, {"var": "current_timestamp"}, 1613239200000]}
+DAY_AND_TIME = {"and": [{"or": [{"==": [{"var": "current_day"}, "5"]}]},
+                        {"<=": ["0000", {"var": "current_time"}, "2359"]}]}
+BROWSER = {"==": ["chrome", {"var": "user.browserType"}]}
+
+
+class TestTimeConditions(unittest.TestCase):
+
+    def test_analyze_time_condition(self):
+        self.assertEqual(analyze_time_condition(TIMESTAMP_RANGE), {
+            "vars": {"current_timestamp"},
+            "boundaries": {1613034000000, 1613034000001, 1613239200000, 1613239200001}
+        })
+        self.assertEqual(analyze_time_condition(DAY_AND_TIME), {
+            "vars": {"current_day", "current_time"},
+            "boundaries": set()
+        })
+        self.assertEqual(analyze_time_condition({"in": [{"var": "current_timestamp"}, [10.5, 20]]}).get("boundaries"),
+                         {11, 20, 21})
+
+    def test_analyze_time_condition_not_time_only(self):
+        self.assertIsNone(analyze_time_condition(True))
+        self.assertIsNone(analyze_time_condition(BROWSER))
+        self.assertIsNone(analyze_time_condition({"and": [TIMESTAMP_RANGE, BROWSER]}))
+        self.assertIsNone(analyze_time_condition({"<": [{"var": "current_timestamp"}, "1613034000000"]}))
+        self.assertIsNone(analyze_time_condition({"<": [{"var": "current_timestamp"}, {"var": "current_time"}]}))
+        self.assertIsNone(analyze_time_condition({"<": [{"var": "current_timestamp"}, {"+": [1, 2]}]}))
+        self.assertIsNone(analyze_time_condition({"var": "current_timestamp"}))
+
+    def test_split_time_condition(self):
+        self.assertEqual(split_time_condition(TIMESTAMP_RANGE), (TIMESTAMP_RANGE, True))
+        self.assertEqual(split_time_condition(DAY_AND_TIME), (DAY_AND_TIME, True))
+        self.assertEqual(split_time_condition({"and": [BROWSER, TIMESTAMP_RANGE, DAY_AND_TIME]}),
+                         ({"and": [TIMESTAMP_RANGE, DAY_AND_TIME]}, {"and": [BROWSER]}))
+        self.assertEqual(split_time_condition(BROWSER), (None, BROWSER))
+        self.assertEqual(split_time_condition({"or": [BROWSER, TIMESTAMP_RANGE]}),
+                         (None, {"or": [BROWSER, TIMESTAMP_RANGE]}))
+        self.assertEqual(split_time_condition(True), (None, True))
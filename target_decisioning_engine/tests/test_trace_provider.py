@@ -0,0 +1,157 @@
+# Copyright 2021 Adobe. All rights reserved.
+# This file is licensed to you under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License. You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software distributed under
+# the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR REPRESENTATIONS
+# OF ANY KIND, either express or implied. See the License for the specific language
+# governing permissions and limitations under the License.
+"""Test cases for target_decisioning_engine.trace_provider module"""
+try:
+    from unittest.mock import Mock
+except ImportError:
+    from mock import Mock
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from delivery_api_client import ChannelType
+from delivery_api_client import MboxRequest
+from target_decisioning_engine.trace_provider import create_request_tracer
+from target_decisioning_engine.trace_provider import get_context_fingerprint
+from target_decisioning_engine.trace_provider import NULL_REQUEST_TRACER
+from target_decisioning_engine.trace_provider import RequestTracer
+from target_decisioning_engine.trace_provider import StreamingRequestTracer
+from target_decisioning_engine.trace_provider import TraceProvider
+from target_decisioning_engine.trace_sinks import JsonLinesTraceSink
+from target_decisioning_engine.trace_sinks import RingBufferTraceSink
+from target_decisioning_engine.types.decisioning_config import DecisioningConfig
+from target_tools.tests.delivery_request_setup import create_delivery_request
+
+RULE = {
+    "meta": {
+        "activity.id": 1,
+        "activity.type": "ab",
+        "experience.id": 0,
+        "audience.ids": [2]
+    },
+    "condition": {"==": [1, 1]},
+    "ruleKey": "123"
+}
+
+
+def create_trace_provider(trace=None, trace_sink=None, trace_sample_rate=None):
+    """Creates trace provider for a request, with tracing if trace is given"""
+    request = create_delivery_request({
+        "id": {"tntId": "abc.28_0"},
+        "requestId": "request-1",
+        "context": {"channel": ChannelType.WEB},
+        "trace": trace
+    })
+    config = DecisioningConfig("someclient", "someorg", trace_sink=trace_sink, trace_sample_rate=trace_sample_rate)
+    return TraceProvider(config, Mock(request=request, session_id="123"), {"artifact": True})
+
+
+class TestTraceProvider(unittest.TestCase):
+
+    def test_create_request_tracer_without_trace(self):
+        tracer = create_request_tracer(create_trace_provider(), {})
+        self.assertIs(tracer, NULL_REQUEST_TRACER)
+
+        tracer.trace_request("execute", "mbox", Mock(), {})
+        tracer.trace_rule_evaluated(RULE, {"allocation": 1}, True)
+        tracer.trace_notification(RULE)(Mock())
+        self.assertIsNone(tracer.get_trace_result())
+        self.assertEqual(tracer.to_dict(), {"campaigns": [], "evaluatedCampaignTargets": [], "request": {}})
+
+    def test_create_request_tracer_with_trace(self):
+        tracer = create_request_tracer(create_trace_provider({"authorizationToken": "token"}), {})
+        self.assertIsInstance(tracer, RequestTracer)
+        self.assertIsNot(tracer, create_request_tracer(create_trace_provider({"authorizationToken": "token"}), {}))
+
+        tracer.trace_rule_evaluated(RULE, {"allocation": 1}, True)
+        result = tracer.to_dict()
+        self.assertEqual(result.get("campaigns")[0].get("id"), 1)
+        self.assertEqual(result.get("evaluatedCampaignTargets")[0].get("matchedSegmentIds"), [2])
+
+    def test_create_request_tracer_with_trace_sink(self):
+        trace_sink = RingBufferTraceSink()
+        tracer = create_request_tracer(create_trace_provider(trace_sink=trace_sink), {}, "execute")
+        self.assertIsInstance(tracer, StreamingRequestTracer)
+        self.assertTrue(tracer.timed)
+
+        context = {"current_timestamp": 1, "user": {"browserType": "chrome"}}
+        tracer.trace_request("execute", "mbox", MboxRequest(name="mbox-a"), context)
+        tracer.trace_rule_evaluated(RULE, {"allocation": 1}, True, 0.5)
+        self.assertIsNone(tracer.get_trace_result())
+        self.assertEqual(trace_sink.get_records(), [])
+
+        tracer.flush()
+        tracer.flush()
+        self.assertEqual(trace_sink.get_records(), [{
+            "requestId": "request-1",
+            "mode": "execute",
+            "requestType": "mbox",
+            "name": "mbox-a",
+            "ruleKey": "123",
+            "campaignId": 1,
+            "matched": True,
+            "evaluationTime": 0.5,
+            "contextFingerprint": get_context_fingerprint(context, MboxRequest(name="mbox-a"))
+        }])
+
+    def test_trace_sample_rate(self):
+        trace_sink = RingBufferTraceSink()
+        self.assertIs(create_request_tracer(create_trace_provider(trace_sink=trace_sink, trace_sample_rate=0), {}),
+                      NULL_REQUEST_TRACER)
+        self.assertIsInstance(create_request_tracer(create_trace_provider(trace_sink=trace_sink,
+                                                                          trace_sample_rate=1), {}),
+                              StreamingRequestTracer)
+        self.assertIsInstance(create_request_tracer(create_trace_provider({"authorizationToken": "token"},
+                                                                          trace_sink=trace_sink), {}),
+                              RequestTracer)
+
+    def test_trace_sink_errors_are_not_raised(self):
+        trace_sink = Mock()
+        trace_sink.write.side_effect = IOError("disk full")
+        tracer = create_request_tracer(create_trace_provider(trace_sink=trace_sink), {}, "prefetch")
+        tracer.trace_request("prefetch", "view", None, {})
+        tracer.trace_rule_evaluated(RULE, {}, False, 0.1)
+        tracer.flush()
+        self.assertEqual(trace_sink.write.call_count, 1)
+
+    def test_get_context_fingerprint(self):
+        mbox_request = MboxRequest(name="mbox-a", parameters={"foo": "bar"})
+        fingerprint = get_context_fingerprint({"current_timestamp": 1, "user": {"browserType": "chrome"}},
+                                              mbox_request)
+        self.assertEqual(len(fingerprint), 16)
+        self.assertEqual(fingerprint, get_context_fingerprint({"current_timestamp": 2,
+                                                               "user": {"browserType": "chrome"}}, mbox_request))
+        self.assertNotEqual(fingerprint, get_context_fingerprint({"current_timestamp": 1,
+                                                                  "user": {"browserType": "firefox"}}, mbox_request))
+        self.assertNotEqual(fingerprint, get_context_fingerprint({"current_timestamp": 1,
+                                                                  "user": {"browserType": "chrome"}}, None))
+
+
+class TestTraceSinks(unittest.TestCase):
+
+    def test_ring_buffer_trace_sink(self):
+        trace_sink = RingBufferTraceSink(max_size=3)
+        trace_sink.write([{"id": 1}, {"id": 2}])
+        trace_sink.write([{"id": 3}, {"id": 4}])
+        self.assertEqual(trace_sink.get_records(), [{"id": 2}, {"id": 3}, {"id": 4}])
+
+    def test_json_lines_trace_sink(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "trace.jsonl")
+            trace_sink = JsonLinesTraceSink(path)
+            trace_sink.write([{"id": 1}, {"id": 2}])
+            trace_sink.write([{"id": 3}])
+            with io.open(path, encoding="utf-8") as trace_file:
+                self.assertEqual([json.loads(line) for line in trace_file], [{"id": 1}, {"id": 2}, {"id": 3}])
+        finally:
+            shutil.rmtree(directory)
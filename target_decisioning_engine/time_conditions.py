@@ -0,0 +1,132 @@
+# Copyright 2021 Adobe. All rights reserved.
+# This file is licensed to you under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License. You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software distributed under
+# the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR REPRESENTATIONS
+# OF ANY KIND, either express or implied. See the License for the specific language
+# governing permissions and limitations under the License.
+"""Splits rule conditions into a time-only part and a request-dependent part"""
+import math
+from six import integer_types
+from json_logic import is_logic
+from target_decisioning_engine.rule_compiler import get_operator
+from target_decisioning_engine.rule_compiler import get_values
+from target_decisioning_engine.rule_compiler import is_array
+
+CURRENT_TIMESTAMP = "current_timestamp"
+CURRENT_TIME = "current_time"
+CURRENT_DAY = "current_day"
+TIMING_VARS = [CURRENT_TIMESTAMP, CURRENT_TIME, CURRENT_DAY]
+CLOCK_VARS = [CURRENT_TIME, CURRENT_DAY]
+TIME_COMPARISON_OPERATORS = ["==", "!=", "===", "!==", ">", ">=", "<", "<=", "in"]
+TIME_LOGICAL_OPERATORS = ["and", "or", "!", "!!"]
+
+
+def _is_number(value):
+    """Checks if value is an int or float literal"""
+    return isinstance(value, integer_types + (float,)) and not isinstance(value, bool)
+
+
+def _is_literal(value):
+    """Checks if value is a json-logic literal"""
+    return not is_array(value) and not is_logic(value)
+
+
+def _get_timing_var(logic):
+    """
+    :param logic: (any) json-logic rule
+    :return: (str) Returns timing var name if logic is a var lookup of a timing value, None otherwise
+    """
+    if not is_logic(logic) or get_operator(logic) != "var":
+        return None
+    values = get_values(logic, "var")
+    var_name = values[0] if values else None
+    if var_name not in TIMING_VARS or (len(values) > 1 and not _is_literal(values[1])):
+        return None
+    return var_name
+
+
+def _analyze_comparison(values, allow_arrays, analysis):
+    """
+    :param values: (list) comparison operands
+    :param allow_arrays: (bool) whether arrays of literals are allowed as operands, i.e. for "in"
+    :param analysis: (dict) accumulated analysis, see _analyze
+    :return: (bool) Returns True if comparison only depends on timing values
+    """
+    var_names = set()
+    literals = []
+    for value in values:
+        var_name = _get_timing_var(value)
+        if var_name:
+            var_names.add(var_name)
+        elif _is_literal(value):
+            literals.append(value)
+        elif allow_arrays and is_array(value) and all(_is_literal(item) for item in value):
+            literals.extend(value)
+        else:
+            return False
+
+    if CURRENT_TIMESTAMP in var_names:
+        # a timestamp comparison can only change value at its numeric literals
+        if len(var_names) > 1 or not all(_is_number(literal) for literal in literals):
+            return False
+        for literal in literals:
+            analysis["boundaries"].update([int(math.ceil(literal)), int(math.floor(literal)) + 1])
+
+    analysis["vars"].update(var_names)
+    return True
+
+
+def _analyze(logic, analysis):
+    """
+    :param logic: (any) json-logic rule
+    :param analysis: (dict) accumulates timing var names under "vars" and timestamp boundaries under "boundaries"
+    :return: (bool) Returns True if logic only depends on timing values
+    """
+    if not is_logic(logic):
+        return not is_array(logic)
+
+    operator = get_operator(logic)
+    values = get_values(logic, operator)
+
+    if operator in TIME_LOGICAL_OPERATORS:
+        return all(_analyze(value, analysis) for value in values)
+
+    if operator in TIME_COMPARISON_OPERATORS:
+        return _analyze_comparison(values, operator == "in", analysis)
+
+    return False
+
+
+def analyze_time_condition(condition):
+    """
+    :param condition: (dict) json-logic rule condition
+    :return: (dict) Returns timing var names and timestamp boundaries of condition, None if condition depends on
+        anything other than timing values
+    """
+    analysis = {"vars": set(), "boundaries": set()}
+    if not _analyze(condition, analysis) or not analysis.get("vars"):
+        return None
+    return analysis
+
+
+def split_time_condition(condition):
+    """Splits a condition into a time-only part, which only depends on current_timestamp, current_time and
+    current_day, and a request-dependent part.  The condition is satisfied when both parts are
+    :param condition: (dict) json-logic rule condition
+    :return: (tuple) Returns (time condition, request condition).  Time condition is None if condition has no
+        time-only part
+    """
+    if analyze_time_condition(condition):
+        return condition, True
+
+    if is_logic(condition) and get_operator(condition) == "and":
+        values = get_values(condition, "and")
+        time_parts = [value for value in values if analyze_time_condition(value)]
+        if time_parts:
+            request_parts = [value for value in values if not analyze_time_condition(value)]
+            return {"and": time_parts}, {"and": request_parts}
+
+    return None, condition
@@ -7,8 +7,11 @@
 # the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR REPRESENTATIONS
 # OF ANY KIND, either express or implied. See the License for the specific language
 # governing permissions and limitations under the License.
-"""TraceProvider, RequestTracer, and ArtifactTracer classes"""
+"""TraceProvider, RequestTracer, NullRequestTracer, StreamingRequestTracer, and ArtifactTracer classes"""
 import datetime
+import hashlib
+import json
+import random
 from copy import deepcopy
 
 from target_decisioning_engine.messages import MESSAGES
@@ -17,10 +20,19 @@ from target_decisioning_engine.constants import ACTIVITY_ID
 from target_decisioning_engine.constants import OFFER_ID
 from target_decisioning_engine.constants import EXPERIENCE_ID
 from target_decisioning_engine.constants import AUDIENCE_IDS
+from target_decisioning_engine.time_conditions import TIMING_VARS
 from target_decisioning_engine.types.decisioning_artifact import DecisioningArtifactMeta
+from target_decisioning_engine.utils import get_rule_key
+from target_tools.logger import get_logger
 from target_tools.utils import is_string
+from target_tools.utils import noop
 from target_tools.utils import to_dict
 
+DEFAULT_TRACE_SAMPLE_RATE = 1.0
+CONTEXT_FINGERPRINT_LENGTH = 16
+
+logger = get_logger()
+
 
 def by_order(item):
     """
@@ -30,6 +42,31 @@ def by_order(item):
     return item.get("order")
 
 
+def is_trace_sampled(trace_sink, trace_sample_rate=None):
+    """
+    :param trace_sink: (object) trace sink, see target_decisioning_engine.trace_sinks
+    :param trace_sample_rate: (float) fraction of requests to trace, between 0 and 1, default: 1
+    :return: (bool) Returns True if the request should be traced to trace_sink
+    """
+    if trace_sink is None:
+        return False
+    sample_rate = DEFAULT_TRACE_SAMPLE_RATE if trace_sample_rate is None else trace_sample_rate
+    return random.random() < sample_rate
+
+
+def get_context_fingerprint(context, request_detail):
+    """Timing values are left out, so that requests with the same visitor and request inputs share a fingerprint
+    :param context: (target_decisioning_engine.types.decisioning_context.DecisioningContext) decisioning context
+    :param request_detail: (delivery_api_client.Model.request_details.RequestDetails|
+        delivery_api_client.Model.mbox_request.MboxRequest) request details
+    :return: (str) Returns a short hash of the inputs that rules are evaluated against
+    """
+    fingerprint_context = {key: value for key, value in context.items() if key not in TIMING_VARS}
+    fingerprint_context["request"] = to_dict(request_detail) if request_detail else {}
+    serialized = json.dumps(fingerprint_context, sort_keys=True, default=str)
+    return hashlib.sha1(serialized.encode("utf-8")).hexdigest()[:CONTEXT_FINGERPRINT_LENGTH]
+
+
 class TraceProvider:
     """TraceProvider"""
 
@@ -46,6 +83,9 @@ class TraceProvider:
         self.session_id = target_options.session_id
         self.request = target_options.request
         self.show_traces = self.request.trace is not None
+        self.trace_sink = config.trace_sink
+        # requests that ask for a trace get it in the response, others are sampled to the trace sink
+        self.stream_traces = not self.show_traces and is_trace_sampled(config.trace_sink, config.trace_sample_rate)
         self.profile = None
 
         tnt_id_parts = self.request.id.tnt_id.split(".") if self.request.id and is_string(self.request.id.tnt_id) \
@@ -86,6 +126,9 @@ class TraceProvider:
 class RequestTracer:
     """RequestTracer"""
 
+    # whether rule evaluation time is measured for trace_rule_evaluated
+    timed = False
+
     def __init__(self, trace_provider, artifact):
         """
         :param trace_provider: (target_decisioning_engine.trace_provider.TraceProvider) trace provider
@@ -162,11 +205,12 @@ class RequestTracer:
         rule_conditions_key = "matchedRuleConditions" if rule_satisfied else "unmatchedRuleConditions"
         self.evaluated_campaign_targets[activity_id][rule_conditions_key].append(rule.get("condition"))
 
-    def trace_rule_evaluated(self, rule, rule_context, rule_satisfied):
+    def trace_rule_evaluated(self, rule, rule_context, rule_satisfied, evaluation_time=None):
         """
         :param rule: (target_decisioning_engine.types.decisioning_artifact.Rule) decisioning rule
         :param rule_context: (target_decisioning_engine.types.decisioning_context.DecisioningContext) context
         :param rule_satisfied: (bool) is rule satisfied
+        :param evaluation_time: (float) rule condition evaluation time in milliseconds, only given if timed
         """
         self._add_campaign(rule, rule_satisfied)
         self._add_evaluated_campaign_target(rule, rule_context, rule_satisfied)
@@ -216,6 +260,129 @@ class RequestTracer:
         """
         return self.trace_provider.wrap(self.to_dict())
 
+    def flush(self):
+        """Does nothing, trace data is added to responses by get_trace_result"""
+
+
+class NullRequestTracer:
+    """RequestTracer used when tracing is not requested, it records nothing"""
+
+    timed = False
+
+    def trace_request(self, mode, request_type, mbox_request, context):
+        """Does nothing, see RequestTracer.trace_request"""
+
+    def trace_rule_evaluated(self, rule, rule_context, rule_satisfied, evaluation_time=None):
+        """Does nothing, see RequestTracer.trace_rule_evaluated"""
+
+    def trace_notification(self, rule):
+        """
+        :param rule: (target_decisioning_engine.types.decisioning_artifact.Rule) decisioning rule
+        :return: (callable) Returns function that ignores the notification
+        """
+        return noop
+
+    def to_dict(self):
+        """
+        :return: (dict) returns empty request trace data
+        """
+        return {
+            "campaigns": [],
+            "evaluatedCampaignTargets": [],
+            "request": {}
+        }
+
+    def get_trace_result(self):
+        """
+        :return: (None) There is no trace result when tracing is not requested
+        """
+        return None
+
+    def flush(self):
+        """Does nothing, there is no trace data"""
+
+
+NULL_REQUEST_TRACER = NullRequestTracer()
+
+
+class StreamingRequestTracer(NullRequestTracer):
+    """Request tracer for sampled requests.  Writes a compact record per evaluated rule to the trace sink when
+    flushed, responses get no trace"""
+
+    timed = True
+
+    def __init__(self, trace_provider, mode):
+        """
+        :param trace_provider: (target_decisioning_engine.trace_provider.TraceProvider) trace provider
+        :param mode: ("execute"|"prefetch") mode
+        """
+        self.trace_sink = trace_provider.trace_sink
+        self.request_id = trace_provider.request.request_id
+        self.mode = mode
+        self.request_type = None
+        self.name = None
+        self.context_fingerprint = None
+        self.records = []
+
+    def trace_request(self, mode, request_type, mbox_request, context):
+        """
+        :param mode: ("execute"|"prefetch") mode
+        :param request_type: ("mbox"|"view"|"pageLoad") request type
+        :param mbox_request: (delivery_api_client.Model.request_details.RequestDetails|
+            delivery_api_client.Model.mbox_request.MboxRequest) request details
+        :param context: (target_decisioning_engine.types.decisioning_context.DecisioningContext) decisioning context
+        """
+        self.mode = mode
+        self.request_type = request_type
+        self.name = mbox_request.name if mbox_request else None
+        self.context_fingerprint = get_context_fingerprint(context, mbox_request)
+
+    def trace_rule_evaluated(self, rule, rule_context, rule_satisfied, evaluation_time=None):
+        """
+        :param rule: (target_decisioning_engine.types.decisioning_artifact.Rule) decisioning rule
+        :param rule_context: (target_decisioning_engine.types.decisioning_context.DecisioningContext) context
+        :param rule_satisfied: (bool) is rule satisfied
+        :param evaluation_time: (float) rule condition evaluation time in milliseconds
+        """
+        self.records.append({
+            "requestId": self.request_id,
+            "mode": self.mode,
+            "requestType": self.request_type,
+            "name": self.name,
+            "ruleKey": get_rule_key(rule),
+            "campaignId": rule.get("meta", {}).get(ACTIVITY_ID),
+            "matched": bool(rule_satisfied),
+            "evaluationTime": evaluation_time,
+            "contextFingerprint": self.context_fingerprint
+        })
+
+    def flush(self):
+        """Writes trace records to the trace sink.  Sink errors are logged, they do not fail the request"""
+        records, self.records = self.records, []
+        if not records:
+            return
+        try:
+            self.trace_sink.write(records)
+        except Exception as err:
+            logger.error(MESSAGES.get("TRACE_SINK_ERROR")(str(err)))
+
+
+def create_request_tracer(trace_provider, artifact, mode=None):
+    """
+    :param trace_provider: (target_decisioning_engine.trace_provider.TraceProvider) trace provider
+    :param artifact: (target_decisioning_engine.types.decisioning_artifact.DecisioningArtifact) artifact
+    :param mode: ("execute"|"prefetch") mode
+    :return: (target_decisioning_engine.trace_provider.RequestTracer |
+        target_decisioning_engine.trace_provider.StreamingRequestTracer |
+        target_decisioning_engine.trace_provider.NullRequestTracer) Returns a request tracer, a streaming tracer
+        if the request is sampled to the trace sink, or the shared null tracer if tracing is off
+    """
+    if trace_provider.show_traces:
+        return RequestTracer(trace_provider, artifact)
+    if trace_provider.stream_traces:
+        return StreamingRequestTracer(trace_provider, mode)
+    return NULL_REQUEST_TRACER
+
 
 class ArtifactTracer:
     """ArtifactTracer"""
@@ -0,0 +1,63 @@
+# Copyright 2021 Adobe. All rights reserved.
+# This file is licensed to you under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License. You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software distributed under
+# the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR REPRESENTATIONS
+# OF ANY KIND, either express or implied. See the License for the specific language
+# governing permissions and limitations under the License.
+"""Sinks for sampled decision trace records, see DecisioningConfig.trace_sink.  A sink is any object with a
+write(records) method, records are the compact trace records of a single request"""
+import io
+import json
+import threading
+from collections import deque
+from six import text_type
+
+DEFAULT_RING_BUFFER_SIZE = 1000
+
+
+class RingBufferTraceSink:
+    """Keeps the most recent trace records in memory"""
+
+    def __init__(self, max_size=DEFAULT_RING_BUFFER_SIZE):
+        """
+        :param max_size: (int) maximum number of records kept, oldest records are dropped first
+        """
+        self.records = deque(maxlen=max_size)
+        self.lock = threading.Lock()
+
+    def write(self, records):
+        """
+        :param records: (list<dict>) trace records
+        """
+        with self.lock:
+            self.records.extend(records)
+
+    def get_records(self):
+        """
+        :return: (list<dict>) Returns kept trace records, oldest first
+        """
+        with self.lock:
+            return list(self.records)
+
+
+class JsonLinesTraceSink:
+    """Appends trace records to a file, one JSON object per line"""
+
+    def __init__(self, path):
+        """
+        :param path: (str) file path
+        """
+        self.path = path
+        self.lock = threading.Lock()
+
+    def write(self, records):
+        """
+        :param records: (list<dict>) trace records
+        """
+        lines = [text_type(json.dumps(record, sort_keys=True, default=str)) + u"\n" for record in records]
+        with self.lock:
+            with io.open(self.path, "a", encoding="utf-8") as trace_file:
+                trace_file.writelines(lines)
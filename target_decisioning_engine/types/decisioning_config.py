@@ -8,6 +8,7 @@
 # OF ANY KIND, either express or implied. See the License for the specific language
 # governing permissions and limitations under the License.
 """DecisioningConfig model"""
+# pylint: disable=too-many-locals
 
 
 class DecisioningConfig:
@@ -16,7 +17,8 @@ class DecisioningConfig:
     def __init__(self, client, organization_id, polling_interval=None,
                  artifact_location=None, artifact_payload=None, environment=None,
                  cdn_environment=None, cdn_base_path=None, send_notification_func=None,
-                 telemetry_enabled=True, event_emitter=None, maximum_wait_ready=None, property_token=None):
+                 telemetry_enabled=True, event_emitter=None, maximum_wait_ready=None, property_token=None,
+                 cache_sizes=None, trace_sink=None, trace_sample_rate=None):
         """
         :param client: (str) Target Client Id
         :param organization_id: (str) Target Organization Id
@@ -32,6 +34,14 @@ class DecisioningConfig:
         :param maximum_wait_ready: (int) The maximum amount of time (in seconds) to wait for decisioning engine to
             become ready.  Default is to wait indefinitely.
         :param property_token: (str) A property token used to limit the scope of evaluated target activities
+        :param cache_sizes: (dict<str, int>) Maximum number of entries for in-memory caches, keyed by cache name -
+            "allocation", "allocation_prefix", "geo_lookup", "geo_lookup_failure", "hash_unencoded_chars",
+            "macro_template", "page_context", "url_domain" or "user_agent".  Caches are shared by all decisioning
+            engines in the process.
+        :param trace_sink: (object) Sink for compact decision trace records of sampled requests, an object with a
+            write(records) method, e.g. target_decisioning_engine.trace_sinks.RingBufferTraceSink.  Requests that
+            ask for a trace still get it in the response instead.
+        :param trace_sample_rate: (float) Fraction of requests traced to trace_sink, between 0 and 1, default: 1
         """
         self.client = client
         self.organization_id = organization_id
@@ -47,3 +57,6 @@ class DecisioningConfig:
             lambda event_name, payload: None
         self.maximum_wait_ready = maximum_wait_ready
         self.property_token = property_token
+        self.cache_sizes = cache_sizes
+        self.trace_sink = trace_sink
+        self.trace_sample_rate = trace_sample_rate
@@ -8,6 +8,7 @@
 # OF ANY KIND, either express or implied. See the License for the specific language
 # governing permissions and limitations under the License.
 """DecisioningContext model"""
+from copy import deepcopy
 from target_tools.types.limited_key_dict import LimitedKeyDict
 
 
@@ -76,6 +77,28 @@ class PageContext(LimitedKeyDict):
         return PageContext.__key_map.keys()
 
 
+class FrozenPageContext(PageContext):
+    """PageContext that can not be modified, so that one instance can be cached and shared by many requests.
+    Copies are regular, modifiable PageContexts"""
+
+    def __init__(self, **kwargs):
+        """kwargs should only consist of keys inside PageContext.__key_map"""
+        dict.update(self, {key: value for key, value in kwargs.items() if key in self._get_valid_keys()})
+
+    def _immutable(self, *args, **kwargs):
+        """Raises on any attempt to modify the page context"""
+        raise TypeError("FrozenPageContext can not be modified")
+
+    __setitem__ = __delitem__ = __ior__ = _immutable
+    update = pop = popitem = clear = setdefault = _immutable
+
+    def __copy__(self):
+        return PageContext(**self)
+
+    def __deepcopy__(self, memo):
+        return PageContext(**deepcopy(dict(self), memo))
+
+
 class TimingContext(LimitedKeyDict):
     """TimingContext"""
 
@@ -15,6 +15,8 @@ from tld import get_tld
 from target_decisioning_engine.constants import CDN_BASE
 from target_decisioning_engine.constants import ARTIFACT_FILENAME
 from target_decisioning_engine.constants import SUPPORTED_ARTIFACT_MAJOR_VERSION
+from target_decisioning_engine.constants import DEFAULT_URL_DOMAIN_CACHE_SIZE
+from target_decisioning_engine.constants import URL_DOMAIN_CACHE
 from target_decisioning_engine.messages import MESSAGES
 from target_tools.constants import POSSIBLE_ENVIRONMENTS
 from target_tools.constants import ENVIRONMENT_PROD
@@ -23,6 +25,7 @@ from target_tools.utils import get_mbox_names
 from target_tools.utils import get_view_names
 from target_tools.utils import has_requested_views
 from target_tools.utils import is_string
+from target_tools.utils import memoize
 from target_tools.utils import parse_int
 
 
@@ -42,6 +45,24 @@ def get_rule_key(rule):
     return rule.get("ruleKey")
 
 
+def _split_host(netloc):
+    """
+    :param netloc: (str) network location part of a url
+    :return: (tuple) Returns (domain, subdomain, top level domain), or None if the top level domain is unknown
+    """
+    parsed_host = get_tld("//" + netloc, as_object=True, fail_silently=True)
+    if not parsed_host:
+        return None
+
+    subdomain = parsed_host.subdomain[3:] if parsed_host.subdomain.startswith("www") else parsed_host.subdomain
+    return parsed_host.domain + "." + parsed_host.tld, subdomain, parsed_host.tld
+
+
+# public suffix list lookups are kept per host, in a bounded cache shared by the whole process
+split_host = memoize(_split_host, args_resolver=lambda args, kwargs: args[0],
+                     max_size=DEFAULT_URL_DOMAIN_CACHE_SIZE, name=URL_DOMAIN_CACHE)
+
+
 def parse_url(url):
     """parse url"""
     result = {
@@ -62,21 +83,13 @@ def parse_url(url):
     result["query"] = parsed.query
     result["fragment"] = parsed.fragment
 
-    parsed_host = get_tld(url, as_object=True, fail_silently=True)
+    host = split_host(parsed.netloc)
 
-    if not parsed_host:
+    if not host:
         result["domain"] = parsed.netloc
         return result
 
-    result["domain"] = parsed_host.domain + "." + parsed_host.tld
-
-    if parsed_host.subdomain.startswith("www"):
-        result["subdomain"] = parsed_host.subdomain[3:]
-    else:
-        result["subdomain"] = parsed_host.subdomain
-
-    result["topLevelDomain"] = parsed_host.tld
-
+    result["domain"], result["subdomain"], result["topLevelDomain"] = host
     return result
 
 
@@ -75,7 +75,10 @@ class TargetClient:
                                                        telemetry_enabled=self.config.get("telemetry_enabled"),
                                                        event_emitter=self.event_emitter,
                                                        maximum_wait_ready=self.config.get("maximum_wait_ready"),
-                                                       property_token=self.config.get("property_token"))
+                                                       property_token=self.config.get("property_token"),
+                                                       cache_sizes=self.config.get("cache_sizes"),
+                                                       trace_sink=self.config.get("trace_sink"),
+                                                       trace_sample_rate=self.config.get("trace_sample_rate"))
                 self.decisioning_engine = TargetDecisioningEngine(decisioning_config)
                 self.decisioning_engine.initialize()
                 self.event_emitter(CLIENT_READY)
@@ -133,6 +136,15 @@ class TargetClient:
         options.property_token: (str) - A property token used to limit the scope of evaluated target
             activities, optional
 
+        options.cache_sizes: (dict.<str, int>) Local Decisioning - Maximum number of entries for in-memory
+            caches, keyed by cache name, optional
+
+        options.trace_sink: (object) Local Decisioning - Sink for compact decision trace records of sampled
+            requests, an object with a write(records) method, optional
+
+        options.trace_sample_rate: (float) Local Decisioning - Fraction of requests traced to trace_sink, between
+            0 and 1, default: 1, optional
+
         options.events: (dict.<str, callable>) An object with event name keys and callback
             function values, optional
 
@@ -0,0 +1,133 @@
+# Copyright 2021 Adobe. All rights reserved.
+# This file is licensed to you under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License. You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software distributed under
+# the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR REPRESENTATIONS
+# OF ANY KIND, either express or implied. See the License for the specific language
+# governing permissions and limitations under the License.
+"""Bounded, thread-safe LRU cache"""
+import threading
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+# Named caches that can be resized via configure_caches, i.e. from DecisioningConfig.cache_sizes
+CACHE_REGISTRY = {}
+
+
+class LRUCache:
+    """Thread-safe cache with a maximum size, least-recently-used eviction and optional time-to-live"""
+
+    def __init__(self, max_size=None, ttl=None, clock=None):
+        """
+        :param max_size: (int) Maximum number of entries, unbounded if None
+        :param ttl: (int|float) Number of seconds after which an entry expires, entries never expire if None
+        :param clock: (callable) Returns current time in seconds, defaults to time.time
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock or time.time
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """Number of cached entries, including expired entries that have not been accessed since expiring"""
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        """
+        :param key: (hashable) cache key
+        :param default: (any) value returned if key is not cached or has expired
+        :return: (any) Returns cached value, and marks it as most recently used
+        """
+        with self._lock:
+            entry = self._entries.pop(key, MISSING)
+            if entry is MISSING or (entry[1] is not None and entry[1] <= self.clock()):
+                self.misses += 1
+                return default
+            self._entries[key] = entry
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value):
+        """
+        :param key: (hashable) cache key
+        :param value: (any) value to cache
+        """
+        expires_at = self.clock() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (value, expires_at)
+            self._evict()
+
+    def resize(self, max_size):
+        """
+        :param max_size: (int) new maximum number of entries, unbounded if None.  Evicts entries if needed
+        """
+        with self._lock:
+            self.max_size = max_size
+            self._evict()
+
+    def clear(self):
+        """Removes all entries and resets stats"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        """
+        :return: (dict) Returns hit, miss and eviction counters, hit rate, along with current and maximum size
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": float(self.hits) / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "max_size": self.max_size
+            }
+
+    def _evict(self):
+        """Evicts least recently used entries until the cache fits max_size, lock must be held"""
+        if self.max_size is None:
+            return
+        while len(self._entries) > max(self.max_size, 0):
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+
+def register_cache(name, cache):
+    """
+    :param name: (str) cache name
+    :param cache: (target_tools.cache.LRUCache) cache
+    :return: (target_tools.cache.LRUCache) Returns cache
+    """
+    CACHE_REGISTRY[name] = cache
+    return cache
+
+
+def configure_caches(cache_sizes):
+    """Resizes named caches.  Caches are shared by the whole process, so the most recent configuration wins
+    :param cache_sizes: (dict<str, int>) maximum number of entries keyed by cache name
+    """
+    for name, max_size in (cache_sizes or {}).items():
+        cache = CACHE_REGISTRY.get(name)
+        if cache is not None:
+            cache.resize(max_size)
+
+
+def get_cache_stats():
+    """
+    :return: (dict<str, dict>) Returns stats for every named cache, keyed by cache name
+    """
+    return {name: cache.stats() for name, cache in CACHE_REGISTRY.items()}
@@ -8,7 +8,11 @@
 # OF ANY KIND, either express or implied. See the License for the specific language
 # governing permissions and limitations under the License.
 """Helper functions for deriving various info from client"""
+from collections import namedtuple
 from user_agents import parse
+from target_tools.constants import DEFAULT_CACHE_SIZE
+from target_tools.constants import USER_AGENT_CACHE
+from target_tools.utils import memoize
 from target_tools.utils import parse_int
 
 OTHER = "Other"
@@ -20,21 +24,56 @@ OS_MAPPING = {
     "Mac OS X" : "mac"
 }
 
-def browser_from_user_agent(user_agent=None):
-    """Use regex to determine browser from the user agent
+UserAgentInfo = namedtuple("UserAgentInfo", ["browser_name", "browser_version", "operating_system", "device_type"])
+
+
+def _parse_user_agent(user_agent):
+    """
     :param user_agent: (str) user agent
-    :return: (dict{"name": str, "version": int})
+    :return: (target_tools.client_info.UserAgentInfo) Returns browser, OS and device derived from user agent
     """
-    if not user_agent:
-        user_agent = ""
-
     agent_obj = parse(user_agent)
     major_version = parse_int(agent_obj.browser.version_string.split(".")[0])\
         if agent_obj.browser.version_string else -1
+    operating_system = OS_MAPPING.get(agent_obj.os.family,
+                                      agent_obj.os.family if agent_obj.os.family != OTHER else UNKNOWN)
+
+    return UserAgentInfo(browser_name=agent_obj.browser.family if agent_obj.browser.family != OTHER else UNKNOWN,
+                         browser_version=major_version,
+                         operating_system=operating_system,
+                         device_type=agent_obj.device.family if agent_obj.device.family != OTHER else DESKTOP)
+
+
+_parse_user_agent_memoized = memoize(_parse_user_agent, args_resolver=lambda args, kwargs: args[0],
+                                     max_size=DEFAULT_CACHE_SIZE, name=USER_AGENT_CACHE)
+
+
+def parse_user_agent(user_agent=None):
+    """Parses user agent once, results are kept in a bounded cache shared by the whole process.  Cache stats are
+    available via get_user_agent_cache_stats
+    :param user_agent: (str) user agent
+    :return: (target_tools.client_info.UserAgentInfo) Returns browser, OS and device derived from user agent
+    """
+    return _parse_user_agent_memoized(user_agent or "")
+
+
+def get_user_agent_cache_stats():
+    """
+    :return: (dict) Returns hits, misses, hit rate, evictions and size of the user agent cache
+    """
+    return _parse_user_agent_memoized.cache.stats()
+
+
+def browser_from_user_agent(user_agent=None):
+    """Use regex to determine browser from the user agent
+    :param user_agent: (str) user agent
+    :return: (dict{"name": str, "version": int})
+    """
+    user_agent_info = parse_user_agent(user_agent)
 
     return {
-        "name": agent_obj.browser.family if agent_obj.browser.family != OTHER else UNKNOWN,
-        "version": major_version
+        "name": user_agent_info.browser_name,
+        "version": user_agent_info.browser_version
     }
 
 
@@ -43,12 +82,7 @@ def operating_system_from_user_agent(user_agent):
     :param user_agent: (str) user agent
     :return: (str) OS name
     """
-    agent_obj = parse(user_agent)
-
-    if agent_obj.os.family in OS_MAPPING:
-        return OS_MAPPING[agent_obj.os.family]
-
-    return agent_obj.os.family if agent_obj.os.family != OTHER else UNKNOWN
+    return parse_user_agent(user_agent).operating_system
 
 
 def device_type_from_user_agent(user_agent):
@@ -56,5 +90,4 @@ def device_type_from_user_agent(user_agent):
     :param user_agent: (str) browser user agent
     :return: (str) user device type
     """
-    agent_obj = parse(user_agent)
-    return agent_obj.device.family if agent_obj.device.family != OTHER else DESKTOP
+    return parse_user_agent(user_agent).device_type
@@ -31,3 +31,7 @@ POSSIBLE_ENVIRONMENTS = [
 
 EMPTY_STRING = ""
 MILLISECONDS_IN_SECOND = 1000
+
+HASH_CACHE = "hash_unencoded_chars"
+USER_AGENT_CACHE = "user_agent"
+DEFAULT_CACHE_SIZE = 10000
@@ -10,8 +10,30 @@
 """Hashing functions"""
 # pylint: disable=invalid-name
 import ctypes
+from collections import namedtuple
+from six import text_type
+from target_tools.constants import DEFAULT_CACHE_SIZE
+from target_tools.constants import HASH_CACHE
+from target_tools.messages import NUMPY_REQUIRED
 from target_tools.utils import memoize
 
+try:
+    import mmh3
+except ImportError:
+    mmh3 = None
+
+C1 = 0xcc9e2d51
+C2 = 0x1b873593
+MASK32 = 0xffffffff
+MAX_BMP_CHAR = u"\uffff"
+
+HASHING_BACKEND_C = "c"
+HASHING_BACKEND_PYTHON = "python"
+HASHING_BACKEND_REFERENCE = "reference"
+
+# Intermediate MurmurHash3 state, h1 is kept as an unsigned 32-bit int
+HashState = namedtuple("HashState", ["h1", "length", "pending"])
+
 
 def zero_fill_right_shift(val, n):
     """bitwise >>>"""
@@ -35,16 +57,14 @@ def mul32(m, n):
     return int32(int32(int32(nhi * m ^ 0) | 0) + int32(int32(nlo * m) | 0)) | 0
 
 
-def hash_unencoded_chars_raw(string_value, seed=0):
-    """Optimized MurmurHash3 (32-bit) hashing algorithm to generate a signed numeric 10-digit hash
-    This method matches the java method used on Target Edge
+def reference_hash_unencoded_chars(string_value, seed=0):
+    """Reference MurmurHash3 (32-bit) implementation emulating javascript int32 arithmetic via ctypes.
+    Slow, the other hashing backends are verified against it
     :param string_value: (str) string to hash
     :param seed: (int) seed value
     :return: (int) Returns 10-digit signed int hash value
     """
     length = len(string_value)
-    c1 = 0xcc9e2d51
-    c2 = 0x1b873593
 
     h1 = seed
     rounded_end = length & ~0x1
@@ -52,9 +72,9 @@ def hash_unencoded_chars_raw(string_value, seed=0):
     for i in range(0, rounded_end, 2):
         k1 = char_code_at(string_value, i) | (char_code_at(string_value, i + 1) << 16)
 
-        k1 = mul32(k1, c1)
+        k1 = mul32(k1, C1)
         k1 = (int32((k1 & 0x1ffff) << 15)) | int32(zero_fill_right_shift(k1, 17))  # ROTL32(k1,15)
-        k1 = mul32(k1, c2)
+        k1 = mul32(k1, C2)
 
         h1 ^= k1
         h1 = int32(int32(h1 & 0x7ffff) << 13) | int32(zero_fill_right_shift(h1, 19))  # ROTL32(h1,13)
@@ -62,9 +82,9 @@ def hash_unencoded_chars_raw(string_value, seed=0):
 
     if length % 2 == 1:
         k1 = char_code_at(string_value, rounded_end)
-        k1 = mul32(k1, c1)
+        k1 = mul32(k1, C1)
         k1 = int32(int32(k1 & 0x1ffff) << 15) | int32(zero_fill_right_shift(k1, 17))  # ROTL32(k1,15)
-        k1 = mul32(k1, c2)
+        k1 = mul32(k1, C2)
         h1 ^= k1
 
     # finalization
@@ -80,9 +100,229 @@ def hash_unencoded_chars_raw(string_value, seed=0):
     return h1
 
 
+def create_hash_state(string_value, seed=0):
+    """Hashes string_value without finalizing, so that the hash can be resumed with additional input.
+    MurmurHash3 processes input left to right in 2-char blocks, so the state of a common prefix can be
+    computed once and reused for any number of suffixes
+    :param string_value: (str) string to hash, i.e. prefix of the final input
+    :param seed: (int) seed value
+    :return: (target_tools.hashing.HashState) hash state
+    """
+    return update_hash_state(HashState(seed & MASK32, 0, None), string_value)
+
+
+def update_hash_state(state, string_value):
+    """
+    :param state: (target_tools.hashing.HashState) hash state created by create_hash_state
+    :param string_value: (str) string to append to the hashed input
+    :return: (target_tools.hashing.HashState) Returns new hash state, the given state is not modified
+    """
+    h1, length, pending = state
+    end = len(string_value)
+    start = 0
+
+    if pending is not None and end:
+        start = 1
+        k1 = ((pending | (ord(string_value[0]) << 16)) * C1) & MASK32
+        k1 = (((k1 << 15) | (k1 >> 17)) * C2) & MASK32  # ROTL32(k1,15)
+        h1 ^= k1
+        h1 = (((h1 << 13) | (h1 >> 19)) * 5 + 0xe6546b64) & MASK32  # ROTL32(h1,13)
+        pending = None
+
+    rounded_end = start + ((end - start) & ~0x1)
+
+    for i in range(start, rounded_end, 2):
+        k1 = ((ord(string_value[i]) | (ord(string_value[i + 1]) << 16)) * C1) & MASK32
+        k1 = (((k1 << 15) | (k1 >> 17)) * C2) & MASK32  # ROTL32(k1,15)
+        h1 ^= k1
+        h1 = (((h1 << 13) | (h1 >> 19)) * 5 + 0xe6546b64) & MASK32  # ROTL32(h1,13)
+
+    if rounded_end < end:
+        pending = ord(string_value[rounded_end])
+
+    return HashState(h1, length + end, pending)
+
+
+def finalize_hash_state(state):
+    """
+    :param state: (target_tools.hashing.HashState) hash state created by create_hash_state or update_hash_state
+    :return: (int) Returns 10-digit signed int hash value of all input hashed into state
+    """
+    h1, length, pending = state.h1, state.length, state.pending
+
+    if pending is not None:
+        k1 = (pending * C1) & MASK32
+        h1 ^= (((k1 << 15) | (k1 >> 17)) * C2) & MASK32  # ROTL32(k1,15)
+
+    # finalization
+    h1 ^= (length << 1) & MASK32
+
+    # fmix(h1)
+    h1 ^= h1 >> 16
+    h1 = (h1 * 0x85ebca6b) & MASK32
+    h1 ^= h1 >> 13
+    h1 = (h1 * 0xc2b2ae35) & MASK32
+    h1 ^= h1 >> 16
+
+    return h1 - 0x100000000 if h1 & 0x80000000 else h1
+
+
+def python_hash_unencoded_chars(string_value, seed=0):
+    """Pure python MurmurHash3 (32-bit) implementation using unsigned mask arithmetic
+    :param string_value: (str) string to hash
+    :param seed: (int) seed value
+    :return: (int) Returns 10-digit signed int hash value
+    """
+    return finalize_hash_state(create_hash_state(string_value, seed))
+
+
+def c_hash_unencoded_chars(string_value, seed=0):
+    """MurmurHash3 (32-bit) implementation using the mmh3 C extension.  Hashing 2-char blocks is equivalent to
+    hashing the UTF-16LE encoding in 4-byte blocks, as long as every char fits in 16 bits
+    :param string_value: (str) string to hash
+    :param seed: (int) seed value
+    :return: (int) Returns 10-digit signed int hash value
+    """
+    string_value = text_type(string_value)
+    if string_value and max(string_value) > MAX_BMP_CHAR:
+        return python_hash_unencoded_chars(string_value, seed)
+    return mmh3.hash(string_value.encode("utf-16-le", "surrogatepass"), seed & MASK32, True)
+
+
+def _get_hashing_backends():
+    """
+    :return: (dict<str, callable>) Returns available hashing backends keyed by name
+    """
+    backends = {
+        HASHING_BACKEND_PYTHON: python_hash_unencoded_chars,
+        HASHING_BACKEND_REFERENCE: reference_hash_unencoded_chars
+    }
+    if mmh3 is not None:
+        backends[HASHING_BACKEND_C] = c_hash_unencoded_chars
+    return backends
+
+
+HASHING_BACKENDS = _get_hashing_backends()
+HASHING_BACKEND = HASHING_BACKEND_C if HASHING_BACKEND_C in HASHING_BACKENDS else HASHING_BACKEND_PYTHON
+
+# Optimized MurmurHash3 (32-bit) hashing algorithm to generate a signed numeric 10-digit hash
+# This method matches the java method used on Target Edge
+hash_unencoded_chars_raw = HASHING_BACKENDS.get(HASHING_BACKEND)
+
+
+def hash_unencoded_chars_resume(state, string_value):
+    """Equivalent to hash_unencoded_chars_raw(prefix + string_value) where state = create_hash_state(prefix).
+    Resumes in python for every backend, the mmh3 C extension does not expose intermediate hash state
+    :param state: (target_tools.hashing.HashState) hash state created by create_hash_state
+    :param string_value: (str) remainder of the string to hash
+    :return: (int) Returns 10-digit signed int hash value
+    """
+    return finalize_hash_state(update_hash_state(state, string_value))
+
+
 def _create_memoization_key(args, kwargs):
     """Joins list of values to create memo cache key"""
     return "-".join(args)
 
 
-hash_unencoded_chars = memoize(hash_unencoded_chars_raw, _create_memoization_key)
+hash_unencoded_chars = memoize(hash_unencoded_chars_raw, _create_memoization_key, max_size=DEFAULT_CACHE_SIZE,
+                               name=HASH_CACHE)
+
+
+def get_numpy():
+    """Imports numpy on first use, so that importing the SDK does not pay for it when hashing is not vectorized
+    :return: (module) numpy
+    """
+    try:
+        import numpy  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        numpy = None
+    if numpy is None:
+        raise Exception(NUMPY_REQUIRED)
+    return numpy
+
+
+def _rotl32(values, bits):
+    """Rotates numpy uint32 values left by given number of bits"""
+    return (values << bits) | (values >> (32 - bits))
+
+
+def _mix_k1(k1):
+    """MurmurHash3 k1 mixing step for numpy uint32 values"""
+    k1 = k1 * C1
+    k1 = _rotl32(k1, 15)
+    return k1 * C2
+
+
+def _hash_blocks(h1, k1):
+    """Mixes 2-char blocks k1 into hash states h1, both numpy uint32 values"""
+    h1 = h1 ^ _mix_k1(k1)
+    h1 = _rotl32(h1, 13)
+    return h1 * 5 + 0xe6546b64
+
+
+def _hash_char_codes(char_codes, length, state):
+    """Vectorized hash_unencoded_chars_resume for strings of equal length
+    :param char_codes: (numpy.ndarray<uint32>) 2-D array of unicode values, one row per string
+    :param length: (int) length of every string
+    :param state: (target_tools.hashing.HashState) hash state created by create_hash_state
+    :return: (numpy.ndarray<int32>) Returns signed int hash value per row
+    """
+    numpy = get_numpy()
+    prefix_length, pending = state.length, state.pending
+    h1 = numpy.full(char_codes.shape[0], state.h1, dtype=numpy.uint32)
+    start = 0
+
+    if pending is not None and length:
+        h1 = _hash_blocks(h1, pending | (char_codes[:, 0] << 16))
+        pending = None
+        start = 1
+
+    rounded_end = start + ((length - start) & ~0x1)
+
+    for i in range(start, rounded_end, 2):
+        h1 = _hash_blocks(h1, char_codes[:, i] | (char_codes[:, i + 1] << 16))
+
+    if rounded_end < length:
+        h1 ^= _mix_k1(char_codes[:, rounded_end])
+    elif pending is not None:
+        h1 ^= _mix_k1(numpy.full(char_codes.shape[0], pending, dtype=numpy.uint32))
+
+    # finalization
+    h1 ^= ((prefix_length + length) << 1) & MASK32
+
+    # fmix(h1)
+    h1 ^= h1 >> 16
+    h1 *= 0x85ebca6b
+    h1 ^= h1 >> 13
+    h1 *= 0xc2b2ae35
+    h1 ^= h1 >> 16
+
+    return h1.view(numpy.int32)
+
+
+def hash_unencoded_chars_array(string_values, seed=0, state=None):
+    """Vectorized version of hash_unencoded_chars_raw for hashing many strings at once.  Requires numpy
+    :param string_values: (list<str>) strings to hash
+    :param seed: (int) seed value
+    :param state: (target_tools.hashing.HashState) optional hash state created by create_hash_state,
+        string_values are hashed as suffixes of its input like hash_unencoded_chars_resume does.
+        seed is ignored if state is specified
+    :return: (numpy.ndarray<int32>) Returns signed int hash value for each string, in the same order
+    """
+    numpy = get_numpy()
+    state = state or create_hash_state("", seed)
+    string_values = [text_type(string_value) for string_value in string_values]
+    result = numpy.empty(len(string_values), dtype=numpy.int32)
+
+    indices_by_length = {}
+    for index, string_value in enumerate(string_values):
+        indices_by_length.setdefault(len(string_value), []).append(index)
+
+    for length, indices in indices_by_length.items():
+        joined = text_type("").join(string_values[index] for index in indices)
+        char_codes = numpy.frombuffer(joined.encode("utf-32-le", "surrogatepass"), dtype="<u4")
+        char_codes = char_codes.reshape(len(indices), length)
+        result[indices] = _hash_char_codes(char_codes.astype(numpy.uint32), length, state)
+
+    return result
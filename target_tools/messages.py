@@ -12,6 +12,7 @@
 """Error and log messages"""
 
 DECISIONING_ENGINE_NOT_READY = "Unable to fulfill request; decisioning engine not ready."
+NUMPY_REQUIRED = "numpy is required for vectorized hashing, install it with 'pip install numpy'"
 
 
 def attribute_not_exist(key_name, mbox_name):
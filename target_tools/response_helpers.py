@@ -8,6 +8,7 @@
 # OF ANY KIND, either express or implied. See the License for the specific language
 # governing permissions and limitations under the License.
 """Helper functions for building out DeliveryResponse"""
+from copy import deepcopy
 from delivery_api_client import Action
 from delivery_api_client import MboxResponse
 from delivery_api_client import AnalyticsResponse
@@ -77,6 +78,115 @@ def create_mbox_response(consequence):
                         analytics=create_analytics_response(consequence))
 
 
+def _immutable(self, *args, **kwargs):
+    """Raises on any attempt to modify frozen offer content"""
+    raise TypeError("{} can not be modified, copy it first".format(type(self).__name__))
+
+
+class FrozenDict(dict):
+    """dict that can not be modified, so that offer content can be shared by every response created from a template.
+    Copies are regular, modifiable dicts"""
+
+    __setitem__ = __delitem__ = __ior__ = _immutable
+    update = pop = popitem = clear = setdefault = _immutable
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return {key: deepcopy(value, memo) for key, value in self.items()}
+
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+
+class FrozenList(list):
+    """list that can not be modified, so that offer content can be shared by every response created from a template.
+    Copies are regular, modifiable lists"""
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _immutable
+    append = extend = insert = pop = remove = reverse = sort = clear = _immutable
+
+    def __copy__(self):
+        return list(self)
+
+    def __deepcopy__(self, memo):
+        return [deepcopy(value, memo) for value in self]
+
+    def __reduce__(self):
+        return list, (list(self),)
+
+
+def freeze(value):
+    """
+    :param value: (any) json value
+    :return: (any) Returns value with every dict and list replaced by a FrozenDict or FrozenList
+    """
+    if isinstance(value, dict):
+        return FrozenDict((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return FrozenList(freeze(item) for item in value)
+    return value
+
+
+class MboxResponseTemplate:
+    """Decision consequence parsed once into the values of an MboxResponse.  Every response created from a template
+    has its own MboxResponse, Option, Metric and AnalyticsResponse objects.  Offer content and response tokens are
+    frozen once and shared by every response, post-processors replace them instead of modifying them in place"""
+
+    def __init__(self, consequence):
+        """
+        :param consequence: (dict) decision consequence in form of an mbox response
+        """
+        self.index = consequence.get("index")
+        self.name = consequence.get("name")
+        self.has_content = bool(consequence)
+        self.options = tuple((_option.get("type"), freeze(_option.get("content")), _option.get("eventToken"),
+                              freeze(_option.get("responseTokens"))) for _option in consequence.get("options") or [])
+        self.metrics = tuple((_metric.get("type"), _metric.get("selector"), _metric.get("eventToken"))
+                             for _metric in consequence.get("metrics") or [])
+        _analytics = consequence.get("analytics")
+        self.analytics_payload = deepcopy(_analytics.get("payload")) if _analytics else None
+
+    def create_options(self):
+        """
+        :return: (list<delivery_api_client.Model.option.Option>) Returns new options, same as create_options
+        """
+        if not self.has_content:
+            return None
+        return [Option(type=_type, content=content, event_token=event_token, response_tokens=response_tokens)
+                for _type, content, event_token, response_tokens in self.options]
+
+    def create_metrics(self):
+        """
+        :return: (list<delivery_api_client.Model.metric.Metric>) Returns new metrics, same as create_metrics
+        """
+        if not self.has_content:
+            return None
+        return [Metric(type=_type, selector=selector, event_token=event_token)
+                for _type, selector, event_token in self.metrics]
+
+    def create_analytics_response(self):
+        """
+        :return: (delivery_api_client.Model.analytics_response.AnalyticsResponse) Returns new analytics response,
+            same as create_analytics_response
+        """
+        if not self.analytics_payload:
+            return None
+        return AnalyticsResponse(payload=AnalyticsPayload(**self.analytics_payload))
+
+    def create(self):
+        """
+        :return: (delivery_api_client.Model.mbox_response.MboxResponse) Returns an mbox response equal to
+            create_mbox_response(deepcopy(consequence)), with frozen offer content
+        """
+        return MboxResponse(index=self.index,
+                            name=self.name,
+                            options=self.create_options(),
+                            metrics=self.create_metrics(),
+                            analytics=self.create_analytics_response())
+
+
 def create_action(_action):
     """Create Action"""
     if not _action:
@@ -0,0 +1,111 @@
+# Copyright 2021 Adobe. All rights reserved.
+# This file is licensed to you under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License. You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software distributed under
+# the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR REPRESENTATIONS
+# OF ANY KIND, either express or implied. See the License for the specific language
+# governing permissions and limitations under the License.
+"""Test cases for cache.py"""
+import threading
+import unittest
+from target_tools.cache import LRUCache
+from target_tools.cache import configure_caches
+from target_tools.cache import get_cache_stats
+from target_tools.cache import register_cache
+
+
+class MockClock:
+    """Manually advanced clock"""
+
+    def __init__(self):
+        """Starts at an arbitrary time"""
+        self.now = 1000.0
+
+    def __call__(self):
+        """Returns current time in seconds"""
+        return self.now
+
+
+class TestCache(unittest.TestCase):
+
+    def test_get_set(self):
+        cache = LRUCache()
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("a", 5), 5)
+        cache.set("a", 1)
+        cache.set("a", 2)
+        self.assertEqual(cache.get("a"), 2)
+        self.assertEqual(len(cache), 1)
+
+    def test_lru_eviction(self):
+        cache = LRUCache(max_size=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.set("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(len(cache), 2)
+
+    def test_ttl(self):
+        clock = MockClock()
+        cache = LRUCache(ttl=10, clock=clock)
+        cache.set("a", 1)
+        clock.now += 9
+        self.assertEqual(cache.get("a"), 1)
+        clock.now += 1
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 0)
+
+    def test_resize(self):
+        cache = LRUCache()
+        for i in range(10):
+            cache.set(i, i)
+        cache.resize(3)
+        self.assertEqual(len(cache), 3)
+        self.assertEqual(cache.get(9), 9)
+        self.assertIsNone(cache.get(0))
+
+    def test_stats(self):
+        cache = LRUCache(max_size=1)
+        cache.set("a", 1)
+        cache.get("a")
+        cache.get("b")
+        cache.set("b", 2)
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 1, "hit_rate": 0.5, "evictions": 1, "size": 1,
+                                         "max_size": 1})
+        cache.clear()
+        self.assertEqual(cache.stats(), {"hits": 0, "misses": 0, "hit_rate": 0.0, "evictions": 0, "size": 0,
+                                         "max_size": 1})
+
+    def test_thread_safety(self):
+        cache = LRUCache(max_size=50)
+
+        def worker(offset):
+            for i in range(2000):
+                cache.set((offset, i % 100), i)
+                cache.get((offset, (i + 1) % 100))
+
+        threads = [threading.Thread(target=worker, args=(offset,)) for offset in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats = cache.stats()
+        self.assertEqual(stats.get("size"), 50)
+        self.assertEqual(stats.get("hits") + stats.get("misses"), 8 * 2000)
+        self.assertGreaterEqual(stats.get("evictions"), 8 * 100 - 50)
+
+    def test_configure_caches(self):
+        cache = register_cache("test_configure_caches", LRUCache(max_size=100))
+        for i in range(10):
+            cache.set(i, i)
+        configure_caches({"test_configure_caches": 5, "no_such_cache": 1})
+        self.assertEqual(cache.max_size, 5)
+        self.assertEqual(get_cache_stats().get("test_configure_caches").get("size"), 5)
+        configure_caches(None)
+        self.assertEqual(cache.max_size, 5)
@@ -13,6 +13,11 @@ import unittest
 from target_tools.client_info import browser_from_user_agent
 from target_tools.client_info import operating_system_from_user_agent
 from target_tools.client_info import device_type_from_user_agent
+from target_tools.client_info import get_user_agent_cache_stats
+from target_tools.client_info import parse_user_agent
+from target_tools.client_info import UserAgentInfo
+from target_tools.cache import get_cache_stats
+from target_tools.constants import USER_AGENT_CACHE
 
 IE11_WIN = "Mozilla/5.0 (Windows NT 10.0; WOW64; Trident/7.0; rv:11.0) like Gecko"
 
@@ -147,3 +152,19 @@ class TestClientInfo(unittest.TestCase):
     def test_device_type_from_user_agent_ipad(self):
         device_type = device_type_from_user_agent(IPAD)
         self.assertEqual(device_type, "iPad")
+
+    def test_parse_user_agent(self):
+        result = parse_user_agent(FIREFOX_MAC)
+        self.assertEqual(result, UserAgentInfo(browser_name="Firefox", browser_version=78, operating_system="mac",
+                                               device_type="Mac"))
+        self.assertIs(parse_user_agent(FIREFOX_MAC), result)
+        self.assertIs(parse_user_agent(None), parse_user_agent(""))
+
+    def test_parse_user_agent_cache_stats(self):
+        stats = get_user_agent_cache_stats()
+        parse_user_agent(CHROME_MAC)
+        parse_user_agent(CHROME_MAC)
+        updated_stats = get_user_agent_cache_stats()
+        self.assertGreaterEqual(updated_stats.get("hits"), stats.get("hits") + 1)
+        self.assertGreater(updated_stats.get("hit_rate"), 0)
+        self.assertIn(USER_AGENT_CACHE, get_cache_stats())
@@ -0,0 +1,113 @@
+# Copyright 2021 Adobe. All rights reserved.
+# This file is licensed to you under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License. You may obtain a copy
+# of the License at http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software distributed under
+# the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR REPRESENTATIONS
+# OF ANY KIND, either express or implied. See the License for the specific language
+# governing permissions and limitations under the License.
+"""Test cases for hashing.py"""
+import os
+import random
+import unittest
+from six import unichr
+from target_tools.hashing import HASHING_BACKEND
+from target_tools.hashing import HASHING_BACKENDS
+from target_tools.hashing import HASHING_BACKEND_C
+from target_tools.hashing import HASHING_BACKEND_PYTHON
+from target_tools.hashing import HASHING_BACKEND_REFERENCE
+from target_tools.hashing import reference_hash_unencoded_chars
+from target_tools.hashing import create_hash_state
+from target_tools.hashing import update_hash_state
+from target_tools.hashing import finalize_hash_state
+from target_tools.hashing import hash_unencoded_chars_array
+from target_tools.hashing import hash_unencoded_chars_raw
+from target_tools.hashing import hash_unencoded_chars_resume
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# mmh3 is installed from test-requirements.txt in CI, where the C backend must not be skipped
+SKIP_C_BACKEND = HASHING_BACKEND_C not in HASHING_BACKENDS and not os.environ.get("CI")
+
+STRINGS = ["", "a", "ab", "abc", "someClientId.123456.ecid123.salty", u"écid中\U0001f600.xyz",
+           "c.338e3c1e51f7416a8e1ccba4f81acea0.campaign"]
+
+CHAR_RANGES = [(0x20, 0x7e), (0x00, 0xff), (0x100, 0xd7ff), (0xd800, 0xdfff), (0xe000, 0xffff), (0x10000, 0x10ffff)]
+
+
+def create_fuzzed_strings(count=500, max_length=64, seed=1234):
+    """Creates random unicode strings mixing ascii, latin-1, BMP, lone surrogate and astral chars"""
+    rand = random.Random(seed)
+    result = []
+    for _ in range(count):
+        char_ranges = rand.sample(CHAR_RANGES, rand.randint(1, len(CHAR_RANGES)))
+        length = rand.randint(0, max_length)
+        result.append(u"".join(unichr(rand.randint(*rand.choice(char_ranges))) for _ in range(length)))
+    return result
+
+
+class TestHashing(unittest.TestCase):
+
+    def test_hashing_backends(self):
+        self.assertIn(HASHING_BACKEND_PYTHON, HASHING_BACKENDS)
+        self.assertIn(HASHING_BACKEND_REFERENCE, HASHING_BACKENDS)
+        self.assertNotEqual(HASHING_BACKEND, HASHING_BACKEND_REFERENCE)
+        self.assertIs(hash_unencoded_chars_raw, HASHING_BACKENDS.get(HASHING_BACKEND))
+
+    def assert_backend_matches_reference(self, name):
+        self.assertIn(name, HASHING_BACKENDS, "{} hashing backend is not available".format(name))
+        hash_func = HASHING_BACKENDS.get(name)
+        for seed in [0, 1, 0x7fffffff, -1]:
+            for string_value in STRINGS + create_fuzzed_strings():
+                expected = reference_hash_unencoded_chars(string_value, seed)
+                self.assertEqual(hash_func(string_value, seed), expected,
+                                 "{} backend mismatch for {!r} seed {}".format(name, string_value, seed))
+
+    def test_python_backend_matches_reference(self):
+        self.assert_backend_matches_reference(HASHING_BACKEND_PYTHON)
+
+    @unittest.skipIf(SKIP_C_BACKEND, "mmh3 is not installed")
+    def test_c_backend_matches_reference(self):
+        self.assert_backend_matches_reference(HASHING_BACKEND_C)
+
+    def test_hash_state_matches_reference(self):
+        for string_value in create_fuzzed_strings(count=100, max_length=16, seed=99):
+            expected = reference_hash_unencoded_chars(string_value)
+            for split in range(len(string_value) + 1):
+                state = update_hash_state(create_hash_state(string_value[:split]), string_value[split:])
+                self.assertEqual(finalize_hash_state(state), expected)
+
+    def test_hash_unencoded_chars_raw(self):
+        self.assertEqual(hash_unencoded_chars_raw(""), 0)
+        self.assertEqual(hash_unencoded_chars_raw("someClientId.123456.ecid123.salty"),
+                         hash_unencoded_chars_raw("someClientId.123456.ecid123.salty", 0))
+        self.assertNotEqual(hash_unencoded_chars_raw("abc"), hash_unencoded_chars_raw("abc", 1))
+
+    def test_hash_unencoded_chars_resume(self):
+        for string_value in STRINGS:
+            expected = hash_unencoded_chars_raw(string_value)
+            for split in range(len(string_value) + 1):
+                state = create_hash_state(string_value[:split])
+                self.assertEqual(hash_unencoded_chars_resume(state, string_value[split:]), expected)
+
+    def test_hash_state_is_reusable(self):
+        state = create_hash_state("someClientId.123.")
+        self.assertEqual(hash_unencoded_chars_resume(state, "visitor1.salt"),
+                         hash_unencoded_chars_raw("someClientId.123.visitor1.salt"))
+        self.assertEqual(hash_unencoded_chars_resume(state, "visitor22.salt"),
+                         hash_unencoded_chars_raw("someClientId.123.visitor22.salt"))
+        self.assertEqual(finalize_hash_state(update_hash_state(update_hash_state(state, "vis"), "itor1.salt")),
+                         hash_unencoded_chars_raw("someClientId.123.visitor1.salt"))
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def test_hash_unencoded_chars_array_with_state(self):
+        strings = STRINGS + create_fuzzed_strings()
+        for prefix in ["", "a", "ab", u"\ud800", "someClientId.123456."]:
+            state = create_hash_state(prefix)
+            hash_values = hash_unencoded_chars_array(strings, state=state)
+            self.assertEqual(hash_values.tolist(),
+                             [reference_hash_unencoded_chars(prefix + string_value) for string_value in strings])
@@ -21,6 +21,8 @@ from target_python_sdk import TargetClient
 from target_tools.tests.delivery_request_setup import create_delivery_request
 from target_tools.utils import get_mbox_names
 from target_tools.utils import memoize
+from target_tools.cache import CACHE_REGISTRY
+from target_tools.cache import get_cache_stats
 from target_tools.utils import add_mboxes_to_request
 from target_tools.utils import get_epoch_time
 from target_tools.utils import is_empty
@@ -195,6 +197,21 @@ class TestUtils(unittest.TestCase):
         test_fn()
         self.assertEqual(mock_fn.call_count, 5)
 
+    def test_memoize_max_size(self):
+        mock_fn = Mock(side_effect=lambda value: value * 2)
+        test_fn = memoize(mock_fn, max_size=2, name="test_memoize_max_size")
+        self.addCleanup(CACHE_REGISTRY.pop, "test_memoize_max_size", None)
+
+        self.assertEqual(test_fn(1), 2)
+        self.assertEqual(test_fn(2), 4)
+        self.assertEqual(test_fn(1), 2)
+        self.assertEqual(test_fn(3), 6)
+        self.assertEqual(mock_fn.call_count, 3)
+        self.assertEqual(test_fn(2), 4)
+        self.assertEqual(mock_fn.call_count, 4)
+        self.assertEqual(test_fn.cache.stats().get("evictions"), 2)
+        self.assertEqual(get_cache_stats().get("test_memoize_max_size").get("size"), 2)
+
     def test_get_epoch_time_now(self):
         with patch("target_tools.utils.datetime.datetime", Mock(wraps=datetime.datetime)) as mock_datetime:
             mock_datetime.utcnow.return_value = MOCK_DATE
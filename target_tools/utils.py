@@ -22,6 +22,9 @@ from delivery_api_client import ModelProperty as Property
 from delivery_api_client import ExecuteRequest
 from delivery_api_client import PrefetchRequest
 from delivery_api_client import MboxRequest
+from target_tools.cache import LRUCache
+from target_tools.cache import MISSING
+from target_tools.cache import register_cache
 from target_tools.constants import MILLISECONDS_IN_SECOND
 from target_tools.constants import REQUEST_TYPES
 from target_tools.enums import DecisioningMethod
@@ -172,18 +175,29 @@ def noop(*args, **kwargs):
     return None
 
 
-def memoize(func, args_resolver=None):
-    """Function memoization for better performance"""
-    cache = {}
+def memoize(func, args_resolver=None, max_size=None, ttl=None, name=None):
+    """Function memoization for better performance
+    :param func: (callable) function to memoize
+    :param args_resolver: (callable) creates cache key from args and kwargs
+    :param max_size: (int) maximum number of cached results, least recently used results are evicted first.
+        Unbounded if None
+    :param ttl: (int|float) number of seconds a result is cached for, results never expire if None
+    :param name: (str) registers the cache under name, so that it can be resized via configure_caches
+    :return: (callable) memoized function, its cache is exposed as memoized_func.cache
+    """
+    cache = LRUCache(max_size, ttl)
+    if name:
+        register_cache(name, cache)
 
     def memoized_func(*args, **kwargs):
         key = args_resolver(args, kwargs) if args_resolver else (args, frozenset(kwargs.items()))
-        if key in cache:
-            return cache[key]
-        result = func(*args, **kwargs)
-        cache[key] = result
+        result = cache.get(key, MISSING)
+        if result is MISSING:
+            result = func(*args, **kwargs)
+            cache.set(key, result)
         return result
 
+    memoized_func.cache = cache
     return memoized_func
 
 